@@ -0,0 +1,613 @@
+"""
+This module implements an in-memory columnar query engine for the ProjPicker
+API. The bbox table in projpicker.db is loaded once into NumPy column arrays
+and queries are answered using vectorized masks instead of SQL. It requires
+the numpy module.
+"""
+
+if __package__:
+    from .common import BBox, get_file_stamp, get_connection
+    from . import coor_latlon
+    from . import coor_xy
+else:
+    from common import BBox, get_file_stamp, get_connection
+    import coor_latlon
+    import coor_xy
+
+# file stamps and loaded BBoxColumns instances by projpicker.db path
+_bbox_columns_cache = {}
+
+# size in decimal degrees of the cells that group bboxes for batch queries
+_cell_size = 10
+
+# numpy module imported on first use because importing it slows down every
+# run even if this engine is not used; see import_numpy()
+np = None
+
+
+def import_numpy():
+    """
+    Import the numpy module if it is not imported yet.
+
+    Raises:
+        RuntimeError: If the numpy module is not available.
+    """
+    global np
+
+    if np is None:
+        try:
+            import numpy as np
+        except ImportError:
+            raise RuntimeError("Please install numpy: pip install numpy")
+
+
+class BBoxColumns:
+    """
+    Provide the bbox table in projpicker.db as NumPy column arrays. Rows are
+    loaded in the same order as SQL queries return them, so masked rows are
+    always sorted by area from the smallest to largest.
+    """
+
+    def __init__(self, projpicker_db):
+        """
+        Load the bbox table from projpicker.db into NumPy column arrays.
+
+        Args:
+            projpicker_db (str): projpicker.db path.
+
+        Raises:
+            RuntimeError: If the numpy module is not available.
+        """
+        import_numpy()
+
+        projpicker_cur = get_connection(projpicker_db).cursor()
+        sql = """SELECT *
+                 FROM bbox
+                 ORDER BY area_sqkm,
+                          proj_table,
+                          crs_auth_name, crs_code,
+                          usage_auth_name, usage_code,
+                          extent_auth_name, extent_code"""
+        projpicker_cur.execute(sql)
+        self.bbox = list(map(BBox._make, projpicker_cur.fetchall()))
+
+        self.index = {b: i for i, b in enumerate(self.bbox)}
+
+        def column(name):
+            # NULLs become NaNs, which fail all comparisons just like NULLs
+            return np.array([getattr(b, name) for b in self.bbox], dtype=float)
+
+        self.south_lat = column("south_lat")
+        self.north_lat = column("north_lat")
+        self.west_lon = column("west_lon")
+        self.east_lon = column("east_lon")
+        self.bottom = column("bottom")
+        self.top = column("top")
+        self.left = column("left")
+        self.right = column("right")
+        self.area_sqkm = column("area_sqkm")
+
+        # categorical codes for unit and proj_table
+        self.units, self.unit_codes = np.unique(
+                [b.unit for b in self.bbox], return_inverse=True)
+        self.proj_tables, self.proj_table_codes = np.unique(
+                [b.proj_table for b in self.bbox], return_inverse=True)
+
+        w = self.west_lon
+        e = self.east_lon
+        # if west_lon >= east_lon, bbox crosses the antimeridian
+        self.all_lon = (w == e) | ((w == -180) & (e == 180))
+        self.normal_lon = w < e
+        self.cross_lon = w > e
+
+    def filter_mask(self, unit="any", proj_table="any", mask=None):
+        """
+        Return a boolean mask of rows in unit in proj_table.
+
+        Args:
+            unit (str): Unit values from projpicker.db. Defaults to "any".
+            proj_table (str): Proj table values from projpicker.db. Defaults
+                to "any".
+            mask (numpy.ndarray): Boolean mask to combine with. Defaults to
+                None for all rows.
+
+        Returns:
+            numpy.ndarray: Boolean mask.
+        """
+        if mask is None:
+            mask = np.ones(len(self.bbox), dtype=bool)
+        if unit != "any":
+            mask &= self.unit_codes == self.find_code(self.units, unit)
+        if proj_table != "any":
+            mask &= self.proj_table_codes == self.find_code(self.proj_tables,
+                                                            proj_table)
+        return mask
+
+    def find_code(self, values, value):
+        """
+        Return the categorical code of value in sorted unique values. If value
+        is not found, -1 is returned, which matches no rows.
+
+        Args:
+            values (numpy.ndarray): Sorted unique values.
+            value (str): Value to find.
+
+        Returns:
+            int: Categorical code or -1.
+        """
+        i = np.searchsorted(values, value)
+        return i if i < len(values) and values[i] == value else -1
+
+    def latlon_point_mask(self, point):
+        """
+        Return a boolean mask of rows that completely contain a point defined
+        by latitude and longitude in decimal degrees.
+
+        Args:
+            point (list): List of latitude and longitude floats in decimal
+                degrees.
+
+        Returns:
+            numpy.ndarray: Boolean mask.
+        """
+        lat, lon = point
+        w = self.west_lon
+        e = self.east_lon
+        return (self.south_lat <= lat) & (lat <= self.north_lat) & (
+                self.all_lon |
+                (self.normal_lon & (w <= lon) & (lon <= e)) |
+                (self.cross_lon &
+                 (((-180 <= lon) & (lon <= e)) | ((w <= lon) & (lon <= 180)))))
+
+    def latlon_bbox_mask(self, bbox):
+        """
+        Return a boolean mask of rows that completely contain a bbox defined
+        by south, north, west, and east in decimal degrees.
+
+        Args:
+            bbox (list): List of south, north, west, and east floats in
+                decimal degrees.
+
+        Returns:
+            numpy.ndarray: Boolean mask.
+        """
+        s, n, w, e = bbox
+        b = self.south_lat
+        t = self.north_lat
+        l = self.west_lon
+        r = self.east_lon
+        if w <= e:
+            cross = (((-180 <= w) & (w <= r) & (-180 <= e) & (e <= r)) |
+                     ((l <= w) & (w <= 180) & (l <= e) & (e <= 180)))
+            normal = (l <= w) & (w <= r) & (l <= e) & (e <= r)
+        else:
+            cross = (-180 <= e) & (e <= r) & (l <= w) & (w <= 180)
+            normal = np.zeros(len(self.bbox), dtype=bool)
+        return (b <= s) & (s <= t) & (b <= n) & (n <= t) & (
+                self.all_lon |
+                (self.normal_lon & normal) |
+                (self.cross_lon & cross))
+
+    def xy_point_mask(self, point):
+        """
+        Return a boolean mask of rows that completely contain a point defined
+        by x and y.
+
+        Args:
+            point (list): List of x and y floats.
+
+        Returns:
+            numpy.ndarray: Boolean mask.
+        """
+        x, y = point
+        return ((self.left <= x) & (x <= self.right) &
+                (self.bottom <= y) & (y <= self.top))
+
+    def xy_bbox_mask(self, bbox):
+        """
+        Return a boolean mask of rows that completely contain a bbox defined
+        by bottom, top, left, and right.
+
+        Args:
+            bbox (list): List of bottom, top, left, and right floats.
+
+        Returns:
+            numpy.ndarray: Boolean mask.
+        """
+        b, t, l, r = bbox
+        return ((self.left <= l) & (l <= self.right) &
+                (self.left <= r) & (r <= self.right) &
+                (self.bottom <= b) & (b <= self.top) &
+                (self.bottom <= t) & (t <= self.top))
+
+    def candidate_mask(self, bboxes, is_latlon=True):
+        """
+        Return a boolean mask of rows that can completely contain any of input
+        bboxes. A row is a candidate if it reaches the southernmost north and
+        the northernmost south of all bboxes, and similarly for longitudes
+        unless it spans all longitudes or crosses the antimeridian. Input
+        bboxes must not cross the antimeridian.
+
+        Args:
+            bboxes (numpy.ndarray): Array of bbox geometries with shape (n,
+                4).
+            is_latlon (bool): Whether or not bboxes are in the
+                latitude-longitude coordinate system. Defaults to True.
+
+        Returns:
+            numpy.ndarray: Boolean mask.
+        """
+        s, w = bboxes[:, (0, 2)].max(axis=0)
+        n, e = bboxes[:, (1, 3)].min(axis=0)
+        if is_latlon:
+            return (self.south_lat <= s) & (n <= self.north_lat) & (
+                    self.all_lon | self.cross_lon |
+                    ((self.west_lon <= w) & (e <= self.east_lon)))
+        return ((self.bottom <= s) & (n <= self.top) &
+                (self.left <= w) & (e <= self.right))
+
+    def latlon_bboxes_mask(self, bboxes, rows):
+        """
+        Return a two-dimensional boolean mask of rows that completely contain
+        bboxes defined by south, north, west, and east in decimal degrees, one
+        mask row per bbox and one mask column per selected row. Input bboxes
+        must not cross the antimeridian.
+
+        Args:
+            bboxes (numpy.ndarray): Array of south, north, west, and east
+                floats in decimal degrees with shape (n, 4).
+            rows (numpy.ndarray): Indices of rows to test.
+
+        Returns:
+            numpy.ndarray: Boolean mask with shape (n, number of rows).
+        """
+        s, n, w, e = (bboxes[:, i, None] for i in range(4))
+        b = self.south_lat[rows]
+        t = self.north_lat[rows]
+        l = self.west_lon[rows]
+        r = self.east_lon[rows]
+        cross = (((-180 <= w) & (w <= r) & (-180 <= e) & (e <= r)) |
+                 ((l <= w) & (w <= 180) & (l <= e) & (e <= 180)))
+        normal = (l <= w) & (w <= r) & (l <= e) & (e <= r)
+        return (b <= s) & (s <= t) & (b <= n) & (n <= t) & (
+                self.all_lon[rows] |
+                (self.normal_lon[rows] & normal) |
+                (self.cross_lon[rows] & cross))
+
+    def xy_bboxes_mask(self, bboxes, rows):
+        """
+        Return a two-dimensional boolean mask of rows that completely contain
+        bboxes defined by bottom, top, left, and right, one mask row per bbox
+        and one mask column per selected row.
+
+        Args:
+            bboxes (numpy.ndarray): Array of bottom, top, left, and right
+                floats with shape (n, 4).
+            rows (numpy.ndarray): Indices of rows to test.
+
+        Returns:
+            numpy.ndarray: Boolean mask with shape (n, number of rows).
+        """
+        b, t, l, r = (bboxes[:, i, None] for i in range(4))
+        left = self.left[rows]
+        right = self.right[rows]
+        bottom = self.bottom[rows]
+        top = self.top[rows]
+        return ((left <= l) & (l <= right) & (left <= r) & (r <= right) &
+                (bottom <= b) & (b <= top) & (bottom <= t) & (t <= top))
+
+    def geom_mask(self, geom, geom_type="point", is_latlon=True):
+        """
+        Return a boolean mask of rows that completely contain a geometry.
+
+        Args:
+            geom (list or str): List or str of a parsable geometry.
+            geom_type (str): Geometry type (point, poly, bbox). Defaults to
+                "point".
+            is_latlon (bool): Whether or not geom is in the
+                latitude-longitude coordinate system. Defaults to True.
+
+        Returns:
+            numpy.ndarray: Boolean mask.
+
+        Raises:
+            ValueError: If geom_type is not one of "point", "poly", or "bbox".
+        """
+        if geom_type not in ("point", "poly", "bbox"):
+            raise ValueError(f"{geom_type}: Invalid geometry type")
+
+        coor_mod = coor_latlon if is_latlon else coor_xy
+
+        if geom_type == "point":
+            point = coor_mod.parse_point(geom)
+            if is_latlon:
+                return self.latlon_point_mask(point)
+            return self.xy_point_mask(point)
+
+        if geom_type == "poly":
+            poly = coor_mod.parse_points(geom)
+            poly = [point for point in poly if None not in point]
+            if not poly:
+                return np.zeros(len(self.bbox), dtype=bool)
+            bbox = coor_mod.calc_poly_bbox(poly)
+        else:
+            bbox = coor_mod.parse_bbox(geom)
+        if is_latlon:
+            return self.latlon_bbox_mask(bbox)
+        return self.xy_bbox_mask(bbox)
+
+    def select(self, mask):
+        """
+        Return a list of BBox instances selected by a boolean mask.
+
+        Args:
+            mask (numpy.ndarray): Boolean mask.
+
+        Returns:
+            list: List of selected BBox instances sorted by area.
+        """
+        return [self.bbox[i] for i in np.flatnonzero(mask)]
+
+    def select_using_bbox(self, prevbbox, mask):
+        """
+        Return a subset list of input BBox instances selected by a boolean
+        mask. The order of input BBox instances is preserved.
+
+        Args:
+            prevbbox (list): List of BBox instances from a previous query.
+            mask (numpy.ndarray): Boolean mask.
+
+        Returns:
+            list: List of selected BBox instances.
+        """
+        return [b for b in prevbbox if mask[self.index[b]]]
+
+    def select_top(self, masks, rows, k=1):
+        """
+        Return lists of up to k BBox instances selected by each row of a
+        two-dimensional boolean mask over selected rows. Because rows are
+        sorted by area, the first k selected rows are the smallest ones. Use 0
+        for all.
+
+        Args:
+            masks (numpy.ndarray): Boolean mask with shape (n, number of
+                rows).
+            rows (numpy.ndarray): Sorted indices of rows in mask columns.
+            k (int): Maximum number of BBox instances per mask row. Defaults
+                to 1.
+
+        Returns:
+            list: List of n lists of selected BBox instances sorted by area.
+        """
+        if k > 0:
+            masks &= np.cumsum(masks, axis=1, dtype=np.int32) <= k
+        geom_ids, cols = np.nonzero(masks)
+        splits = np.searchsorted(geom_ids, np.arange(1, len(masks)))
+        return [[self.bbox[i] for i in rows[c]]
+                for c in np.split(cols, splits)]
+
+    def query_top_bboxes(self, bboxes, k=1, unit="any", proj_table="any",
+                         is_latlon=True):
+        """
+        Return lists of up to k smallest BBox instances in unit in proj_table
+        that completely contain each input bbox geometry. Latitude-longitude
+        bboxes are grouped by the cells of their southwest corners and those
+        in each cell are tested at once against the candidate rows of the cell
+        using a two-dimensional mask. X-y bboxes are tested in one group
+        because their units are unknown. Input bboxes must not cross the
+        antimeridian. See candidate_mask() and select_top().
+
+        Args:
+            bboxes (list): List of bbox geometries.
+            k (int): Maximum number of BBox instances per bbox. Defaults to 1.
+            unit (str): Unit values from projpicker.db. Defaults to "any".
+            proj_table (str): Proj table values from projpicker.db. Defaults
+                to "any".
+            is_latlon (bool): Whether or not bboxes are in the
+                latitude-longitude coordinate system. Defaults to True.
+
+        Returns:
+            list: List of lists of queried BBox instances sorted by area.
+        """
+        if not bboxes:
+            return []
+
+        bboxes = np.array(bboxes, dtype=float)
+        if is_latlon:
+            cells = np.floor(bboxes[:, (0, 2)] / _cell_size)
+            order = np.lexsort((cells[:, 1], cells[:, 0]))
+            splits = np.flatnonzero(
+                    np.diff(cells[order], axis=0).any(axis=1)) + 1
+            groups = np.split(order, splits)
+        else:
+            groups = [np.arange(len(bboxes))]
+
+        mask = self.filter_mask(unit, proj_table)
+        bboxes_mask = (self.latlon_bboxes_mask if is_latlon else
+                       self.xy_bboxes_mask)
+
+        outbbox = [None] * len(bboxes)
+        for idx in groups:
+            group = bboxes[idx]
+            rows = np.flatnonzero(mask &
+                                  self.candidate_mask(group, is_latlon))
+            for i, bbox in zip(idx, self.select_top(bboxes_mask(group, rows),
+                                                    rows, k)):
+                outbbox[i] = bbox
+        return outbbox
+
+    def query_geom(self, geom, geom_type="point", unit="any",
+                   proj_table="any", is_latlon=True):
+        """
+        Return a list of BBox instances in unit in proj_table that completely
+        contain an input geometry. Results are sorted by area from the
+        smallest to largest.
+
+        Args:
+            geom (list or str): List or str of a parsable geometry.
+            geom_type (str): Geometry type (point, poly, bbox). Defaults to
+                "point".
+            unit (str): Unit values from projpicker.db. Defaults to "any".
+            proj_table (str): Proj table values from projpicker.db. Defaults
+                to "any".
+            is_latlon (bool): Whether or not geom is in the
+                latitude-longitude coordinate system. Defaults to True.
+
+        Returns:
+            list: List of queried BBox instances sorted by area.
+        """
+        mask = self.geom_mask(geom, geom_type, is_latlon)
+        return self.select(self.filter_mask(unit, proj_table, mask))
+
+    def query_geom_using_bbox(self, prevbbox, geom, geom_type="point",
+                              unit="any", proj_table="any", is_latlon=True):
+        """
+        Return a subset list of input BBox instances in unit in proj_table
+        that completely contain an input geometry.
+
+        Args:
+            prevbbox (list): List of BBox instances from a previous query.
+            geom (list or str): List or str of a parsable geometry.
+            geom_type (str): Geometry type (point, poly, bbox). Defaults to
+                "point".
+            unit (str): Unit values from projpicker.db. Defaults to "any".
+            proj_table (str): Proj table values from projpicker.db. Defaults
+                to "any".
+            is_latlon (bool): Whether or not geom is in the
+                latitude-longitude coordinate system. Defaults to True.
+
+        Returns:
+            list: List of queried BBox instances.
+        """
+        mask = self.geom_mask(geom, geom_type, is_latlon)
+        return self.select_using_bbox(prevbbox,
+                                      self.filter_mask(unit, proj_table, mask))
+
+    def query_geoms(self, geoms, geom_type="point", query_op="and",
+                    unit="any", proj_table="any", is_latlon=True):
+        """
+        Return a list of BBox instances in unit in proj_table that completely
+        contain input geometries. The "and" query operator performs the
+        intersection of bbox rows while the "or" operator the union and the
+        "xor" operator the exclusive OR. Results are sorted by area from the
+        smallest to largest.
+
+        Args:
+            geoms (list): List of parsable geometries.
+            geom_type (str): Geometry type (point, poly, bbox). Defaults to
+                "point".
+            query_op (str): Query operator (and, or, xor). Defaults to "and".
+            unit (str): Unit values from projpicker.db. Defaults to "any".
+            proj_table (str): Proj table values from projpicker.db. Defaults
+                to "any".
+            is_latlon (bool): Whether or not geoms are in the
+                latitude-longitude coordinate system. Defaults to True.
+
+        Returns:
+            list: List of queried BBox instances sorted by area.
+
+        Raises:
+            ValueError: If query_op is not one of "and", "or", or "xor".
+        """
+        if query_op not in ("and", "or", "xor"):
+            raise ValueError(f"{query_op}: Invalid query operator")
+
+        if not geoms:
+            return []
+
+        masks = [self.geom_mask(geom, geom_type, is_latlon) for geom in geoms]
+        if query_op == "and":
+            mask = np.logical_and.reduce(masks)
+        elif query_op == "or":
+            mask = np.logical_or.reduce(masks)
+        else:
+            # rows that contain an odd number of geometries
+            mask = np.logical_xor.reduce(masks)
+        return self.select(self.filter_mask(unit, proj_table, mask))
+
+    def query_point(self, point, unit="any", proj_table="any",
+                    is_latlon=True):
+        """
+        Return a list of BBox instances in unit in proj_table that completely
+        contain an input point geometry. See query_geom().
+        """
+        return self.query_geom(point, "point", unit, proj_table, is_latlon)
+
+    def query_point_using_bbox(self, prevbbox, point, unit="any",
+                               proj_table="any", is_latlon=True):
+        """
+        Return a subset list of input BBox instances in unit in proj_table
+        that completely contain an input point geometry. See
+        query_geom_using_bbox().
+        """
+        return self.query_geom_using_bbox(prevbbox, point, "point", unit,
+                                          proj_table, is_latlon)
+
+    def query_poly(self, poly, unit="any", proj_table="any", is_latlon=True):
+        """
+        Return a list of BBox instances in unit in proj_table that completely
+        contain an input poly geometry. See query_geom().
+        """
+        return self.query_geom(poly, "poly", unit, proj_table, is_latlon)
+
+    def query_poly_using_bbox(self, prevbbox, poly, unit="any",
+                              proj_table="any", is_latlon=True):
+        """
+        Return a subset list of input BBox instances in unit in proj_table
+        that completely contain an input poly geometry. See
+        query_geom_using_bbox().
+        """
+        return self.query_geom_using_bbox(prevbbox, poly, "poly", unit,
+                                          proj_table, is_latlon)
+
+    def query_bbox(self, bbox, unit="any", proj_table="any", is_latlon=True):
+        """
+        Return a list of BBox instances in unit in proj_table that completely
+        contain an input bbox geometry. See query_geom().
+        """
+        return self.query_geom(bbox, "bbox", unit, proj_table, is_latlon)
+
+    def query_bbox_using_bbox(self, prevbbox, bbox, unit="any",
+                              proj_table="any", is_latlon=True):
+        """
+        Return a subset list of input BBox instances in unit in proj_table
+        that completely contain an input bbox geometry. See
+        query_geom_using_bbox().
+        """
+        return self.query_geom_using_bbox(prevbbox, bbox, "bbox", unit,
+                                          proj_table, is_latlon)
+
+    def query_all(self, unit="any", proj_table="any"):
+        """
+        Return a list of all BBox instances in unit in proj_table sorted by
+        area.
+
+        Args:
+            unit (str): Unit values from projpicker.db. Defaults to "any".
+            proj_table (str): Proj table values from projpicker.db. Defaults
+                to "any".
+
+        Returns:
+            list: List of all BBox instances sorted by area.
+        """
+        return self.select(self.filter_mask(unit, proj_table))
+
+
+def get_bbox_columns(projpicker_db):
+    """
+    Return a BBoxColumns instance for projpicker.db. The bbox table is loaded
+    only once per projpicker.db path and reloaded when projpicker.db is
+    replaced or modified. See common.get_file_stamp().
+
+    Args:
+        projpicker_db (str): projpicker.db path.
+
+    Returns:
+        BBoxColumns: BBoxColumns instance.
+    """
+    db_path, db_stamp = get_file_stamp(projpicker_db)
+    cached = _bbox_columns_cache.get(db_path)
+    if cached is None or cached[0] != db_stamp:
+        cached = db_stamp, BBoxColumns(db_path)
+        _bbox_columns_cache[db_path] = cached
+    return cached[1]
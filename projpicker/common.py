@@ -6,6 +6,9 @@ modules.
 import os
 import re
 import collections
+import sqlite3
+import threading
+import urllib.request
 
 _projpicker_verbose_env = "PROJPICKER_VERBOSE"
 
@@ -15,6 +18,8 @@ _coor_sep = ","
 _coor_sep_pat = f"[ \t]*[{_coor_sep} \t][ \t]*"
 # positive float
 _pos_float_pat = "(?:[0-9]+(?:\.[0-9]*)?|\.[0-9]+)"
+# characters of plain decimal numbers separated by commas
+_dec_chars = f"0123456789.+-{_coor_sep}"
 
 # bbox table schema
 _bbox_schema = """
@@ -45,6 +50,57 @@ CREATE TABLE bbox (
 )
 """
 
+# latlon R*Tree spatial index schema; each bbox row is stored as one rectangle
+# or two rectangles if it crosses the antimeridian
+_bbox_latlon_rtree_schema = """
+CREATE VIRTUAL TABLE bbox_latlon_rtree USING rtree (
+    id,
+    south_lat, north_lat,
+    west_lon, east_lon,
+    +bbox_rowid INTEGER
+)
+"""
+
+# unit lookup table for the xy R*Tree spatial index
+_bbox_unit_schema = """
+CREATE TABLE bbox_unit (
+    unit_id INTEGER PRIMARY KEY,
+    unit TEXT NOT NULL UNIQUE
+)
+"""
+
+# xy R*Tree spatial index schema partitioned by unit; unit_min and unit_max
+# both store the unit_id of each bbox row from the bbox_unit table
+_bbox_xy_rtree_schema = """
+CREATE VIRTUAL TABLE bbox_xy_rtree USING rtree (
+    id,
+    unit_min, unit_max,
+    left, right,
+    bottom, top,
+    +bbox_rowid INTEGER
+)
+"""
+
+# latitude band and longitude column tables for the optional 1-degree grid
+# lookup; bits in the full and overlap bitsets are bbox rowids, and a cell is
+# fully contained by rows in the full bitsets of both its band and column, and
+# overlapped by rows in the overlap bitsets of both
+_grid_lat_schema = """
+CREATE TABLE grid_lat (
+    lat_band INTEGER PRIMARY KEY CHECK (lat_band BETWEEN 0 AND 179),
+    full BLOB NOT NULL,
+    overlap BLOB NOT NULL
+)
+"""
+
+_grid_lon_schema = """
+CREATE TABLE grid_lon (
+    lon_col INTEGER PRIMARY KEY CHECK (lon_col BETWEEN 0 AND 359),
+    full BLOB NOT NULL,
+    overlap BLOB NOT NULL
+)
+"""
+
 # all column names in the bbox table
 _bbox_columns = re.sub("^ +| +$", "",
                 re.sub("\n", " ",
@@ -57,11 +113,53 @@ _bbox_columns = re.sub("^ +| +$", "",
 # BBox namedtuple class
 BBox = collections.namedtuple("BBox", _bbox_columns)
 
+# PRAGMAs applied to new read-only database connections
+_sqlite_pragmas = {
+    "mmap_size": 268435456,
+    "cache_size": -16384,
+    "temp_store": "MEMORY"
+}
+# whether or not to open read-only databases as immutable
+_sqlite_immutable = False
+# per-thread pools of read-only database connections
+_connection_pools = threading.local()
+# incremented whenever connection settings change
+_connection_generation = 0
+# SQL statements with unit and proj_table filters by template and filters
+_filtered_sql_cache = {}
+_filtered_sql_cache_size = 256
+
 
 def is_verbose():
     return os.environ.get(_projpicker_verbose_env, "NO") == "YES"
 
 
+def split_floats(x, count):
+    """
+    Split a str of count plain decimal numbers separated by commas without
+    whitespaces into floats. Return None if any part is not a plain decimal
+    number (e.g., DMS, exponent, whitespace, inf, nan) or the number of parts
+    is not count, so the caller can fall back to its full grammar.
+
+    Args:
+        x (str): Comma-separated plain decimal numbers.
+        count (int): Number of decimal numbers.
+
+    Returns:
+        list or None: List of count floats if successful, None otherwise.
+    """
+    # stripping all decimal characters and commas leaves nothing
+    if x.strip(_dec_chars):
+        return None
+    parts = x.split(_coor_sep)
+    if len(parts) != count:
+        return None
+    try:
+        return list(map(float, parts))
+    except ValueError:
+        return None
+
+
 def get_float(x):
     """
     Typecast x into float; return None on failure.
@@ -78,14 +176,326 @@ def get_float(x):
         return None
 
 
+def set_sqlite_pragmas(**pragmas):
+    """
+    Set PRAGMAs for new read-only database connections. A value of None
+    removes the PRAGMA. Existing connections in all threads are reopened on
+    their next get_connection() call.
+
+    Args:
+        **pragmas: PRAGMA names and values (e.g., mmap_size=0,
+            cache_size=-2000, temp_store="DEFAULT").
+
+    Raises:
+        ValueError: If a PRAGMA name is invalid.
+    """
+    global _connection_generation
+
+    for name, value in pragmas.items():
+        if not re.match("^[a-z_]+$", name):
+            raise ValueError(f"{name}: Invalid PRAGMA name")
+        if value is None:
+            _sqlite_pragmas.pop(name, None)
+        else:
+            _sqlite_pragmas[name] = value
+    _connection_generation += 1
+    close_connections()
+
+
+def set_sqlite_immutable(immutable=False):
+    """
+    Set whether or not to open new read-only database connections with the
+    immutable=1 URI parameter. SQLite skips file locking and change detection
+    for immutable databases, so only enable it if no process writes to them
+    while they are being queried. Existing connections in all threads are
+    reopened on their next get_connection() call.
+
+    Args:
+        immutable (bool): Whether or not to open databases as immutable.
+            Defaults to False.
+    """
+    global _sqlite_immutable, _connection_generation
+
+    _sqlite_immutable = immutable
+    _connection_generation += 1
+    close_connections()
+
+
+def get_connection(db):
+    """
+    Return a read-only connection to a database. Connections are pooled per
+    thread and database path, so repeated calls in the same thread reuse the
+    same connection. If the database file is replaced or modified or
+    connection settings change, a new connection is opened. Connections
+    inherited from a parent process are not reused or closed in a forked
+    child process.
+
+    Args:
+        db (str): Database path.
+
+    Returns:
+        sqlite3.Connection: Read-only database connection.
+
+    Raises:
+        sqlite3.OperationalError: If db cannot be opened.
+    """
+    db = os.path.realpath(db)
+    try:
+        st = os.stat(db)
+        stamp = (_connection_generation, st.st_ino, st.st_size,
+                 st.st_mtime_ns)
+    except OSError:
+        stamp = (_connection_generation,)
+
+    pool = getattr(_connection_pools, "pool", None)
+    # SQLite connections must not be used across fork()
+    if pool is None or _connection_pools.pid != os.getpid():
+        pool = _connection_pools.pool = {}
+        _connection_pools.pid = os.getpid()
+    if db in pool:
+        con, con_stamp, _ = pool[db]
+        if con_stamp == stamp:
+            return con
+        del pool[db]
+        con.close()
+
+    uri = f"file:{urllib.request.pathname2url(db)}?mode=ro"
+    if _sqlite_immutable:
+        uri += "&immutable=1"
+    con = sqlite3.connect(uri, uri=True)
+    for name, value in _sqlite_pragmas.items():
+        con.execute(f"PRAGMA {name} = {value}")
+    # table existence by name for table_exists()
+    pool[db] = con, stamp, {}
+    return con
+
+
+def close_connections(db=None):
+    """
+    Close pooled read-only connections in the current thread. If db is None
+    (default), all connections are closed.
+
+    Args:
+        db (str): Database path. Defaults to None.
+    """
+    pool = getattr(_connection_pools, "pool", None)
+    if not pool or _connection_pools.pid != os.getpid():
+        return
+    if db is None:
+        dbs = list(pool)
+    else:
+        dbs = [os.path.realpath(db)]
+    for db in dbs:
+        if db in pool:
+            pool.pop(db)[0].close()
+
+
+def iter_bits(bits):
+    """
+    Yield the indices of set bits in ascending order.
+
+    Args:
+        bits (int): Bitset.
+
+    Yields:
+        int: Index of a set bit.
+    """
+    # bin() puts the lowest bit last, so reverse it and drop "0b"
+    bits = bin(bits)[:1:-1]
+    i = bits.find("1")
+    while i >= 0:
+        yield i
+        i = bits.find("1", i + 1)
+
+
+def table_exists(projpicker_cur, table):
+    """
+    Return True if a table exists in the database. Otherwise, return False.
+    The result is cached for pooled read-only connections from
+    get_connection() because they are replaced when the database file
+    changes.
+
+    Args:
+        projpicker_cur (sqlite3.Cursor): projpicker.db cursor.
+        table (str): Table name.
+
+    Returns:
+        bool: True if table exists. Otherwise, False.
+    """
+    tables = None
+    pool = getattr(_connection_pools, "pool", None)
+    if pool and _connection_pools.pid == os.getpid():
+        for con, _, con_tables in pool.values():
+            if con is projpicker_cur.connection:
+                tables = con_tables
+                if table in tables:
+                    return tables[table]
+                break
+
+    projpicker_cur.execute("""SELECT count(name)
+                              FROM sqlite_master
+                              WHERE type = 'table' AND name = ?""", (table,))
+    exists = projpicker_cur.fetchone()[0] > 0
+    if tables is not None:
+        tables[table] = exists
+    return exists
+
+
+def get_file_stamp(path):
+    """
+    Return the real path of a file and a stamp that changes when the file is
+    replaced or modified. The stamp is None if the file does not exist.
+
+    Args:
+        path (str): File path.
+
+    Returns:
+        str, tuple: Real path and stamp of inode, size, and modification time
+        in nanoseconds.
+    """
+    path = os.path.realpath(path)
+    try:
+        st = os.stat(path)
+        stamp = st.st_ino, st.st_size, st.st_mtime_ns
+    except OSError:
+        stamp = None
+    return path, stamp
+
+
+class LRUCache:
+    """
+    Provide a bounded thread-safe cache that evicts the least recently used
+    entries first when it is full. A cache with a maximum of 0 entries stores
+    nothing. If a maximum number of bytes is given, entries are also evicted
+    while the total estimated size of stored values exceeds it.
+    """
+
+    def __init__(self, max_entries=128, max_bytes=None):
+        """
+        Create an empty cache.
+
+        Args:
+            max_entries (int): Maximum number of entries. Defaults to 128.
+            max_bytes (int): Maximum total size of values in bytes. None for
+                no limit. Defaults to None.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict(self):
+        while self._entries and (
+            len(self._entries) > self.max_entries or
+            (self.max_bytes is not None and self.nbytes > self.max_bytes)):
+            self.nbytes -= self._entries.popitem(last=False)[1][1]
+
+    def get(self, key, default=None):
+        """
+        Return the value for a key and mark it as most recently used. If the
+        key is not in the cache, return default.
+
+        Args:
+            key (hashable): Key.
+            default (any): Value to return for a missing key. Defaults to
+                None.
+
+        Returns:
+            any: Cached value or default.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+            return default
+
+    def put(self, key, value, nbytes=0):
+        """
+        Store a value for a key and evict the least recently used entries
+        beyond the maximum number of entries or bytes. A value larger than the
+        maximum number of bytes is not stored.
+
+        Args:
+            key (hashable): Key.
+            value (any): Value.
+            nbytes (int): Estimated size of the value in bytes. Defaults to 0.
+        """
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            self._entries[key] = value, nbytes
+            self.nbytes += nbytes
+            self._evict()
+
+    def resize(self, max_entries, max_bytes=None):
+        """
+        Change the maximum number of entries and bytes, and evict the least
+        recently used entries beyond them.
+
+        Args:
+            max_entries (int): Maximum number of entries.
+            max_bytes (int): Maximum total size of values in bytes. None for
+                no limit. Defaults to None.
+        """
+        with self._lock:
+            self.max_entries = max_entries
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        """
+        Remove all entries and reset the hit and miss counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = self.hits = self.misses = 0
+
+
+def get_filtered_sql(sql, filter_unit, filter_proj_table):
+    """
+    Return a SQL statement with its AND_UNIT and AND_PROJ_TABLE placeholders
+    replaced with bound unit and proj_table parameters or removed. The same
+    input always produces the same SQL text, so sqlite3 can reuse its prepared
+    statement.
+
+    Args:
+        sql (str): SQL statement with optional AND_UNIT and AND_PROJ_TABLE.
+        filter_unit (bool): Whether or not to filter by unit.
+        filter_proj_table (bool): Whether or not to filter by proj_table.
+
+    Returns:
+        str: SQL statement with :unit and :proj_table named parameters.
+    """
+    key = sql, filter_unit, filter_proj_table
+    if key not in _filtered_sql_cache:
+        if len(_filtered_sql_cache) >= _filtered_sql_cache_size:
+            _filtered_sql_cache.clear()
+        _filtered_sql_cache[key] = sql.replace(
+                "AND_UNIT",
+                "AND unit = :unit" if filter_unit else "").replace(
+                "AND_PROJ_TABLE",
+                "AND proj_table = :proj_table" if filter_proj_table else "")
+    return _filtered_sql_cache[key]
+
+
 def query_using_cursor(
         projpicker_cur,
         sql,
         unit="any",
-        proj_table="any"):
+        proj_table="any",
+        params=None):
     """
     Return a list of BBox instances in unit in proj_table using a SQL
-    statement.
+    statement. The SQL statement should use named parameters for all values
+    instead of formatting them into its text.
 
     Args:
         projpicker_cur (sqlite3.Cursor): projpicker.db cursor.
@@ -93,32 +503,140 @@ def query_using_cursor(
         unit (str): Unit values from projpicker.db. Defaults to "any".
         proj_table (str): Proj table values from projpicker.db. Defaults to
             "any".
+        params (dict): Named parameters for the SQL statement. Defaults to
+            None.
 
     Returns:
         list: List of queried BBox instances sorted by area.
     """
-    outbbox = []
-    params = []
-    if unit == "any" and proj_table == "any":
-        sql = sql.replace(
-                "AND_UNIT", "").replace(
-                "AND_PROJ_TABLE", "")
-    elif unit == "any":
-        sql = sql.replace(
-                "AND_UNIT", "").replace(
-                "AND_PROJ_TABLE", "AND proj_table = ?")
-        params.append(proj_table)
-    elif proj_table == "any":
-        sql = sql.replace(
-                "AND_PROJ_TABLE", "").replace(
-                "AND_UNIT", "AND unit = ?")
-        params.append(unit)
-    else:
-        sql = sql.replace(
-                "AND_UNIT", "AND unit = ?").replace(
-                "AND_PROJ_TABLE", "AND proj_table = ?")
-        params.extend([unit, proj_table])
+    params = dict(params or {}, unit=unit, proj_table=proj_table)
+    sql = get_filtered_sql(sql, unit != "any", proj_table != "any")
     projpicker_cur.execute(sql, params)
-    for row in map(BBox._make, projpicker_cur.fetchall()):
-        outbbox.append(row)
+    return list(map(BBox._make, projpicker_cur.fetchall()))
+
+
+def load_temp_table(projpicker_cur, table, columns, rows):
+    """
+    Create a temporary table with a geom_id column and float columns if it
+    does not exist, and replace its rows with input rows using executemany().
+    The geom_id of each row is its index in rows. Rows with None are skipped.
+
+    Args:
+        projpicker_cur (sqlite3.Cursor): projpicker.db cursor.
+        table (str): Temporary table name.
+        columns (list): List of float column names.
+        rows (list): List of lists of floats, one per column.
+    """
+    projpicker_cur.execute(f"""CREATE TEMP TABLE IF NOT EXISTS {table} (
+                                   geom_id INTEGER PRIMARY KEY,
+                                   {", ".join(f"{c} FLOAT" for c in columns)}
+                               )""")
+    projpicker_cur.execute(f"DELETE FROM temp.{table}")
+    projpicker_cur.executemany(
+            f"""INSERT INTO temp.{table}
+                VALUES (?{", ?" * len(columns)})""",
+            ((i, *row) for i, row in enumerate(rows) if None not in row))
+
+
+def query_temp_geoms_using_cursor(
+        projpicker_cur,
+        geom_table,
+        where,
+        rtree=None,
+        probe=None,
+        query_op="and",
+        unit="any",
+        proj_table="any",
+        params=None):
+    """
+    Return a list of BBox instances in unit in proj_table that completely
+    contain geometries in a temporary table loaded by load_temp_table(). The
+    "and" query operator performs the intersection of bbox rows while the "or"
+    operator the union and the "xor" operator the exclusive OR. The "and"
+    operator tests the candidate rows of the first geometry against all
+    geometries while the "or" and "xor" operators join all geometries with
+    bbox rows and combine the resulting (geom_id, bbox rowid) pairs. Results
+    are sorted by area from the smallest to largest.
+
+    Args:
+        projpicker_cur (sqlite3.Cursor): projpicker.db cursor.
+        geom_table (str): Temporary table name.
+        where (str): SQL condition on geometries p and bbox rows b for
+            containment.
+        rtree (str): R*Tree index table name. Defaults to None.
+        probe (str): SQL condition on geometries p and R*Tree index entries r
+            for finding candidate rows. Defaults to None.
+        query_op (str): Query operator (and, or, xor). Defaults to "and".
+        unit (str): Unit values from projpicker.db. Defaults to "any".
+        proj_table (str): Proj table values from projpicker.db. Defaults to
+            "any".
+        params (dict): Named parameters for the SQL statement. Defaults to
+            None.
+
+    Returns:
+        list: List of queried BBox instances sorted by area.
+
+    Raises:
+        ValueError: If query_op is not one of "and", "or", or "xor".
+    """
+    if query_op not in ("and", "or", "xor"):
+        raise ValueError(f"{query_op}: Invalid query operator")
+
+    if query_op == "and":
+        # bbox rows that contain the first geometry and no geometry outside
+        # them; the first test also rejects rows with NULL extents
+        first = f"p.geom_id = (SELECT min(geom_id) FROM temp.{geom_table})"
+        if rtree:
+            candidates = f"""b.rowid IN (
+                               SELECT r.bbox_rowid
+                               FROM temp.{geom_table} p, {rtree} r
+                               WHERE {first} AND {probe}) AND"""
+        else:
+            candidates = ""
+        sql = f"""SELECT b.*
+                  FROM bbox b
+                  WHERE {candidates}
+                        EXISTS (
+                          SELECT geom_id
+                          FROM temp.{geom_table} p
+                          WHERE {first} AND {where}) AND
+                        NOT EXISTS (
+                          SELECT geom_id
+                          FROM temp.{geom_table} p
+                          WHERE NOT ({where}))
+                        AND_UNIT AND_PROJ_TABLE"""
+    else:
+        if rtree:
+            pairs = f"""SELECT p.geom_id, b.rowid AS bbox_rowid
+                        FROM temp.{geom_table} p, {rtree} r, bbox b
+                        WHERE {probe} AND
+                              b.rowid = r.bbox_rowid AND
+                              {where}
+                              AND_UNIT AND_PROJ_TABLE"""
+        else:
+            pairs = f"""SELECT p.geom_id, b.rowid AS bbox_rowid
+                        FROM temp.{geom_table} p, bbox b
+                        WHERE {where}
+                              AND_UNIT AND_PROJ_TABLE"""
+        if query_op == "xor":
+            having = "HAVING count(DISTINCT geom_id) % 2 = 1"
+        else:
+            having = ""
+        sql = f"""SELECT b.*
+                  FROM bbox b
+                  JOIN (SELECT bbox_rowid
+                        FROM ({pairs})
+                        GROUP BY bbox_rowid
+                        {having}) q
+                  ON b.rowid = q.bbox_rowid"""
+    sql += """
+                  ORDER BY area_sqkm,
+                           proj_table,
+                           crs_auth_name, crs_code,
+                           usage_auth_name, usage_code,
+                           extent_auth_name, extent_code"""
+    outbbox = query_using_cursor(projpicker_cur, sql, unit, proj_table, params)
+    # end the transaction that loading the temporary table opened to release
+    # database locks
+    projpicker_cur.connection.commit()
     return outbbox
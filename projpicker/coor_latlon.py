@@ -4,14 +4,20 @@ system for the ProjPicker API.
 """
 
 import re
+import math
+import json
 import sqlite3
 
 if __package__:
-    from .common import (_coor_sep_pat, _pos_float_pat, get_float,
-                         query_using_cursor)
+    from .common import (_coor_sep, _coor_sep_pat, _pos_float_pat,
+                         _dec_chars, get_float, split_floats, iter_bits,
+                         table_exists, query_using_cursor, load_temp_table,
+                         query_temp_geoms_using_cursor)
 else:
-    from common import (_coor_sep_pat, _pos_float_pat, get_float,
-                        query_using_cursor)
+    from common import (_coor_sep, _coor_sep_pat, _pos_float_pat,
+                        _dec_chars, get_float, split_floats, iter_bits,
+                        table_exists, query_using_cursor, load_temp_table,
+                        query_temp_geoms_using_cursor)
 
 # symbols for degrees, minutes, and seconds (DMS)
 # degree: [°od] (alt+0 in xterm for °)
@@ -156,10 +162,14 @@ def parse_point(point):
     lat = lon = None
     typ = type(point)
     if typ == str:
-        m = _latlon_re.match(point)
-        if m:
-            y = parse_lat(m, 0)
-            x = parse_lon(m, 1)
+        # try plain decimal degrees before the DMS grammar
+        coors = split_floats(point, 2)
+        if coors is None:
+            m = _latlon_re.match(point)
+            if m:
+                coors = parse_lat(m, 0), parse_lon(m, 1)
+        if coors:
+            y, x = coors
             if y is not None and -90 <= y <= 90:
                 lat = y
             if x is not None: # don't check if -180 <= x <= 180 to support
@@ -171,6 +181,40 @@ def parse_point(point):
     return [lat, lon]
 
 
+def parse_points(points):
+    """
+    Parse a list of strs of latitude and longitude in one call, and return a
+    list of lists of latitude and longitude floats in decimal degrees. The
+    output is the same as calling parse_point() for each point, but plain
+    decimal degrees are parsed without a function call per point.
+
+    For example, ["10,20", "30°N,40°W"] returns
+    [[10.0, 20.0], [30.0, -40.0]].
+
+    Args:
+        points (list): List of parsable strs of latitude and longitude.
+
+    Returns:
+        list: List of lists of parsed latitude and longitude in decimal
+        degrees.
+    """
+    outpoints = []
+    for point in points:
+        if type(point) == str and not point.strip(_dec_chars):
+            coors = point.split(_coor_sep)
+            if len(coors) == 2:
+                try:
+                    lat = float(coors[0])
+                    lon = float(coors[1])
+                except ValueError:
+                    pass
+                else:
+                    outpoints.append([lat if -90 <= lat <= 90 else None, lon])
+                    continue
+        outpoints.append(parse_point(point))
+    return outpoints
+
+
 def parse_bbox(bbox):
     """
     Parse a str of south, north, west, and east, and return south, north, west,
@@ -191,12 +235,15 @@ def parse_bbox(bbox):
     s = n = w = e = None
     typ = type(bbox)
     if typ == str:
-        m = _latlon_bbox_re.match(bbox)
-        if m:
-            b = parse_lat(m, 0)
-            t = parse_lat(m, 1)
-            l = parse_lon(m, 2)
-            r = parse_lon(m, 3)
+        # try plain decimal degrees before the DMS grammar
+        coors = split_floats(bbox, 4)
+        if coors is None:
+            m = _latlon_bbox_re.match(bbox)
+            if m:
+                coors = (parse_lat(m, 0), parse_lat(m, 1),
+                         parse_lon(m, 2), parse_lon(m, 3))
+        if coors:
+            b, t, l, r = coors
             if -90 <= b <= 90 and -90 <= t <= 90 and b <= t:
                 s = b
                 n = t
@@ -306,6 +353,54 @@ def is_bbox_within_bbox(bbox1, bbox2):
                -180 <= e <= r and l <= w <= 180))))
 
 
+###############################################################################
+# grid
+
+def find_grid_cell(point):
+    """
+    Return the latitude band and longitude column of the 1-degree grid cell
+    that contains a point. Band 0 starts at latitude -90 and column 0 starts at
+    longitude -180. Latitude 90 and longitude 180 belong to the last band and
+    column, respectively.
+
+    Args:
+        point (list): List of latitude and longitude floats in decimal degrees
+            within [-90, 90] and [-180, 180], respectively.
+
+    Returns:
+        int, int: Latitude band and longitude column.
+    """
+    lat, lon = point
+    return min(math.floor(lat) + 90, 179), min(math.floor(lon) + 180, 359)
+
+
+def find_grid_rowids(projpicker_cur, point):
+    """
+    Return the bbox rowids that fully contain the 1-degree grid cell of a
+    point and those that only partially overlap it using the grid_lat and
+    grid_lon tables. Rows in the first list always contain the point while rows
+    in the second list need to be tested.
+
+    Args:
+        projpicker_cur (sqlite3.Cursor): projpicker.db cursor.
+        point (list): List of latitude and longitude floats in decimal degrees
+            within [-90, 90] and [-180, 180], respectively.
+
+    Returns:
+        list, list: Fully containing and partially overlapping bbox rowids.
+    """
+    lat_band, lon_col = find_grid_cell(point)
+    projpicker_cur.execute("""SELECT la.full, la.overlap, lo.full, lo.overlap
+                              FROM grid_lat la, grid_lon lo
+                              WHERE la.lat_band = ? AND lo.lon_col = ?""",
+                           (lat_band, lon_col))
+    lat_full, lat_overlap, lon_full, lon_overlap = (
+        int.from_bytes(bits, "little") for bits in projpicker_cur.fetchone())
+    full = lat_full & lon_full
+    partial = lat_overlap & lon_overlap & ~full
+    return list(iter_bits(full)), list(iter_bits(partial))
+
+
 ###############################################################################
 # queries
 
@@ -322,7 +417,11 @@ def query_point_using_cursor(
     instances. Each BBox instance is a named tuple with all the columns from
     the bbox table in projpicker.db. This function is used to perform a union
     operation on BBox instances consecutively. Results are sorted by area from
-    the smallest to largest.
+    the smallest to largest. If projpicker.db has the optional grid_lat and
+    grid_lon tables, rows that fully contain the 1-degree grid cell of the
+    point are accepted directly and only partially overlapping rows are tested.
+    Otherwise, if it has the bbox_latlon_rtree R*Tree index, the index is
+    probed first to find candidate rows.
 
     Args:
         projpicker_cur (sqlite3.Cursor): projpicker.db cursor.
@@ -338,25 +437,63 @@ def query_point_using_cursor(
         list: List of queried BBox instances sorted by area.
     """
     lat, lon = parse_point(point)
+    params = {"lat": lat, "lon": lon}
     # if west_lon >= east_lon, bbox crosses the antimeridian
+    where = """:lat BETWEEN south_lat AND north_lat AND
+               (west_lon = east_lon OR
+                (west_lon = -180 AND east_lon = 180) OR
+                (west_lon < east_lon AND
+                 :lon BETWEEN west_lon AND east_lon) OR
+                (west_lon > east_lon AND
+                 (:lon BETWEEN -180 AND east_lon OR
+                  :lon BETWEEN west_lon AND 180)))"""
+    # indices cannot help negated queries and invalid latitudes or longitudes
+    # outside [-180, 180]
+    use_index = (not negate and lat is not None and lon is not None and
+                 -90 <= lat <= 90 and -180 <= lon <= 180)
+    if use_index and table_exists(projpicker_cur, "grid_lat"):
+        # accept rows that fully contain the grid cell and test only rows that
+        # partially overlap it
+        full, partial = find_grid_rowids(projpicker_cur, [lat, lon])
+        params["full"] = json.dumps(full)
+        params["partial"] = json.dumps(partial)
+        sql = f"""SELECT *
+                  FROM bbox
+                  WHERE (rowid IN (SELECT value FROM json_each(:full)) OR
+                         (rowid IN (SELECT value FROM json_each(:partial)) AND
+                          {where}))
+                        AND_UNIT AND_PROJ_TABLE
+                  ORDER BY area_sqkm,
+                           proj_table,
+                           crs_auth_name, crs_code,
+                           usage_auth_name, usage_code,
+                           extent_auth_name, extent_code"""
+        return query_using_cursor(projpicker_cur, sql, unit, proj_table,
+                                  params)
+
+    # probe the R*Tree index first if available
+    if use_index and table_exists(projpicker_cur, "bbox_latlon_rtree"):
+        rtree = """rowid IN (
+                     SELECT bbox_rowid
+                     FROM bbox_latlon_rtree
+                     WHERE south_lat <= :lat AND north_lat >= :lat AND
+                           west_lon <= :lon AND east_lon >= :lon) AND"""
+    else:
+        rtree = ""
+    # negated queries return all rows in unit in proj_table that do not
+    # contain the input geometry including those with NULL extents
     sql = f"""SELECT *
               FROM bbox
-              WHERE {"NOT" if negate else ""}
-                    ({lat} BETWEEN south_lat AND north_lat AND
-                     (west_lon = east_lon OR
-                      (west_lon = -180 AND east_lon = 180) OR
-                      (west_lon < east_lon AND
-                       {lon} BETWEEN west_lon AND east_lon) OR
-                      (west_lon > east_lon AND
-                       ({lon} BETWEEN -180 AND east_lon OR
-                        {lon} BETWEEN west_lon AND 180)))
-                     AND_UNIT AND_PROJ_TABLE)
+              WHERE {rtree}
+                    ({where})
+                    {"IS NOT 1" if negate else ""}
+                    AND_UNIT AND_PROJ_TABLE
               ORDER BY area_sqkm,
                        proj_table,
                        crs_auth_name, crs_code,
                        usage_auth_name, usage_code,
                        extent_auth_name, extent_code"""
-    return query_using_cursor(projpicker_cur, sql, unit, proj_table)
+    return query_using_cursor(projpicker_cur, sql, unit, proj_table, params)
 
 
 def query_bbox_using_cursor(
@@ -372,7 +509,8 @@ def query_bbox_using_cursor(
     instances. Each BBox instance is a named tuple with all the columns from
     the bbox table in projpicker.db. This function is used to perform a union
     operation on bbox rows consecutively. Results are sorted by area from the
-    smallest to largest.
+    smallest to largest. If projpicker.db has the bbox_latlon_rtree R*Tree
+    index, it is probed first to find candidate rows.
 
     Args:
         projpicker_cur (sqlite3.Cursor): projpicker.db cursor.
@@ -388,31 +526,203 @@ def query_bbox_using_cursor(
         list: List of queried BBox instances sorted by area.
     """
     s, n, w, e = parse_bbox(bbox)
+    params = {"s": s, "n": n, "w": w, "e": e}
+    # probe the R*Tree index first if available; any containing bbox row has a
+    # rectangle that contains the west edge of the input bbox; west edges
+    # outside [-180, 180] are only contained in bbox rows that span all
+    # longitudes, which are indexed as [-180, 180], so clamp them
+    if not negate and table_exists(projpicker_cur, "bbox_latlon_rtree"):
+        params["rtree_w"] = max(min(w, 180), -180)
+        rtree = """rowid IN (
+                     SELECT bbox_rowid
+                     FROM bbox_latlon_rtree
+                     WHERE south_lat <= :s AND north_lat >= :n AND
+                           west_lon <= :rtree_w AND
+                           east_lon >= :rtree_w) AND"""
+    else:
+        rtree = ""
+    # negated queries return all rows in unit in proj_table that do not
+    # contain the input geometry including those with NULL extents
     # if west_lon >= east_lon, bbox crosses the antimeridian
     sql = f"""SELECT *
               FROM bbox
-              WHERE {"NOT" if negate else ""}
-                    ({s} BETWEEN south_lat AND north_lat AND
-                     {n} BETWEEN south_lat AND north_lat AND
+              WHERE {rtree}
+                    (:s BETWEEN south_lat AND north_lat AND
+                     :n BETWEEN south_lat AND north_lat AND
                      (west_lon = east_lon OR
                       (west_lon = -180 AND east_lon = 180) OR
                       (west_lon < east_lon AND
-                       {w} <= {e} AND
-                       {w} BETWEEN west_lon AND east_lon AND
-                       {e} BETWEEN west_lon AND east_lon) OR
+                       :w <= :e AND
+                       :w BETWEEN west_lon AND east_lon AND
+                       :e BETWEEN west_lon AND east_lon) OR
                       (west_lon > east_lon AND
-                       (({w} <= {e} AND
-                         (({w} BETWEEN -180 AND east_lon AND
-                           {e} BETWEEN -180 AND east_lon) OR
-                          ({w} BETWEEN west_lon AND 180 AND
-                           {e} BETWEEN west_lon AND 180))) OR
-                        ({w} > {e} AND
-                         {e} BETWEEN -180 AND east_lon AND
-                         {w} BETWEEN west_lon AND 180))))
-                     AND_UNIT AND_PROJ_TABLE)
+                       ((:w <= :e AND
+                         ((:w BETWEEN -180 AND east_lon AND
+                           :e BETWEEN -180 AND east_lon) OR
+                          (:w BETWEEN west_lon AND 180 AND
+                           :e BETWEEN west_lon AND 180))) OR
+                        (:w > :e AND
+                         :e BETWEEN -180 AND east_lon AND
+                         :w BETWEEN west_lon AND 180)))))
+                    {"IS NOT 1" if negate else ""}
+                    AND_UNIT AND_PROJ_TABLE
               ORDER BY area_sqkm,
                        proj_table,
                        crs_auth_name, crs_code,
                        usage_auth_name, usage_code,
                        extent_auth_name, extent_code"""
+    return query_using_cursor(projpicker_cur, sql, unit, proj_table, params)
+
+
+def query_crossing_using_cursor(
+        projpicker_cur,
+        unit="any",
+        proj_table="any"):
+    """
+    Return a list of BBox instances in unit in proj_table that cross the
+    antimeridian. Results are sorted by area from the smallest to largest.
+
+    Args:
+        projpicker_cur (sqlite3.Cursor): projpicker.db cursor.
+        unit (str): Unit values from projpicker.db. Defaults to "any".
+        proj_table (str): Proj table values from projpicker.db. Defaults to
+            "any".
+
+    Returns:
+        list: List of queried BBox instances sorted by area.
+    """
+    # if west_lon > east_lon, bbox crosses the antimeridian
+    sql = """SELECT *
+             FROM bbox
+             WHERE west_lon > east_lon
+                   AND_UNIT AND_PROJ_TABLE
+             ORDER BY area_sqkm,
+                      proj_table,
+                      crs_auth_name, crs_code,
+                      usage_auth_name, usage_code,
+                      extent_auth_name, extent_code"""
     return query_using_cursor(projpicker_cur, sql, unit, proj_table)
+
+
+def query_points_using_cursor(
+        projpicker_cur,
+        points,
+        query_op="and",
+        unit="any",
+        proj_table="any"):
+    """
+    Return a list of BBox instances in unit in proj_table that completely
+    contain input point geometries defined by latitude and longitude in
+    decimal degrees. The "and" query operator performs the intersection of
+    bbox rows while the "or" operator the union and the "xor" operator the
+    exclusive OR. All points are bulk-inserted into a temporary table and
+    queried at once. If projpicker.db has the bbox_latlon_rtree R*Tree index,
+    it is probed first to find candidate rows. Results are sorted by area from
+    the smallest to largest.
+
+    Args:
+        projpicker_cur (sqlite3.Cursor): projpicker.db cursor.
+        points (list): List of lists of latitude and longitude floats in
+            decimal degrees or parsable strs of latitude and longitude. See
+            parse_point().
+        query_op (str): Query operator (and, or, xor). Defaults to "and".
+        unit (str): Unit values from projpicker.db. Defaults to "any".
+        proj_table (str): Proj table values from projpicker.db. Defaults to
+            "any".
+
+    Returns:
+        list: List of queried BBox instances sorted by area.
+
+    Raises:
+        ValueError: If query_op is not one of "and", "or", or "xor".
+    """
+    load_temp_table(projpicker_cur, "query_latlon_point", ("lat", "lon"),
+                    parse_points(points))
+    # if west_lon >= east_lon, bbox crosses the antimeridian
+    where = """p.lat BETWEEN b.south_lat AND b.north_lat AND
+               (b.west_lon = b.east_lon OR
+                (b.west_lon = -180 AND b.east_lon = 180) OR
+                (b.west_lon < b.east_lon AND
+                 p.lon BETWEEN b.west_lon AND b.east_lon) OR
+                (b.west_lon > b.east_lon AND
+                 (p.lon BETWEEN -180 AND b.east_lon OR
+                  p.lon BETWEEN b.west_lon AND 180)))"""
+    # longitudes outside [-180, 180] are only contained in bbox rows that span
+    # all longitudes, which are indexed as [-180, 180], so clamp them
+    if table_exists(projpicker_cur, "bbox_latlon_rtree"):
+        rtree = "bbox_latlon_rtree"
+        probe = """r.south_lat <= p.lat AND r.north_lat >= p.lat AND
+                   r.west_lon <= max(min(p.lon, 180), -180) AND
+                   r.east_lon >= max(min(p.lon, 180), -180)"""
+    else:
+        rtree = probe = None
+    return query_temp_geoms_using_cursor(projpicker_cur, "query_latlon_point",
+                                         where, rtree, probe, query_op, unit,
+                                         proj_table)
+
+
+def query_bboxes_using_cursor(
+        projpicker_cur,
+        bboxes,
+        query_op="and",
+        unit="any",
+        proj_table="any"):
+    """
+    Return a list of BBox instances in unit in proj_table that completely
+    contain input bbox geometries defined by south, north, west, and east. The
+    "and" query operator performs the intersection of bbox rows while the "or"
+    operator the union and the "xor" operator the exclusive OR. All bboxes are
+    bulk-inserted into a temporary table and queried at once. If projpicker.db
+    has the bbox_latlon_rtree R*Tree index, it is probed first to find
+    candidate rows. Results are sorted by area from the smallest to largest.
+
+    Args:
+        projpicker_cur (sqlite3.Cursor): projpicker.db cursor.
+        bboxes (list): List of lists of south, north, west, and east floats in
+            decimal degrees or parsable strs of south, north, west, and east.
+            See parse_bbox().
+        query_op (str): Query operator (and, or, xor). Defaults to "and".
+        unit (str): Unit values from projpicker.db. Defaults to "any".
+        proj_table (str): Proj table values from projpicker.db. Defaults to
+            "any".
+
+    Returns:
+        list: List of queried BBox instances sorted by area.
+
+    Raises:
+        ValueError: If query_op is not one of "and", "or", or "xor".
+    """
+    load_temp_table(projpicker_cur, "query_latlon_bbox", ("s", "n", "w", "e"),
+                    (parse_bbox(bbox) for bbox in bboxes))
+    # if west_lon >= east_lon, bbox crosses the antimeridian
+    where = """p.s BETWEEN b.south_lat AND b.north_lat AND
+               p.n BETWEEN b.south_lat AND b.north_lat AND
+               (b.west_lon = b.east_lon OR
+                (b.west_lon = -180 AND b.east_lon = 180) OR
+                (b.west_lon < b.east_lon AND
+                 p.w <= p.e AND
+                 p.w BETWEEN b.west_lon AND b.east_lon AND
+                 p.e BETWEEN b.west_lon AND b.east_lon) OR
+                (b.west_lon > b.east_lon AND
+                 ((p.w <= p.e AND
+                   ((p.w BETWEEN -180 AND b.east_lon AND
+                     p.e BETWEEN -180 AND b.east_lon) OR
+                    (p.w BETWEEN b.west_lon AND 180 AND
+                     p.e BETWEEN b.west_lon AND 180))) OR
+                  (p.w > p.e AND
+                   p.e BETWEEN -180 AND b.east_lon AND
+                   p.w BETWEEN b.west_lon AND 180))))"""
+    # any containing bbox row has a rectangle that contains the west edge of
+    # the input bbox; west edges outside [-180, 180] are only contained in
+    # bbox rows that span all longitudes, which are indexed as [-180, 180], so
+    # clamp them
+    if table_exists(projpicker_cur, "bbox_latlon_rtree"):
+        rtree = "bbox_latlon_rtree"
+        probe = """r.south_lat <= p.s AND r.north_lat >= p.n AND
+                   r.west_lon <= max(min(p.w, 180), -180) AND
+                   r.east_lon >= max(min(p.w, 180), -180)"""
+    else:
+        rtree = probe = None
+    return query_temp_geoms_using_cursor(projpicker_cur, "query_latlon_bbox",
+                                         where, rtree, probe, query_op, unit,
+                                         proj_table)
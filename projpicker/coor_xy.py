@@ -8,10 +8,12 @@ import sqlite3
 
 if __package__:
     from .common import (_pos_float_pat, _coor_sep_pat, get_float,
-                         query_using_cursor)
+                         table_exists, query_using_cursor, load_temp_table,
+                         query_temp_geoms_using_cursor)
 else:
     from common import (_pos_float_pat, _coor_sep_pat, get_float,
-                        query_using_cursor)
+                        table_exists, query_using_cursor, load_temp_table,
+                        query_temp_geoms_using_cursor)
 
 # x,y
 _xy_pat = f"([+-]?{_pos_float_pat}){_coor_sep_pat}([+-]?{_pos_float_pat})"
@@ -53,6 +55,31 @@ def parse_point(point):
     return [x, y]
 
 
+def parse_points(points):
+    """
+    Parse a list of strs of x and y in one call, and return a list of lists of
+    x and y floats. The output is the same as calling parse_point() for each
+    point, but strs are matched without a function call per point.
+
+    For example, ["10,20", "30 40"] returns [[10.0, 20.0], [30.0, 40.0]].
+
+    Args:
+        points (list): List of parsable strs of x and y.
+
+    Returns:
+        list: List of lists of parsed x and y floats.
+    """
+    outpoints = []
+    xy_match = _xy_re.match
+    for point in points:
+        m = xy_match(point) if type(point) == str else None
+        if m:
+            outpoints.append([float(m[1]), float(m[2])])
+        else:
+            outpoints.append(parse_point(point))
+    return outpoints
+
+
 def parse_bbox(bbox):
     """
     Parse a str of bottom, top, left, and right, and return bottom, top, left,
@@ -171,6 +198,44 @@ def is_bbox_within_bbox(bbox1, bbox2):
 ###############################################################################
 # queries
 
+def find_unit_id(projpicker_cur, unit):
+    """
+    Find and return the unit_id of a unit in the bbox_unit table for the
+    bbox_xy_rtree R*Tree index. If unit is "any", None is returned. If unit is
+    not found, 0 is returned, which matches no index entries.
+
+    Args:
+        projpicker_cur (sqlite3.Cursor): projpicker.db cursor.
+        unit (str): "any", unit values from projpicker.db.
+
+    Returns:
+        int or None: unit_id or None if unit is "any".
+    """
+    if unit == "any":
+        return None
+    projpicker_cur.execute("""SELECT unit_id
+                              FROM bbox_unit
+                              WHERE unit = ?""", (unit,))
+    row = projpicker_cur.fetchone()
+    return row[0] if row else 0
+
+
+def get_rtree_where(unit):
+    """
+    Return the unit partition condition for the bbox_xy_rtree R*Tree index.
+    The condition uses the :unit_id named parameter. See find_unit_id().
+
+    Args:
+        unit (str): "any", unit values from projpicker.db.
+
+    Returns:
+        str: SQL condition followed by AND or an empty str for "any" unit.
+    """
+    if unit == "any":
+        return ""
+    return "unit_min <= :unit_id AND unit_max >= :unit_id AND"
+
+
 def query_point_using_cursor(
         projpicker_cur,
         point,
@@ -183,7 +248,9 @@ def query_point_using_cursor(
     to return non-containing BBox instances. Each BBox instance is a named
     tuple with all the columns from the bbox table in projpicker.db. This
     function is used to perform a union operation on BBox instances
-    consecutively. Results are sorted by area from the smallest to largest.
+    consecutively. Results are sorted by area from the smallest to largest. If
+    projpicker.db has the bbox_xy_rtree R*Tree index, its unit partition is
+    probed first to find candidate rows.
 
     Args:
         projpicker_cur (sqlite3.Cursor): projpicker.db cursor.
@@ -198,18 +265,33 @@ def query_point_using_cursor(
         list: List of queried BBox instances sorted by area.
     """
     x, y = parse_point(point)
-    # if west_lon >= east_lon, bbox crosses the antimeridian
+    params = {"x": x, "y": y}
+    # probe the R*Tree index in the unit partition first if available
+    if not negate and table_exists(projpicker_cur, "bbox_xy_rtree"):
+        params["unit_id"] = find_unit_id(projpicker_cur, unit)
+        rtree = f"""rowid IN (
+                      SELECT bbox_rowid
+                      FROM bbox_xy_rtree
+                      WHERE {get_rtree_where(unit)}
+                            left <= :x AND right >= :x AND
+                            bottom <= :y AND top >= :y) AND"""
+    else:
+        rtree = ""
+    # negated queries return all rows in unit in proj_table that do not
+    # contain the input geometry including those with NULL extents
     sql = f"""SELECT *
               FROM bbox
-              WHERE {"NOT" if negate else ""}
-                    ({x} BETWEEN left AND right AND
-                     {y} BETWEEN bottom AND top AND_UNIT)
+              WHERE {rtree}
+                    (:x BETWEEN left AND right AND
+                     :y BETWEEN bottom AND top)
+                    {"IS NOT 1" if negate else ""}
+                    AND_UNIT AND_PROJ_TABLE
               ORDER BY area_sqkm,
                        proj_table,
                        crs_auth_name, crs_code,
                        usage_auth_name, usage_code,
                        extent_auth_name, extent_code"""
-    return query_using_cursor(projpicker_cur, sql, unit, proj_table)
+    return query_using_cursor(projpicker_cur, sql, unit, proj_table, params)
 
 
 def query_bbox_using_cursor(
@@ -225,7 +307,8 @@ def query_bbox_using_cursor(
     non-containing BBox instances. Each BBox instance is a named tuple with all
     the columns from the bbox table in projpicker.db. This function is used to
     perform a union operation on bbox rows consecutively. Results are sorted by
-    area from the smallest to largest.
+    area from the smallest to largest. If projpicker.db has the bbox_xy_rtree
+    R*Tree index, its unit partition is probed first to find candidate rows.
 
     Args:
         projpicker_cur (sqlite3.Cursor): projpicker.db cursor.
@@ -240,16 +323,152 @@ def query_bbox_using_cursor(
         list: List of queried BBox instances sorted by area.
     """
     b, t, l, r = parse_bbox(bbox)
+    params = {"b": b, "t": t, "l": l, "r": r}
+    # probe the R*Tree index in the unit partition first if available
+    if not negate and table_exists(projpicker_cur, "bbox_xy_rtree"):
+        params["unit_id"] = find_unit_id(projpicker_cur, unit)
+        rtree = f"""rowid IN (
+                      SELECT bbox_rowid
+                      FROM bbox_xy_rtree
+                      WHERE {get_rtree_where(unit)}
+                            left <= :l AND right >= :r AND
+                            bottom <= :b AND top >= :t) AND"""
+    else:
+        rtree = ""
+    # negated queries return all rows in unit in proj_table that do not
+    # contain the input geometry including those with NULL extents
     sql = f"""SELECT *
               FROM bbox
-              WHERE {"NOT" if negate else ""}
-                    ({l} BETWEEN left AND right AND
-                     {r} BETWEEN left AND right AND
-                     {b} BETWEEN bottom AND top AND
-                     {t} BETWEEN bottom AND top AND_UNIT)
+              WHERE {rtree}
+                    (:l BETWEEN left AND right AND
+                     :r BETWEEN left AND right AND
+                     :b BETWEEN bottom AND top AND
+                     :t BETWEEN bottom AND top)
+                    {"IS NOT 1" if negate else ""}
+                    AND_UNIT AND_PROJ_TABLE
               ORDER BY area_sqkm,
                        proj_table,
                        crs_auth_name, crs_code,
                        usage_auth_name, usage_code,
                        extent_auth_name, extent_code"""
-    return query_using_cursor(projpicker_cur, sql, unit, proj_table)
+    return query_using_cursor(projpicker_cur, sql, unit, proj_table, params)
+
+
+def query_crossing_using_cursor(
+        projpicker_cur,
+        unit="any",
+        proj_table="any"):
+    """
+    Return an empty list because no x-y extents cross the antimeridian. This
+    function exists for compatibility with coor_latlon.
+
+    Args:
+        projpicker_cur (sqlite3.Cursor): projpicker.db cursor.
+        unit (str): "any", unit values from projpicker.db.
+        proj_table (str): Proj table values from projpicker.db. Defaults to
+            "any".
+
+    Returns:
+        list: Empty list.
+    """
+    return []
+
+
+def query_points_using_cursor(
+        projpicker_cur,
+        points,
+        query_op="and",
+        unit="any",
+        proj_table="any"):
+    """
+    Return a list of BBox instances in unit in proj_table that completely
+    contain input point geometries defined by x and y. The "and" query
+    operator performs the intersection of bbox rows while the "or" operator
+    the union and the "xor" operator the exclusive OR. All points are
+    bulk-inserted into a temporary table and queried at once. If projpicker.db
+    has the bbox_xy_rtree R*Tree index, its unit partition is probed first to
+    find candidate rows. Results are sorted by area from the smallest to
+    largest.
+
+    Args:
+        projpicker_cur (sqlite3.Cursor): projpicker.db cursor.
+        points (list): List of lists of x and y floats or parsable strs of x
+            and y. See parse_point().
+        query_op (str): Query operator (and, or, xor). Defaults to "and".
+        unit (str): "any", unit values from projpicker.db.
+        proj_table (str): Proj table values from projpicker.db. Defaults to
+            "any".
+
+    Returns:
+        list: List of queried BBox instances sorted by area.
+
+    Raises:
+        ValueError: If query_op is not one of "and", "or", or "xor".
+    """
+    load_temp_table(projpicker_cur, "query_xy_point", ("x", "y"),
+                    parse_points(points))
+    where = """p.x BETWEEN b.left AND b.right AND
+               p.y BETWEEN b.bottom AND b.top"""
+    params = {}
+    if table_exists(projpicker_cur, "bbox_xy_rtree"):
+        params["unit_id"] = find_unit_id(projpicker_cur, unit)
+        rtree = "bbox_xy_rtree"
+        probe = f"""{get_rtree_where(unit)}
+                    r.left <= p.x AND r.right >= p.x AND
+                    r.bottom <= p.y AND r.top >= p.y"""
+    else:
+        rtree = probe = None
+    return query_temp_geoms_using_cursor(projpicker_cur, "query_xy_point",
+                                         where, rtree, probe, query_op, unit,
+                                         proj_table, params)
+
+
+def query_bboxes_using_cursor(
+        projpicker_cur,
+        bboxes,
+        query_op="and",
+        unit="any",
+        proj_table="any"):
+    """
+    Return a list of BBox instances in unit in proj_table that completely
+    contain input bbox geometries defined by bottom, top, left, and right. The
+    "and" query operator performs the intersection of bbox rows while the "or"
+    operator the union and the "xor" operator the exclusive OR. All bboxes are
+    bulk-inserted into a temporary table and queried at once. If projpicker.db
+    has the bbox_xy_rtree R*Tree index, its unit partition is probed first to
+    find candidate rows. Results are sorted by area from the smallest to
+    largest.
+
+    Args:
+        projpicker_cur (sqlite3.Cursor): projpicker.db cursor.
+        bboxes (list): List of lists of bottom, top, left, and right floats or
+            parsable strs of bottom, top, left, and right. See parse_bbox().
+        query_op (str): Query operator (and, or, xor). Defaults to "and".
+        unit (str): "any", unit values from projpicker.db.
+        proj_table (str): Proj table values from projpicker.db. Defaults to
+            "any".
+
+    Returns:
+        list: List of queried BBox instances sorted by area.
+
+    Raises:
+        ValueError: If query_op is not one of "and", "or", or "xor".
+    """
+    load_temp_table(projpicker_cur, "query_xy_bbox", ("b", "t", "l", "r"),
+                    (parse_bbox(bbox) for bbox in bboxes))
+    where = """p.l BETWEEN b.left AND b.right AND
+               p.r BETWEEN b.left AND b.right AND
+               p.b BETWEEN b.bottom AND b.top AND
+               p.t BETWEEN b.bottom AND b.top"""
+    params = {}
+    if table_exists(projpicker_cur, "bbox_xy_rtree"):
+        params["unit_id"] = find_unit_id(projpicker_cur, unit)
+        rtree = "bbox_xy_rtree"
+        probe = f"""{get_rtree_where(unit)}
+                    r.left <= p.l AND r.right >= p.r AND
+                    r.bottom <= p.b AND r.top >= p.t"""
+    else:
+        rtree = probe = None
+    return query_temp_geoms_using_cursor(projpicker_cur, "query_xy_bbox",
+                                         where, rtree, probe, query_op, unit,
+                                         proj_table, params)
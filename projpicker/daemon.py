@@ -0,0 +1,428 @@
+"""
+This module implements a long-running query daemon for the ProjPicker CLI and
+its client. The daemon listens on a local Unix socket and runs command-line
+requests from clients one at a time in the same process, so projpicker.db
+stays open and its caches stay warm across requests. The client sends its
+arguments, working directory, environment variables, and stdin, and writes
+stdout, stderr, and the exit status it receives, so connected commands behave
+like in-process ones. Messages are framed by a one-byte channel and a
+four-byte length. Only the Python standard library is used, so this module
+can be run as a thin client script that does not import the rest of
+ProjPicker unless no daemon is running.
+"""
+
+import os
+import sys
+import io
+import json
+import signal
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+import traceback
+
+if not hasattr(socket, "AF_UNIX"):
+    raise ImportError("Unix domain sockets are not supported")
+
+# environment variable for the default socket path
+_socket_env = "PROJPICKER_SOCKET"
+
+# prefixes of environment variables sent to the daemon with requests
+_env_prefixes = ("PROJPICKER_", "PROJ_")
+
+# frame header of a one-byte channel and a four-byte payload length; channels
+# are r for the request, o for stdout, e for stderr, and x for exit status
+_frame_header = struct.Struct("!cI")
+
+# number of bytes read from stdin or written to stdout at once
+_chunk_size = 65536
+
+# whether or not this process is serving requests
+_serving = False
+
+
+class RequestStdin(io.StringIO):
+    """
+    Provide the empty stdin of a client whose stdin is a terminal.
+    """
+
+    def isatty(self):
+        """
+        Return True because the stdin of the client is a terminal.
+
+        Returns:
+            bool: True.
+        """
+        return True
+
+
+class FrameWriter(io.RawIOBase):
+    """
+    Provide a writable raw stream that sends written bytes as frames on one
+    channel.
+    """
+
+    def __init__(self, wfile, channel):
+        """
+        Create a frame writer.
+
+        Args:
+            wfile (io.BufferedIOBase): Writable socket file.
+            channel (bytes): One-byte channel.
+        """
+        self.wfile = wfile
+        self.channel = channel
+
+    def writable(self):
+        """
+        Return True because frames are writable.
+
+        Returns:
+            bool: True.
+        """
+        return True
+
+    def write(self, b):
+        """
+        Send bytes as one frame.
+
+        Args:
+            b (bytes-like): Bytes to send.
+
+        Returns:
+            int: Number of bytes sent.
+        """
+        write_frame(self.wfile, self.channel, bytes(b))
+        self.wfile.flush()
+        return len(b)
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """
+    Implement the request handler of the daemon.
+    """
+
+    def handle(self):
+        """
+        Run one command-line request with its stdin, stdout, stderr, working
+        directory, and environment variables, and send its exit status.
+        """
+        frame = read_frame(self.rfile)
+        if not frame or frame[0] != b"r":
+            return
+        request = json.loads(frame[1])
+
+        if request["isatty"]:
+            stdin = RequestStdin()
+        else:
+            stdin = io.TextIOWrapper(self.rfile, encoding="utf-8")
+        stdout = io.TextIOWrapper(
+                io.BufferedWriter(FrameWriter(self.wfile, b"o"), _chunk_size),
+                encoding="utf-8")
+        stderr = io.TextIOWrapper(FrameWriter(self.wfile, b"e"),
+                                  encoding="utf-8", write_through=True)
+
+        saved_stdio = sys.stdin, sys.stdout, sys.stderr
+        saved_cwd = os.getcwd()
+        # unset variables that the client does not have
+        env = {name: None for name in os.environ
+               if name.startswith(_env_prefixes)}
+        env.update(request["env"])
+        saved_env = {name: os.environ.get(name) for name in env}
+        try:
+            sys.stdin, sys.stdout, sys.stderr = stdin, stdout, stderr
+            os.chdir(request["cwd"])
+            set_environ(env)
+            status = self.server.main(request["argv"]) or 0
+        except SystemExit as e:
+            if e.code is None or type(e.code) == int:
+                status = e.code or 0
+            else:
+                print(e.code, file=sys.stderr)
+                status = 1
+        except Exception:
+            traceback.print_exc()
+            status = 1
+        finally:
+            sys.stdin, sys.stdout, sys.stderr = saved_stdio
+            os.chdir(saved_cwd)
+            set_environ(saved_env)
+            stdout.flush()
+            if not request["isatty"]:
+                stdin.detach()
+
+        write_frame(self.wfile, b"x", str(status).encode())
+
+
+class DaemonServer(socketserver.UnixStreamServer):
+    """
+    Implement the daemon server that handles requests one at a time.
+    """
+
+    def __init__(self, socket_path, main):
+        """
+        Create a daemon server listening on a Unix socket.
+
+        Args:
+            socket_path (str): Unix socket path.
+            main (function): Function that runs a list of command-line
+                arguments and returns its exit status.
+        """
+        self.main = main
+        super().__init__(socket_path, RequestHandler)
+
+
+def get_socket_path(socket_path=None):
+    """
+    Return the Unix socket path of the daemon. If one is given as an
+    argument, return it as is. Otherwise (None), check the PROJPICKER_SOCKET
+    environment variable. If this variable is not available, return
+    projpicker-UID.sock in XDG_RUNTIME_DIR or the temporary directory.
+
+    Args:
+        socket_path (str): User-provided socket path. Defaults to None.
+
+    Returns:
+        str: Unix socket path.
+    """
+    if socket_path is None:
+        socket_path = os.environ.get(_socket_env)
+        if socket_path is None:
+            socket_path = os.path.join(
+                    os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir(),
+                    f"projpicker-{os.getuid()}.sock")
+    return socket_path
+
+
+def set_environ(env):
+    """
+    Set or unset environment variables.
+
+    Args:
+        env (dict): Dictionary of environment variable values by name. None
+            unsets its variable.
+    """
+    for name, value in env.items():
+        if value is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = value
+
+
+def write_frame(wfile, channel, data):
+    """
+    Write a frame of a channel and its payload.
+
+    Args:
+        wfile (io.BufferedIOBase): Writable file.
+        channel (bytes): One-byte channel.
+        data (bytes): Payload.
+    """
+    wfile.write(_frame_header.pack(channel, len(data)))
+    wfile.write(data)
+
+
+def read_frame(rfile):
+    """
+    Read a frame and return its channel and payload. If the file ends before
+    a whole frame, None is returned.
+
+    Args:
+        rfile (io.BufferedIOBase): Readable file.
+
+    Returns:
+        tuple or None: Channel bytes and payload bytes or None.
+    """
+    header = rfile.read(_frame_header.size)
+    if len(header) < _frame_header.size:
+        return None
+    channel, size = _frame_header.unpack(header)
+    data = rfile.read(size)
+    if len(data) < size:
+        return None
+    return channel, data
+
+
+def is_running(socket_path=None):
+    """
+    Return True if a daemon is listening on a Unix socket. Otherwise, return
+    False. See get_socket_path().
+
+    Args:
+        socket_path (str): Unix socket path. Defaults to None.
+
+    Returns:
+        bool: True if a daemon is running. Otherwise, False.
+    """
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(get_socket_path(socket_path))
+    except OSError:
+        return False
+    return True
+
+
+def start(main, socket_path=None):
+    """
+    Start the daemon on a Unix socket and run requests until it is
+    interrupted or terminated. A terminated daemon finishes its current
+    request before it stops. Only the owner can connect to the socket, and
+    a stale socket file left by a daemon that did not exit cleanly is
+    replaced. The socket file is removed on exit. See get_socket_path().
+
+    Args:
+        main (function): Function that runs a list of command-line arguments
+            and returns its exit status.
+        socket_path (str): Unix socket path. Defaults to None.
+
+    Raises:
+        FileExistsError: If another daemon is already running on socket_path.
+    """
+    global _serving
+
+    socket_path = get_socket_path(socket_path)
+    if is_running(socket_path):
+        raise FileExistsError(f"{socket_path}: Daemon already running")
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    umask = os.umask(0o177)
+    try:
+        server = DaemonServer(socket_path, main)
+    finally:
+        os.umask(umask)
+
+    # stop serving on SIGTERM after the current request to remove the socket
+    # file; shutdown() waits for serve_forever() to return in this thread, so
+    # it is called from another thread
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(
+                                        target=server.shutdown).start())
+
+    _serving = True
+    try:
+        print(f"Listening on {socket_path}", file=sys.stderr, flush=True)
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        _serving = False
+        server.server_close()
+        os.remove(socket_path)
+
+
+def connect(argv, socket_path=None):
+    """
+    Run command-line arguments in the daemon and return their exit status.
+    The working directory, PROJPICKER_* and PROJ_* environment variables, and
+    stdin are sent along with the arguments, and stdout and stderr from the
+    daemon are written as they are received. If no daemon is running or this
+    process is the daemon itself, None is returned to let the caller run the
+    arguments in process. See get_socket_path().
+
+    Args:
+        argv (list): List of command-line arguments.
+        socket_path (str): Unix socket path. Defaults to None.
+
+    Returns:
+        int or None: Exit status or None if no daemon is running.
+    """
+    def send_stdin():
+        # read the file descriptor directly because a daemon thread blocked
+        # in buffered stdin would abort the interpreter at shutdown
+        try:
+            while True:
+                data = os.read(stdin_fd, _chunk_size)
+                if not data:
+                    break
+                wfile.write(data)
+                wfile.flush()
+        except OSError:
+            # the daemon stopped reading stdin
+            pass
+        finally:
+            try:
+                sock.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+
+    if _serving:
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(get_socket_path(socket_path))
+    except OSError:
+        sock.close()
+        return None
+
+    with sock:
+        rfile = sock.makefile("rb")
+        wfile = sock.makefile("wb")
+
+        isatty = sys.stdin is None or sys.stdin.isatty()
+        env = {name: value for name, value in os.environ.items()
+               if name.startswith(_env_prefixes)}
+        request = {"argv": list(argv), "cwd": os.getcwd(), "env": env,
+                   "isatty": isatty}
+        write_frame(wfile, b"r", json.dumps(request).encode())
+        wfile.flush()
+
+        if isatty:
+            sock.shutdown(socket.SHUT_WR)
+        else:
+            # send stdin while receiving stdout to avoid filling both buffers
+            stdin_fd = sys.stdin.fileno()
+            sender = threading.Thread(target=send_stdin, daemon=True)
+            sender.start()
+
+        status = None
+        while status is None:
+            frame = read_frame(rfile)
+            if frame is None:
+                print("Connection to daemon closed", file=sys.stderr)
+                status = 1
+            elif frame[0] == b"o":
+                sys.stdout.buffer.write(frame[1])
+                sys.stdout.flush()
+            elif frame[0] == b"e":
+                sys.stderr.buffer.write(frame[1])
+                sys.stderr.flush()
+            elif frame[0] == b"x":
+                status = int(frame[1])
+    return status
+
+
+def main(argv=None):
+    """
+    Run command-line arguments in the daemon as a thin client or in process
+    if no daemon is running, and return their exit status. Only the -U and
+    --socket options are read here and all the other arguments are passed
+    to projpicker.main() as they are.
+
+    Args:
+        argv (list): List of command-line arguments. Defaults to None for
+            sys.argv[1:].
+
+    Returns:
+        int: Exit status.
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    parser.add_argument("-U", "--socket")
+    args, argv = parser.parse_known_args(argv)
+
+    status = connect(argv, args.socket)
+    if status is None:
+        if __package__:
+            from .projpicker import main as projpicker_main
+        else:
+            from projpicker import main as projpicker_main
+        status = projpicker_main(argv) or 0
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
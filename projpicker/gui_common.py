@@ -13,6 +13,19 @@ _projpicker_coordinates_env = "PROJPICKER_COORDINATES"
 _projpicker_zoom_env = "PROJPICKER_ZOOM"
 _projpicker_dzoom_env = "PROJPICKER_DZOOM"
 
+# maximum number of geometry results cached for re-queries
+_geom_cache_size = 64
+
+
+def enable_geom_cache():
+    """
+    Enable the geometry result cache of the ProjPicker API unless it is already
+    enabled, so that re-queries of unchanged geometries skip projpicker.db. See
+    projpicker.set_geom_cache_size().
+    """
+    if not ppik.get_geom_cache_size():
+        ppik.set_geom_cache_size(_geom_cache_size)
+
 
 def get_latlon():
     """
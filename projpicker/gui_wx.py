@@ -19,13 +19,13 @@ if __package__:
     from . import projpicker as ppik
     from .gui_common import (get_latlon, get_zoom, get_dzoom, parse_geoms,
                              adjust_lon, calc_geoms_bbox, create_crs_info,
-                             find_bbox)
+                             find_bbox, enable_geom_cache)
     from .getosm import OpenStreetMap
 else:
     import projpicker as ppik
     from gui_common import (get_latlon, get_zoom, get_dzoom, parse_geoms,
                             adjust_lon, calc_geoms_bbox, create_crs_info,
-                            find_bbox)
+                            find_bbox, enable_geom_cache)
     from getosm import OpenStreetMap
 
 
@@ -57,6 +57,8 @@ def start(
         list, list, list: Lists of selected BBox instances, queried BBox
         instances sorted by area, and parsed geometries.
     """
+    enable_geom_cache()
+
     sel_crs = []
     prev_crs_items = []
     sel_bbox = []
@@ -477,8 +479,9 @@ def start(
         query = query_text.Value
         geoms.clear()
         try:
-            geoms.extend(ppik.parse_mixed_geoms(query))
-            bbox = ppik.query_mixed_geoms(geoms, projpicker_db)
+            parsed_geoms = ppik.parse_mixed_geoms(query)
+            geoms.extend(parsed_geoms)
+            bbox = ppik.query_mixed_geoms(parsed_geoms, projpicker_db)
         except Exception as e:
             log_text.SetValue(str(e))
             notebook.ChangeSelection(log_panel.page)
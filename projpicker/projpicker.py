@@ -28,12 +28,17 @@ This module implements the CLI and API of ProjPicker.
 """
 
 import collections
+import concurrent.futures
+import copy
+import itertools
 import os
 import sys
 import argparse
 import sqlite3
 import re
 import math
+import time
+import hashlib
 import json
 import pprint
 
@@ -45,9 +50,17 @@ except:
 # https://stackoverflow.com/a/49480246/16079666
 if __package__:
     from .common import (BBox, _coor_sep, _pos_float_pat, _bbox_schema,
-                         _bbox_columns, is_verbose, get_float)
+                         _bbox_latlon_rtree_schema, _bbox_unit_schema,
+                         _bbox_xy_rtree_schema, _grid_lat_schema,
+                         _grid_lon_schema, _bbox_columns, is_verbose,
+                         get_float, iter_bits, get_connection, close_connections,
+                         set_sqlite_pragmas, set_sqlite_immutable,
+                         get_file_stamp, LRUCache)
     from . import coor_latlon
     from . import coor_xy
+    from . import slab
+    from . import readers
+    from .readers import _input_formats
     try:
         from . import gui
     except Exception:
@@ -56,11 +69,23 @@ if __package__:
         from . import web
     except Exception:
         web = None
+    try:
+        from . import daemon
+    except ImportError:
+        daemon = None
 else:
     from common import (BBox, _coor_sep, _pos_float_pat, _bbox_schema,
-                        _bbox_columns, is_verbose, get_float)
+                        _bbox_latlon_rtree_schema, _bbox_unit_schema,
+                        _bbox_xy_rtree_schema, _grid_lat_schema,
+                        _grid_lon_schema, _bbox_columns, is_verbose,
+                        get_float, iter_bits, get_connection, close_connections,
+                        set_sqlite_pragmas, set_sqlite_immutable,
+                        get_file_stamp, LRUCache)
     import coor_latlon
     import coor_xy
+    import slab
+    import readers
+    from readers import _input_formats
     try:
         import gui
     except Exception:
@@ -69,6 +94,10 @@ else:
         import web
     except Exception:
         web = None
+    try:
+        import daemon
+    except ImportError:
+        daemon = None
 
 # module path
 _module_path = os.path.dirname(__file__)
@@ -78,6 +107,12 @@ _projpicker_db_env = "PROJPICKER_DB"
 _proj_db_env = "PROJ_DB"
 # https://proj.org/usage/environmentvars.html
 _proj_lib_env = "PROJ_LIB"
+# environment variable for the default query engine
+_projpicker_engine_env = "PROJPICKER_ENGINE"
+
+# columnar module imported on first use by the numpy engine; see
+# get_bbox_columns()
+_columnar = None
 
 # Earth parameters from https://en.wikipedia.org/wiki/Earth_radius#Global_radii
 # equatorial radius in km
@@ -89,11 +124,66 @@ _geom_var_chars = "([a-zA-Z0-9_]+)"
 _geom_var_re = re.compile(f"^(?:{_geom_var_chars}:|:{_geom_var_chars}:|"
                           f":{_geom_var_chars})$")
 
+# word starting with a number
+_num_word_re = re.compile(f"^[+-]?{_pos_float_pat}")
+# unit constraint with unquoted whitespaces
+_unit_words_re = re.compile("""^([^ =]+=)([^"'].*)$""")
+# word starting a quoted str optionally after a constraint
+_quote_word_re = re.compile("""^(|[a-z_]+=)(["'])(.*)$""")
+
+# kinds of keywords in mixed geometries
+_keyword_kinds = {
+    "and": "operator",
+    "or": "operator",
+    "xor": "operator",
+    "not": "operator",
+    "match": "operator",
+    "none": "special",
+    "all": "special",
+    "point": "type",
+    "poly": "type",
+    "bbox": "type",
+    "latlon": "coor_sys",
+    "xy": "coor_sys"
+}
+# constraining directives in mixed geometries
+_constraints = ("unit", "proj_table", "match_tol", "match_max")
+
 # geometry-bbox namedtuple class
 GeomBBox = collections.namedtuple("GeomBBox", "is_latlon type geom bbox")
 # geometry namedtuple class
 Geom = collections.namedtuple("Geom", "is_latlon type geom")
 
+# all BBox instances by projpicker.db version, unit, and proj_table
+_bbox_all_cache = LRUCache(32)
+# all BBox instances, their positions, and bitsets of all BBox instances by
+# unit and proj_table by projpicker.db version
+_bbox_universe_cache = LRUCache(4)
+# BBox instances of raw geometries across queries; disabled by default
+_geom_cache = LRUCache(0)
+# query results by projpicker.db version and canonical query; disabled by
+# default
+_query_cache = LRUCache(0)
+# canonical query keys by raw input geometries
+_query_key_cache = LRUCache(0)
+# number of decimal places of coordinates in canonical queries
+_query_precision = 9
+# parsed geometries by raw query str for re-queries of the same text
+_parse_cache = LRUCache(16)
+# number of operands executed at once when geometries are streamed from an
+# iterator
+_query_batch_size = 64
+# number of features annotated at once
+_annotate_batch_size = 256
+
+# delimiter line of queries in batch mode
+_query_delimiter = "---"
+# number of queries sent to a process at once in batch mode
+_batch_chunk_size = 16
+# maximum number of entries and bytes of caches shared by batch queries
+_batch_cache_size = 256
+_batch_cache_bytes = 64 * 1024 * 1024
+
 
 ###############################################################################
 # generic
@@ -122,109 +212,199 @@ def read_file(infile="-"):
     Raises:
         FileNotFoundError: If infile does not exist.
     """
+    return list(read_lines(infile))
+
+
+def read_lines(infile="-"):
+    """
+    Open a file (stdin by default) and return an iterator of its str lines,
+    which reads one line at a time, so the file is never held in memory as a
+    whole. The file is closed after its last line is read.
+
+    Args:
+        infile (str): Input filename. Defaults to "-" for stdin.
+
+    Returns:
+        iterator: Iterator of str lines read from infile.
+
+    Raises:
+        FileNotFoundError: If infile does not exist.
+    """
+    def iter_lines(f):
+        with f:
+            yield from f
+
     if infile in (None, ""):
         infile = "-"
 
     if infile == "-":
-        f = sys.stdin
+        return iter(sys.stdin)
     elif not os.path.isfile(infile):
         raise FileNotFoundError(f"{infile}: No such file found")
-    else:
-        f = open(infile)
+    return iter_lines(open(infile))
 
-    lines = f.readlines()
 
-    if infile != "-":
-        f.close()
-    return lines
+def read_geoms(infile="-", input_format="plain", layer=None):
+    """
+    Open a file (stdin by default) and return an iterator of its input
+    geometries for parse_mixed_geoms(), which reads the file incrementally.
+    Plain files are read by read_lines() and tokenized by tokenize_lines().
+    GeoJSON, CSV, and WKT files are decoded by the readers module into point
+    and poly geometries in the latitude-longitude coordinate system except
+    for CSV x and y columns in the x-y coordinate system. The file is closed
+    after its last geometry is read. The features of a layer in a GeoPackage
+    file are read in batches by readers.read_gpkg(). If layer is None
+    (default), the first feature layer is read.
 
+    Args:
+        infile (str): Input filename. Defaults to "-" for stdin.
+        input_format (str): Input format (plain, geojson, csv, wkt, gpkg).
+            Defaults to "plain".
+        layer (str): GeoPackage layer name. Defaults to None.
 
-def tidy_lines(lines):
+    Returns:
+        iterator: Iterator of input geometries read from infile.
+
+    Raises:
+        ValueError: If input_format is not one of "plain", "geojson", "csv",
+            "wkt", or "gpkg", or a GeoPackage file is read from stdin.
+        FileNotFoundError: If infile does not exist.
+    """
+    def iter_geoms(f):
+        with f:
+            yield from readers.read_input(f, input_format)
+
+    if input_format not in _input_formats:
+        raise ValueError(f"{input_format}: Unsupported input format")
+
+    if input_format == "plain":
+        return tokenize_lines(read_lines(infile))
+
+    if infile in (None, ""):
+        infile = "-"
+
+    if infile == "-":
+        if input_format == "gpkg":
+            raise ValueError("Cannot read gpkg input from stdin")
+        return readers.read_input(sys.stdin, input_format)
+    elif not os.path.isfile(infile):
+        raise FileNotFoundError(f"{infile}: No such file found")
+    elif input_format == "gpkg":
+        return readers.read_gpkg(infile, layer)
+    return iter_geoms(open(infile, newline=""))
+
+
+def tokenize_lines(lines):
     """
-    Tidy a list of str lines in place by removing leading and trailing
-    whitespaces including newlines. Comments start with a hash and comment-only
+    Iterate over the tokens of str lines in one pass. Leading and trailing
+    whitespaces are removed from each line and the rest is split into
+    whitespace-separated tokens. Comments start with a hash and comment-only
     lines are deleted as if they did not even exist. A line starting with
     whitespaces immediately followed by a comment is considered a comment-only
-    line and deleted. This function directly modifies the input list and does
-    not return anything.
+    line and deleted. Consecutive empty lines are yielded as one empty token
+    that separates geometries, and the first empty line is not yielded. A line
+    of two or four numbers is yielded as one token joined by commas, and words
+    in quotes or after "unit=" are yielded as one token. See tidy_lines().
 
     Args:
-        lines (list): List of str lines.
+        lines (iterable): Iterable of str lines.
+
+    Yields:
+        str: Token.
     """
-    for i in reversed(range(len(lines))):
-        if lines[i].startswith("#"):
-            del lines[i]
-        elif i > 0 and lines[i].strip() == lines[i-1].strip() == "":
-            del lines[i]
+    was_blank = False
+    is_first = True
+    # token and quote of a quoted str not closed yet
+    quoted = quote = None
+
+    for line in lines:
+        stripped = line.strip()
+        is_blank = stripped == ""
+        if line.startswith("#") or (is_blank and was_blank):
+            was_blank = is_blank
+            continue
+        was_blank = is_blank
+
+        commented = "#" in line
+        if commented:
+            line = line.split("#")[0].strip()
+            if line == "":
+                continue
         else:
-            commented = False
-            if "#" in lines[i]:
-                lines[i] = lines[i].split("#")[0]
-                commented = True
-            lines[i] = lines[i].strip()
-            if commented and lines[i] == "":
-                del lines[i]
-            elif " " in lines[i] or "\t" in lines[i]:
-                words = lines[i].split()
-                all_nums = True
-                for word in words:
-                    if not re.match(f"^[+-]?{_pos_float_pat}", word):
-                        all_nums = False
-                        break
+            line = stripped
+        if is_first:
+            is_first = False
+            if line == "":
+                continue
+
+        if line == "":
+            words = ("",)
+        else:
+            if " " in line or "\t" in line:
+                words = line.split()
                 n = len(words)
-                if (all_nums and n in (2, 4) and _coor_sep not in lines[i] and
-                    "=" not in lines[i]):
+                if (n in (2, 4) and _coor_sep not in line and
+                    "=" not in line and
+                    all(_num_word_re.match(word) for word in words)):
                     # normalize lat lon to lat,lon for multiple geometries per
                     # line; avoid any constraining directives using =
-                    lines[i] = _coor_sep.join(words)
+                    line = _coor_sep.join(words)
                 elif (words[0].startswith("unit=") and '"' not in words[0] and
                       "'" not in words[0]):
                     # protect whitespaces in constraining directives
-                    m = re.match("""^([^ =]+=)([^"'].*)$""", lines[i])
+                    m = _unit_words_re.match(line)
                     if m:
-                        quote = "'" if '"' in m[2] else '"'
-                        lines[i] = f"{m[1]}{quote}{m[2]}{quote}"
-    if lines and lines[0] == "":
-        del lines[0]
+                        q = "'" if '"' in m[2] else '"'
+                        line = f"{m[1]}{q}{m[2]}{q}"
+            words = line.split()
+
+        for word in words:
+            if word == "\0":
+                word = ""
+            if quoted is not None:
+                if word.endswith(quote):
+                    yield f"{quoted} {word[:-len(quote)]}"
+                    quoted = None
+                else:
+                    quoted += f" {word}"
+                continue
+            m = ('"' in word or "'" in word) and _quote_word_re.match(word)
+            if m:
+                word = m[1] + m[3]
+                if word.endswith(m[2]):
+                    word = word[:-len(m[2])]
+                else:
+                    quoted = word
+                    quote = m[2]
+                    continue
+            yield word
 
-    # protect empty lines as geometry separators
-    text = " ".join("\0" if line == "" else line for line in lines)
-    lines.clear()
-    # revert geometry separators back to empty lines
-    lines.extend("" if line == "\0" else line for line in text.split())
-    normalize_lines(lines)
+    if quoted is not None:
+        yield quoted
+
+
+def tidy_lines(lines):
+    """
+    Tidy a list of str lines in place by replacing them with their tokens. This
+    function directly modifies the input list and does not return anything.
+    See tokenize_lines().
+
+    Args:
+        lines (list): List of str lines.
+    """
+    lines[:] = list(tokenize_lines(lines))
 
 
 def normalize_lines(lines):
     """
-    Normalize a list of str lines in place by splitting combined lines into
-    individual lines.
+    Normalize a list of str lines in place by joining quoted words split across
+    lines. This function directly modifies the input list and does not return
+    anything. See tidy_lines().
 
     Args:
         lines (list): List of str lines.
     """
-    idx = []
-    n = len(lines)
-    i = 0
-    while i < n:
-        m = re.match("""^(|[a-z_]+=)(["'])(.*)$""", lines[i])
-        if m:
-            lines[i] = m[1] + m[3]
-            quote = m[2]
-            if lines[i].endswith(quote):
-                lines[i] = lines[i][:-len(quote)]
-            else:
-                for j in range(i+1, n):
-                    idx.append(j)
-                    m = re.match(f"^(.*){quote}$", lines[j])
-                    if m:
-                        lines[i] += f" {m[1]}"
-                        break
-                    lines[i] += f" {lines[j]}"
-                i = j
-        i += 1
-    for i in reversed(idx):
-        del lines[i]
+    tidy_lines(lines)
 
 
 def get_separator(separator):
@@ -455,6 +635,133 @@ def get_proj_db(proj_db=None):
     return proj_db
 
 
+def get_engine(engine=None):
+    """
+    Return the query engine name. If one is given as an argument, return it as
+    is. Otherwise (None), check the PROJPICKER_ENGINE environment variable. If
+    this variable is not available, return the default "sqlite". The "sqlite"
+    engine queries projpicker.db using SQL while the "numpy" engine loads the
+    bbox table once into NumPy column arrays and queries them in memory. The
+    "slab" engine answers latitude-longitude point queries using an exact
+    slab-decomposition index built once in memory and falls back to "sqlite"
+    for all the other queries.
+
+    Args:
+        engine (str): User-provided query engine (sqlite, numpy, slab).
+            Defaults to None.
+
+    Returns:
+        str: Query engine name.
+
+    Raises:
+        ValueError: If engine is not one of "sqlite", "numpy", or "slab".
+    """
+    if engine is None:
+        engine = os.environ.get(_projpicker_engine_env, "sqlite")
+    if engine not in ("sqlite", "numpy", "slab"):
+        raise ValueError(f"{engine}: Invalid query engine")
+    return engine
+
+
+def get_bbox_columns(projpicker_db=None):
+    """
+    Return the BBoxColumns instance of the "numpy" engine for projpicker.db.
+    The columnar module and numpy are only imported when this engine is first
+    used. If projpicker_db is None (default), get_projpicker_db() is used. See
+    columnar.get_bbox_columns().
+
+    Args:
+        projpicker_db (str): projpicker.db path. Defaults to None.
+
+    Returns:
+        columnar.BBoxColumns: BBoxColumns instance.
+
+    Raises:
+        RuntimeError: If the numpy module is not available.
+    """
+    global _columnar
+
+    if _columnar is None:
+        if __package__:
+            from . import columnar as _columnar
+        else:
+            import columnar as _columnar
+    return _columnar.get_bbox_columns(get_projpicker_db(projpicker_db))
+
+
+def get_geom_cache_size():
+    """
+    Return the maximum number of raw geometry results cached across queries.
+    See set_geom_cache_size().
+
+    Returns:
+        int: Maximum number of cached results. 0 if the cache is disabled.
+    """
+    return _geom_cache.max_entries
+
+
+def set_geom_cache_size(max_entries=0):
+    """
+    Set the maximum number of raw geometry results cached across queries by
+    execute_query_plan() and clear the cache. Results are keyed by the
+    geometry, its type, coordinate system, unit, proj_table, and projpicker.db
+    version, so repeated queries of unchanged geometries such as geometry
+    variables in GUI re-queries skip projpicker.db. Use 0 to disable the cache
+    (default).
+
+    Args:
+        max_entries (int): Maximum number of cached results. Defaults to 0.
+    """
+    _geom_cache.resize(max_entries)
+    _geom_cache.clear()
+
+
+def get_query_cache_info():
+    """
+    Return the limits, usage, and hit and miss counters of the query result
+    cache. See set_query_cache_size().
+
+    Returns:
+        dict: Dictionary with max_entries, max_bytes, precision, entries,
+        bytes, hits, and misses keys.
+    """
+    return {"max_entries": _query_cache.max_entries,
+            "max_bytes": _query_cache.max_bytes,
+            "precision": _query_precision,
+            "entries": len(_query_cache),
+            "bytes": _query_cache.nbytes,
+            "hits": _query_cache.hits,
+            "misses": _query_cache.misses}
+
+
+def set_query_cache_size(max_entries=0, max_bytes=None, precision=9):
+    """
+    Set the maximum number of entries and bytes of the query result cache
+    consulted by query_mixed_geoms() and clear the cache. Results are keyed by
+    the projpicker.db version and the canonical form of the query plan, in
+    which coordinates are rounded to precision decimal places and the operands
+    of commutative operators are sorted; see hash_query_plan(). The
+    same raw input geometries skip parsing as well. Coordinates that differ
+    only beyond precision share results, so a lower precision increases hits
+    at the cost of exactness near bbox edges. Use 0 to disable the cache
+    (default).
+
+    Args:
+        max_entries (int): Maximum number of cached results. Defaults to 0.
+        max_bytes (int): Maximum estimated size of cached results in bytes.
+            None for no limit. Defaults to None.
+        precision (int): Number of decimal places of coordinates in canonical
+            queries. Defaults to 9.
+    """
+    global _query_precision
+
+    _query_precision = precision
+    _query_cache.resize(max_entries, max_bytes)
+    _query_cache.clear()
+    _query_key_cache.resize(max_entries)
+    _query_key_cache.clear()
+
+
 ###############################################################################
 # projpicker.db creation
 
@@ -637,16 +944,21 @@ def transform_latlon_bbox(bbox, to_crs):
 def create_projpicker_db(
         overwrite=False,
         projpicker_db=None,
-        proj_db=None):
+        proj_db=None,
+        grid=False):
     """
     Create a projpicker.db sqlite database. If projpicker_db or proj_db is None
     (default), get_projpicker_db() or get_proj_db() is used, respectively.
+    Optionally, the 1-degree grid lookup tables can be created for faster point
+    queries. See create_grid_tables().
 
     Args:
         overwrite (bool): Whether or not to overwrite projpicker.db. Defaults
             to False.
         projpicker_db (str): projpicker.db path. Defaults to None.
         proj_db (str): proj.db path. Defaults to None.
+        grid (bool): Whether or not to create the grid lookup tables.
+            Defaults to False.
 
     Raises:
         FileExistsError: If projpicker_db already exists.
@@ -656,6 +968,7 @@ def create_projpicker_db(
 
     if os.path.isfile(projpicker_db):
         if overwrite:
+            close_connections(projpicker_db)
             os.remove(projpicker_db)
         else:
             raise FileExistsError(f"{projpicker_db}: File already exists")
@@ -729,6 +1042,139 @@ def create_projpicker_db(
                 nrow += 1
             message()
 
+        create_spatial_indices(projpicker_con)
+        if grid:
+            create_grid_tables(projpicker_con)
+
+
+def create_spatial_indices(projpicker_con):
+    """
+    Create R*Tree spatial indices for the bbox table using a projpicker.db
+    connection. The bbox_latlon_rtree index stores the latitude-longitude
+    extent of each bbox row as one rectangle or two rectangles split at the
+    antimeridian if the extent crosses it. Extents that span all longitudes
+    are stored as [-180, 180]. The bbox_xy_rtree index stores the x-y extent of
+    each bbox row in its own unit partition using the unit_id from the
+    bbox_unit table as the first dimension. Rows without a valid x-y extent are
+    not indexed because they cannot contain any x-y geometries. Existing
+    indices are dropped and recreated.
+
+    Args:
+        projpicker_con (sqlite3.Connection): projpicker.db connection.
+    """
+    projpicker_con.execute("DROP TABLE IF EXISTS bbox_latlon_rtree")
+    projpicker_con.execute(_bbox_latlon_rtree_schema)
+
+    rects = []
+    for row in projpicker_con.execute("""SELECT rowid,
+                                                south_lat, north_lat,
+                                                west_lon, east_lon
+                                         FROM bbox"""):
+        rowid, s, n, w, e = row
+        if w == e or (w == -180 and e == 180):
+            rects.append((s, n, -180, 180, rowid))
+        elif w < e:
+            rects.append((s, n, w, e, rowid))
+        else:
+            # if west_lon > east_lon, bbox crosses the antimeridian
+            rects.append((s, n, w, 180, rowid))
+            rects.append((s, n, -180, e, rowid))
+
+    sql = """INSERT INTO bbox_latlon_rtree (south_lat, north_lat,
+                                            west_lon, east_lon,
+                                            bbox_rowid)
+             VALUES (?, ?, ?, ?, ?)"""
+    projpicker_con.executemany(sql, rects)
+
+    projpicker_con.execute("DROP TABLE IF EXISTS bbox_xy_rtree")
+    projpicker_con.execute("DROP TABLE IF EXISTS bbox_unit")
+    projpicker_con.execute(_bbox_unit_schema)
+    projpicker_con.execute(_bbox_xy_rtree_schema)
+
+    projpicker_con.execute("""INSERT INTO bbox_unit (unit)
+                              SELECT DISTINCT unit
+                              FROM bbox
+                              ORDER BY unit""")
+    projpicker_con.execute("""INSERT INTO bbox_xy_rtree (unit_min, unit_max,
+                                                         left, right,
+                                                         bottom, top,
+                                                         bbox_rowid)
+                              SELECT unit_id, unit_id,
+                                     left, right,
+                                     bottom, top,
+                                     b.rowid
+                              FROM bbox b
+                              JOIN bbox_unit u
+                                ON b.unit=u.unit
+                              WHERE bottom IS NOT NULL AND
+                                    top IS NOT NULL AND
+                                    left IS NOT NULL AND
+                                    right IS NOT NULL AND
+                                    bottom <= top AND
+                                    left <= right""")
+    projpicker_con.commit()
+
+
+def create_grid_tables(projpicker_con):
+    """
+    Create the 1-degree grid lookup tables for point queries using a
+    projpicker.db connection. Instead of listing rows for each of the
+    180x360 cells, which would make projpicker.db too large because most
+    extents cover thousands of cells, containment is factorized into 180
+    latitude bands (grid_lat) and 360 longitude columns (grid_lon). Each band
+    or column stores two bitsets of bbox rowids: rows that fully cover it and
+    rows that overlap it. A cell is fully contained by the intersection of the
+    full bitsets of its band and column, and overlapped by the intersection of
+    their overlap bitsets. Existing tables are dropped and recreated.
+
+    Args:
+        projpicker_con (sqlite3.Connection): projpicker.db connection.
+    """
+    def set_bits(bitsets, first, last, rowid):
+        for i in range(max(first, 0), min(last, len(bitsets) - 1) + 1):
+            bitsets[i][rowid >> 3] |= 1 << (rowid & 7)
+
+    projpicker_cur = projpicker_con.execute("SELECT max(rowid) FROM bbox")
+    nbytes = (projpicker_cur.fetchone()[0] or 0) // 8 + 1
+
+    lat_full = [bytearray(nbytes) for i in range(180)]
+    lat_overlap = [bytearray(nbytes) for i in range(180)]
+    lon_full = [bytearray(nbytes) for i in range(360)]
+    lon_overlap = [bytearray(nbytes) for i in range(360)]
+
+    for row in projpicker_con.execute("""SELECT rowid,
+                                                south_lat, north_lat,
+                                                west_lon, east_lon
+                                         FROM bbox"""):
+        rowid, s, n, w, e = row
+        # band i covers latitudes [i-90, i-89]
+        set_bits(lat_full, math.ceil(s + 90), math.floor(n + 89), rowid)
+        set_bits(lat_overlap, math.ceil(s + 89), math.floor(n + 90), rowid)
+        if w == e or (w == -180 and e == 180):
+            lons = [(-180, 180)]
+        elif w < e:
+            lons = [(w, e)]
+        else:
+            # if west_lon > east_lon, bbox crosses the antimeridian
+            lons = [(w, 180), (-180, e)]
+        for l, r in lons:
+            # column i covers longitudes [i-180, i-179]
+            set_bits(lon_full, math.ceil(l + 180), math.floor(r + 179), rowid)
+            set_bits(lon_overlap, math.ceil(l + 179), math.floor(r + 180),
+                     rowid)
+
+    projpicker_con.execute("DROP TABLE IF EXISTS grid_lat")
+    projpicker_con.execute("DROP TABLE IF EXISTS grid_lon")
+    projpicker_con.execute(_grid_lat_schema)
+    projpicker_con.execute(_grid_lon_schema)
+    projpicker_con.executemany("INSERT INTO grid_lat VALUES (?, ?, ?)",
+                               [(i, bytes(lat_full[i]), bytes(lat_overlap[i]))
+                                for i in range(180)])
+    projpicker_con.executemany("INSERT INTO grid_lon VALUES (?, ?, ?)",
+                               [(i, bytes(lon_full[i]), bytes(lon_overlap[i]))
+                                for i in range(360)])
+    projpicker_con.commit()
+
 
 def write_bbox_db(
         bbox,
@@ -749,6 +1195,7 @@ def write_bbox_db(
     """
     if os.path.isfile(bbox_db):
         if overwrite:
+            close_connections(bbox_db)
             os.remove(bbox_db)
         else:
             raise FileExistsError(f"{bbox_db}: File already exists")
@@ -801,34 +1248,33 @@ def read_bbox_db(
         list: List of all BBox instances sorted by area.
     """
     outbbox = []
-    with sqlite3.connect(bbox_db) as bbox_con:
-        bbox_cur = bbox_con.cursor()
-        sql = f"""SELECT *
-                  FROM bbox
-                  WHERE_UNIT_AND_PROJ_TABLE
-                  ORDER BY area_sqkm,
-                           proj_table,
-                           crs_auth_name, crs_code,
-                           usage_auth_name, usage_code,
-                           extent_auth_name, extent_code"""
-        params = []
-        if unit == "any" and proj_table == "any":
-            sql = sql.replace("WHERE_UNIT_AND_PROJ_TABLE", "")
-        elif unit == "any":
-            sql = sql.replace("WHERE_UNIT_AND_PROJ_TABLE",
-                              "WHERE proj_table = ?")
-            params.append(proj_table)
-        elif proj_table == "any":
-            sql = sql.replace("WHERE_UNIT_AND_PROJ_TABLE",
-                              "WHERE unit = ?")
-            params.append(unit)
-        else:
-            sql = sql.replace("WHERE_UNIT_AND_PROJ_TABLE",
-                              "WHERE unit = ? and proj_table = ?")
-            params.extend([unit, proj_table])
-        bbox_cur.execute(sql, params)
-        for row in map(BBox._make, bbox_cur.fetchall()):
-            outbbox.append(row)
+    bbox_cur = get_connection(bbox_db).cursor()
+    sql = f"""SELECT *
+              FROM bbox
+              WHERE_UNIT_AND_PROJ_TABLE
+              ORDER BY area_sqkm,
+                       proj_table,
+                       crs_auth_name, crs_code,
+                       usage_auth_name, usage_code,
+                       extent_auth_name, extent_code"""
+    params = []
+    if unit == "any" and proj_table == "any":
+        sql = sql.replace("WHERE_UNIT_AND_PROJ_TABLE", "")
+    elif unit == "any":
+        sql = sql.replace("WHERE_UNIT_AND_PROJ_TABLE",
+                          "WHERE proj_table = ?")
+        params.append(proj_table)
+    elif proj_table == "any":
+        sql = sql.replace("WHERE_UNIT_AND_PROJ_TABLE",
+                          "WHERE unit = ?")
+        params.append(unit)
+    else:
+        sql = sql.replace("WHERE_UNIT_AND_PROJ_TABLE",
+                          "WHERE unit = ? and proj_table = ?")
+        params.extend([unit, proj_table])
+    bbox_cur.execute(sql, params)
+    for row in map(BBox._make, bbox_cur.fetchall()):
+        outbbox.append(row)
     return outbbox
 
 
@@ -867,6 +1313,9 @@ def set_coordinate_system(coor_sys="latlon"):
 
     query_point_using_cursor = coor_mod.query_point_using_cursor
     query_bbox_using_cursor = coor_mod.query_bbox_using_cursor
+    query_points_using_cursor = coor_mod.query_points_using_cursor
+    query_bboxes_using_cursor = coor_mod.query_bboxes_using_cursor
+    query_crossing_using_cursor = coor_mod.query_crossing_using_cursor
 
     globals().update(locals())
 
@@ -917,22 +1366,9 @@ def parse_points(points):
     Returns:
         list: List of lists of parsed point geometries in float.
     """
-    outpoints = []
-    for point in points:
-        c1 = c2 = None
-        typ = type(point)
-        if typ == str:
-            # "lat,lon" or "x,y"
-            c1, c2 = parse_point(point)
-        elif typ in (list, tuple):
-            if len(point) == 2:
-                # [ lat, lon ] or [ x, y ]
-                c1, c2 = point
-                c1 = get_float(c1)
-                c2 = get_float(c2)
-        if c1 is not None and c2 is not None:
-            outpoints.append([c1, c2])
-    return outpoints
+    # "lat,lon" or "x,y", and [ lat, lon ] or [ x, y ] in one call
+    return [point for point in coor_mod.parse_points(points)
+            if None not in point]
 
 
 parse_poly = parse_points
@@ -998,6 +1434,44 @@ def parse_polys(polys):
     return outpolys
 
 
+def fold_poly_point(poly, point):
+    """
+    Fold a parsed point geometry into the running extent of a poly geometry
+    and return the extent. The extent is itself a poly of two corner points
+    with the minimum and maximum of each coordinate seen so far, so
+    calc_poly_bbox() returns the same bbox for it as for all the points
+    including the normalization of longitudes across the antimeridian, which
+    is applied only at the end. Memory use does not grow with the number of
+    points.
+
+    For example, folding [10,20], [30,-10], and [20,190] into [] returns
+    [[10, -10], [30, 190]].
+
+    Args:
+        poly (list): Running extent returned by this function or an empty
+            list to start a new one. It is updated in place.
+        point (list): List of two floats.
+
+    Returns:
+        list: List of lower and upper corner points.
+    """
+    c1, c2 = point
+    if not poly:
+        poly.extend(([c1, c2], [c1, c2]))
+        return poly
+
+    lower, upper = poly
+    if c1 < lower[0]:
+        lower[0] = c1
+    elif c1 > upper[0]:
+        upper[0] = c1
+    if c2 < lower[1]:
+        lower[1] = c2
+    elif c2 > upper[1]:
+        upper[1] = c2
+    return poly
+
+
 def parse_bboxes(bboxes):
     """
     Parse a list of strs of four floats, and return them as a list. A list of
@@ -1089,168 +1563,276 @@ def parse_geoms(geoms, geom_type="point"):
     return geoms
 
 
-def parse_mixed_geoms(geoms):
+class ParsedGeoms(list):
     """
-    Parse mixed input geometries and return them as a list. The first non-empty
-    element in geoms can optionally be "all", "and", "or", "xor", or "not" to
-    set the query operator. The "all" query operator ignores the rest of input
-    geometries and returns all bbox rows from the database. The "and" query
-    operator performs the intersection of bbox rows while the "or" operator the
-    union. Geometry types can be specified using words "point" (default),
-    "poly", and "bbox". Words "latlon" (default) and "xy" start the
-    latitude-longitude and x-y coordinate systems, respectively. This function
-    ignores the current coordinate system set by set_coordinate_system(),
-    set_latlon(), or set_xy(), and always starts in the latitude-longitude
-    coordinate system by default.
+    Provide a list of geometries parsed by parse_mixed_geoms(). Functions that
+    take mixed geometries including parse_mixed_geoms(),
+    compile_mixed_geoms(), and query_mixed_geoms() use instances of this class
+    as is without parsing them again, so items added to an instance must be
+    parsed geometries as well.
+    """
+    pass
+
+
+def iter_mixed_geoms(geoms, fold_polys=False):
+    """
+    Iterate over parsed mixed input geometries one at a time without holding
+    all of them in memory. This generator is the streaming version of
+    parse_mixed_geoms() and takes tokens that have already been split by
+    tokenize_lines() if they come from text lines. Syntax errors are raised as
+    soon as they are encountered, but postfix stack errors are raised only
+    after the last token. The current coordinate system set by
+    set_coordinate_system(), set_latlon(), or set_xy() is neither used nor
+    changed. If fold_polys is True, the points of each poly are folded into
+    its running extent by fold_poly_point() as they are read, so polys with
+    millions of points take constant memory. Because only the bbox of a poly
+    is queried unless it is matched, polys are folded only in the "and",
+    "or", and "xor" queries, which cannot match geometries.
 
     Args:
-        geoms (list or str): List of "point", "poly", "bbox", "none", "all",
+        geoms (iterable): Iterable of "point", "poly", "bbox", "none", "all",
             "latlon", "xy", "and", "or", "xor", "not", "match", "unit=",
-            "proj_table=", "match_tol=", "match_max=", and parsable geometries.
-            The first word can be either "and", "or", "xor", or "postfix". See
-            parse_points(), parse_polys(), and parse_bboxes().
+            "proj_table=", "match_tol=", "match_max=", and parsable
+            geometries. See parse_mixed_geoms().
+        fold_polys (bool): Whether or not to fold the points of polys into
+            their extents. Defaults to False.
 
-    Returns:
-        list: List of parsed geometries.
+    Yields:
+        str or list: Parsed geometry or keyword in the order of
+        parse_mixed_geoms() output.
 
     Raises:
         SyntaxError: If syntax errors are encountered.
     """
-    def parse_next_geom(g):
-        if geom_type == "poly":
-            i = g
-            while (i < ngeoms and geoms[i] not in keywords and
-                   not (type(geoms[i]) == str and
-                        (geoms[i] == "" or None in parse_point(geoms[i]) or
-                        (("=" in geoms[i] and
-                          geoms[i].split("=")[0] in constraints) or
-                         _geom_var_re.match(geoms[i]))))):
-                i += 1
-            geom = parse_geom(geoms[g:i], geom_type)
-            g = i - 1
-        else:
-            geom = parse_geom(geoms[g], geom_type)
-        return geom, g
-
-    def parse_next_geoms(g):
-        i = g
-        while (i < ngeoms and geoms[i] not in keywords and
-               not (type(geoms[i]) == str and
-                    (("=" in geoms[i] and
-                      geoms[i].split("=")[0] in constraints) or
-                     _geom_var_re.match(geoms[i])))):
-            i += 1
-        ogeoms = parse_geoms(geoms[g:i], geom_type)
-        g = i
-        return ogeoms, g
-
-    if type(geoms) == str:
-        geoms = geoms.split("\n")
-        tidy_lines(geoms)
-
-    outgeoms = []
-
-    ngeoms = len(geoms)
-    if ngeoms == 0:
-        return outgeoms
-
-    if geoms[0] in ("and", "or", "xor", "postfix"):
-        query_op = geoms[0]
-        first_index = 1
-        outgeoms.append(query_op)
+    def get_token_kind(geom):
+        if type(geom) != str:
+            return None
+        kind = _keyword_kinds.get(geom)
+        if kind is None:
+            if "=" in geom and geom.split("=")[0] in _constraints:
+                kind = "constraint"
+            elif ":" in geom and _geom_var_re.match(geom):
+                kind = "variable"
+        return kind
+
+    def parse_points(points):
+        return [point for point in coor_mod.parse_points(points)
+                if None not in point]
+
+    end = object()
+    geoms = iter(geoms)
+    # tokens to read again before the next token from geoms
+    pushed = []
+
+    geom = next(geoms, end)
+    if geom is end:
+        return
+
+    if geom in ("and", "or", "xor", "postfix"):
+        query_op = geom
+        yield query_op
     else:
         query_op = "and"
-        first_index = 0
-
-    query_ops = ("and", "or", "xor", "not", "match")
-    spec_geoms = ("none", "all")
-    geom_types = ("point", "poly", "bbox")
-    coor_sys = ("latlon", "xy")
-    keywords = query_ops + spec_geoms + geom_types + coor_sys
+        pushed.append(geom)
 
-    constraints = ("unit", "proj_table", "match_tol", "match_max")
+    # add a point to the poly being parsed or fold it into the extent
+    add_poly_point = (fold_poly_point if fold_polys and query_op != "postfix"
+                      else list.append)
 
     geom_type = "point"
+    coor_mod = coor_latlon
+    point_re = coor_mod._latlon_re
 
-    was_latlon = is_latlon()
-    try:
-        set_latlon()
-
-        geom_vars = []
-        stack_size = 0
-        g = first_index
+    geom_vars = set()
+    stack_size = 0
+    # points of the poly being parsed
+    poly = []
 
-        while g < ngeoms:
-            geom = geoms[g]
+    while True:
+        geom = pushed.pop() if pushed else next(geoms, end)
+        if geom is end:
+            break
+        kind = get_token_kind(geom)
+        if kind is None:
             typ = type(geom)
-            if geom in query_ops:
-                if query_op == "postfix":
-                    if geom == "not" and stack_size >= 1:
-                        pass
-                    elif stack_size >= 2:
-                        stack_size -= 1
+            if geom_type == "point":
+                point = coor_mod.parse_point(geom)
+                if None not in point:
+                    yield point
+                    stack_size += 1
+            elif geom_type == "bbox":
+                bbox = coor_mod.parse_bbox(geom)
+                if None not in bbox:
+                    yield bbox
+                    stack_size += 1
+            else:
+                # unparsable geometries start a new poly; see parse_polys()
+                point = None
+                if typ == str:
+                    point = coor_mod.parse_point(geom)
+                elif typ in (list, tuple):
+                    if len(geom) == 2:
+                        typ0 = type(geom[0])
+                        typ1 = type(geom[1])
                     else:
-                        raise SyntaxError(f"Not enough operands for {geom}")
-                else:
-                    raise SyntaxError(f"{geom}: Not in postfix query")
-            elif geom in geom_types:
-                geom_type = geom
-            elif geom in coor_sys:
-                if geom == "latlon":
-                    set_latlon()
+                        typ0 = typ1 = None
+                    if ((typ0 in (int, float) and typ1 in (int, float)) or
+                        (typ0 == str and not point_re.match(geom[0]) and
+                         typ1 == str and not point_re.match(geom[1]))):
+                        point = [get_float(geom[0]), get_float(geom[1])]
+                    else:
+                        ogeoms = parse_points(geom)
+                        if ogeoms:
+                            if fold_polys and query_op != "postfix":
+                                extent = []
+                                for point in ogeoms:
+                                    fold_poly_point(extent, point)
+                                ogeoms = extent
+                            yield ogeoms
+                            stack_size += 1
+                if point is not None and None not in point:
+                    add_poly_point(poly, point)
+                elif poly:
+                    yield poly
+                    stack_size += 1
+                    poly = []
+            continue
+
+        if poly:
+            yield poly
+            stack_size += 1
+            poly = []
+
+        if kind == "operator":
+            if query_op == "postfix":
+                if geom == "not" and stack_size >= 1:
+                    pass
+                elif stack_size >= 2:
+                    stack_size -= 1
                 else:
-                    set_xy()
-            elif (typ == str and "=" in geom and
-                  geom.split("=")[0] in constraints):
-                pass
-            elif geom in ("none", "all"):
-                stack_size += 1
+                    raise SyntaxError(f"Not enough operands for {geom}")
             else:
-                m = _geom_var_re.match(geom) if typ == str else None
-                if m:
-                    sav = m[1] is not None or m[2] is not None
-                    use = m[2] is not None or m[3] is not None
-                    name = m[1] or m[2] or m[3]
-                    if sav:
-                        if name not in geom_vars:
-                            geom_vars.append(name)
-                        outgeoms.append(geom)
-                        g += 1
-                        geom = geoms[g]
-                        typ = type(geom)
-                        if (typ == str and not geom.startswith(":") and
-                            geom not in spec_geoms):
-                            geom, g = parse_next_geom(g)
-                        outgeoms.append(geom)
-                    if use:
-                        if name not in geom_vars:
-                            raise SyntaxError(f"{name}: Undefined geometry "
-                                              "variable")
-                        stack_size += 1
-                        if not sav:
-                            outgeoms.append(geom)
-                    g += 1
-                else:
-                    ogeoms, g = parse_next_geoms(g)
-                    if ogeoms and None not in ogeoms:
-                        stack_size += len(ogeoms)
-                        outgeoms.extend(ogeoms)
-                continue
-            if typ == str:
-                outgeoms.append(geom)
-            g += 1
+                raise SyntaxError(f"{geom}: Not in postfix query")
+        elif kind == "type":
+            geom_type = geom
+        elif kind == "coor_sys":
+            coor_mod = coor_latlon if geom == "latlon" else coor_xy
+            point_re = (coor_mod._latlon_re if geom == "latlon" else
+                        coor_mod._xy_re)
+        elif kind == "special":
+            stack_size += 1
+        elif kind == "variable":
+            m = _geom_var_re.match(geom)
+            sav = m[1] is not None or m[2] is not None
+            use = m[2] is not None or m[3] is not None
+            name = m[1] or m[2] or m[3]
+            if sav:
+                geom_vars.add(name)
+                yield geom
+                geom = pushed.pop() if pushed else next(geoms, end)
+                if geom is end:
+                    raise SyntaxError(f"{name}: No geometry to save")
+                if (type(geom) == str and not geom.startswith(":") and
+                    geom not in ("none", "all")):
+                    if geom_type == "poly":
+                        # a poly variable takes points up to the first
+                        # unparsable geometry
+                        point = coor_mod.parse_point(geom)
+                        if None in point:
+                            pushed.append(geom)
+                            geom = []
+                        else:
+                            geom = []
+                            add_poly_point(geom, point)
+                            while True:
+                                point = next(geoms, end)
+                                if point is end:
+                                    break
+                                if get_token_kind(point):
+                                    pushed.append(point)
+                                    break
+                                if type(point) == str:
+                                    parsed = coor_mod.parse_point(point)
+                                    if None in parsed:
+                                        pushed.append(point)
+                                        break
+                                    add_poly_point(geom, parsed)
+                                else:
+                                    for parsed in parse_points((point,)):
+                                        add_poly_point(geom, parsed)
+                    elif geom_type == "point":
+                        geom = coor_mod.parse_point(geom)
+                    else:
+                        geom = coor_mod.parse_bbox(geom)
+                yield geom
+            if use:
+                if name not in geom_vars:
+                    raise SyntaxError(f"{name}: Undefined geometry variable")
+                stack_size += 1
+                if not sav:
+                    yield geom
+            continue
+        yield geom
 
-        if query_op == "postfix":
-            if stack_size == 0:
-                raise SyntaxError("Nothing to return from postfix stack")
-            if stack_size > 1:
-                raise SyntaxError(f"{stack_size}: Excessive stack size for "
-                                  "postfix operations")
-    finally:
-        if was_latlon and not is_latlon():
-            set_latlon()
-        elif not was_latlon and is_latlon():
-            set_xy()
+    if poly:
+        yield poly
+        stack_size += 1
+
+    if query_op == "postfix":
+        if stack_size == 0:
+            raise SyntaxError("Nothing to return from postfix stack")
+        if stack_size > 1:
+            raise SyntaxError(f"{stack_size}: Excessive stack size for "
+                              "postfix operations")
+
+
+def parse_mixed_geoms(geoms):
+    """
+    Parse mixed input geometries and return them as a ParsedGeoms instance,
+    which is a list. A ParsedGeoms instance is returned as is. Parsed
+    geometries of the last few query strs are cached, so repeated queries of
+    the same str skip parsing. Each token is classified and parsed only once by
+    iter_mixed_geoms(). The first non-empty element in geoms can optionally be
+    "all", "and", "or", "xor", or "not" to set the query operator. The "all"
+    query operator ignores the rest of input geometries and returns all bbox
+    rows from the database. The "and" query operator performs the intersection
+    of bbox rows while the "or" operator the union. Geometry types can be
+    specified using words "point" (default), "poly", and "bbox". Words "latlon"
+    (default) and "xy" start the latitude-longitude and x-y coordinate systems,
+    respectively. This function ignores the current coordinate system set by
+    set_coordinate_system(), set_latlon(), or set_xy(), and always starts in
+    the latitude-longitude coordinate system by default.
+
+    Args:
+        geoms (list or str): List of "point", "poly", "bbox", "none", "all",
+            "latlon", "xy", "and", "or", "xor", "not", "match", "unit=",
+            "proj_table=", "match_tol=", "match_max=", and parsable geometries.
+            The first word can be either "and", "or", "xor", or "postfix". See
+            parse_points(), parse_polys(), and parse_bboxes().
+
+    Returns:
+        ParsedGeoms: List of parsed geometries.
+
+    Raises:
+        SyntaxError: If syntax errors are encountered.
+    """
+    if isinstance(geoms, ParsedGeoms):
+        return geoms
+
+    query = None
+    if type(geoms) == str:
+        query = geoms
+        outgeoms = _parse_cache.get(query)
+        if outgeoms is not None:
+            return copy.deepcopy(outgeoms)
+        geoms = tokenize_lines(geoms.split("\n"))
+
+    outgeoms = ParsedGeoms(iter_mixed_geoms(geoms))
+
+    # cache and return deep copies because the caller may modify outgeoms
+    # including their point and poly lists
+    if query is not None:
+        _parse_cache.put(query, copy.deepcopy(outgeoms))
 
     return outgeoms
 
@@ -1270,6 +1852,7 @@ def bbox_not(bbox, bbox_all):
         list: List of BBox instances from bbox_all that are not in the input
         bbox.
     """
+    bbox = set(bbox)
     return [b for b in bbox_all if b not in bbox]
 
 
@@ -1285,6 +1868,7 @@ def bbox_and(bbox1, bbox2):
         list: List of BBox instances resulting from the AND operation between
         bbox1 and bbox2.
     """
+    bbox2 = set(bbox2)
     return [b for b in bbox1 if b in bbox2]
 
 
@@ -1301,6 +1885,7 @@ def bbox_or(bbox1, bbox2):
         bbox1 and bbox2.
     """
     outbbox = bbox1.copy()
+    bbox1 = set(bbox1)
     for b in bbox2:
         if b not in bbox1:
             outbbox.append(b)
@@ -1319,9 +1904,11 @@ def bbox_xor(bbox1, bbox2):
         list: List of BBox instances resulting from the XOR operation between
         bbox1 and bbox2.
     """
+    set1 = set(bbox1)
+    set2 = set(bbox2)
     outbbox = []
     for b in bbox1 + bbox2:
-        if (b in bbox1) + (b in bbox2) == 1:
+        if (b in set1) + (b in set2) == 1:
             outbbox.append(b)
     return outbbox
 
@@ -1356,6 +1943,41 @@ def bbox_binary_operator(bbox1, bbox2, bbox_op):
     return outbbox
 
 
+def bbox_to_bits(bbox, bbox_index):
+    """
+    Return a bitset of BBox instances. Bit i is set if the BBox instance at
+    position i in the universe is in bbox. See get_bbox_universe().
+
+    Args:
+        bbox (list): List of BBox instances.
+        bbox_index (dict): Dictionary of positions by BBox instance in the
+            universe.
+
+    Returns:
+        int: Bitset of BBox instances.
+    """
+    buf = bytearray((len(bbox_index) + 7) // 8)
+    for b in bbox:
+        i = bbox_index[b]
+        buf[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buf, "little")
+
+
+def bits_to_bbox(bits, bbox_universe):
+    """
+    Return a list of BBox instances in a bitset. Because the universe is
+    sorted by area, so is the returned list.
+
+    Args:
+        bits (int): Bitset of BBox instances.
+        bbox_universe (list): List of all BBox instances sorted by area.
+
+    Returns:
+        list: List of BBox instances sorted by area.
+    """
+    return [bbox_universe[i] for i in iter_bits(bits)]
+
+
 def sort_bbox(bbox):
     """
     Sort a list of BBox instances by area_sqkm in place after deduplicating
@@ -1375,13 +1997,31 @@ def sort_bbox(bbox):
                              x.extent_auth_name, x.extent_code))
 
 
-###############################################################################
-# geometry operators
-
-def match_geoms(gbbox1, gbbox2, match_max=0, match_tol=1):
+def calc_bbox_size(bbox):
     """
-    Match two geometries in different coordinate systems within a given
-    distance match_tol in xy and return a subset list of the BBox instances of
+    Return the estimated size of a list of BBox instances in bytes including
+    their fields. All instances are assumed to be as large as the first one.
+
+    Args:
+        bbox (list): List of BBox instances.
+
+    Returns:
+        int: Estimated size in bytes.
+    """
+    size = sys.getsizeof(bbox)
+    if bbox:
+        size += len(bbox) * (sys.getsizeof(bbox[0]) +
+                             sum(map(sys.getsizeof, bbox[0])))
+    return size
+
+
+###############################################################################
+# geometry operators
+
+def match_geoms(gbbox1, gbbox2, match_max=0, match_tol=1):
+    """
+    Match two geometries in different coordinate systems within a given
+    distance match_tol in xy and return a subset list of the BBox instances of
     the xy geometry that can be transformed to the other geometry in latlon.
     Only the first match_max number of matches are returned. If match_max is 0,
     all matches are returned. This operation is useful when the coordinates of
@@ -1476,13 +2116,15 @@ def query_point(
         point,
         unit="any",
         proj_table="any",
-        projpicker_db=None):
+        projpicker_db=None,
+        engine=None):
     """
     Return a list of BBox instances in unit in proj_table that completely
     contain an input point geometry. Each BBox instance is a named tuple with
     all the columns from the bbox table in projpicker.db. Results are sorted by
     area from the smallest to largest. If projpicker_db is None (default),
-    get_projpicker_db() is used.
+    get_projpicker_db() is used. If engine is None (default), get_engine() is
+    used.
 
     Args:
         point (list or str): List of two floats or a parsable point geometry.
@@ -1491,16 +2133,24 @@ def query_point(
         proj_table (str): Proj table values from projpicker.db. Defaults to
             "any".
         projpicker_db (str): projpicker.db path. Defaults to None.
+        engine (str): Query engine (sqlite, numpy, slab). Defaults to None.
 
     Returns:
         list: List of queried BBox instances sorted by area.
     """
     projpicker_db = get_projpicker_db(projpicker_db)
-
-    with sqlite3.connect(projpicker_db) as projpicker_con:
-        projpicker_cur = projpicker_con.cursor()
-        outbbox = query_point_using_cursor(projpicker_cur, point, unit,
-                                           proj_table)
+    engine = get_engine(engine)
+
+    if engine == "numpy":
+        bbox_cols = get_bbox_columns(projpicker_db)
+        return bbox_cols.query_point(point, unit, proj_table, is_latlon())
+    elif engine == "slab" and is_latlon():
+        slab_index = slab.get_slab_index(projpicker_db)
+        return slab_index.query_point(point, unit, proj_table)
+
+    projpicker_cur = get_connection(projpicker_db).cursor()
+    outbbox = query_point_using_cursor(projpicker_cur, point, unit,
+                                       proj_table)
     return outbbox
 
 
@@ -1544,15 +2194,19 @@ def query_points(
         query_op="and",
         unit="any",
         proj_table="any",
-        projpicker_db=None):
+        projpicker_db=None,
+        engine=None):
     """
     Return a list of BBox instances in unit in proj_table that completely
     contain input point geometries. Each BBox instance is a named tuple with
     all the columns from the bbox table in projpicker.db. The "and" query
     operator performs the intersection of bbox rows while the "or" operator the
     union and the "xor" operator the exclusive OR. Results are sorted by area
-    from the smallest to largest. If projpicker_db is None (default),
-    get_projpicker_db() is used.
+    from the smallest to largest. All points are queried at once using a
+    temporary table join. If projpicker_db is None (default),
+    get_projpicker_db() is used. If engine is None (default), get_engine() is
+    used. The slab engine only indexes single points, so sqlite is used
+    instead.
 
     Args:
         points (list): List of parsable point geometries. See parse_points().
@@ -1561,6 +2215,7 @@ def query_points(
         proj_table (str): Proj table values from projpicker.db. Defaults to
             "any".
         projpicker_db (str): projpicker.db path. Defaults to None.
+        engine (str): Query engine (sqlite, numpy, slab). Defaults to None.
 
     Returns:
         list: List of queried BBox instances sorted by area.
@@ -1574,42 +2229,21 @@ def query_points(
     points = parse_points(points)
     projpicker_db = get_projpicker_db(projpicker_db)
 
-    outbbox = []
-
-    first = True
-    sort = False
-
-    with sqlite3.connect(projpicker_db) as projpicker_con:
-        projpicker_cur = projpicker_con.cursor()
-        for point in points:
-            if query_op in ("or", "xor") or first:
-                obbox = query_point_using_cursor(projpicker_cur, point, unit,
-                                                 proj_table)
-                if obbox:
-                    n = len(outbbox)
-                    if query_op in ("or", "xor") and not sort and n > 0:
-                        sort = True
-                    if query_op == "xor" and n > 0:
-                        idx = []
-                        for i in range(n):
-                            if outbbox[i] in obbox:
-                                idx.append(i)
-                        for b in obbox:
-                            if b not in outbbox:
-                                outbbox.append(b)
-                        for i in reversed(idx):
-                            del outbbox[i]
-                    else:
-                        outbbox.extend(obbox)
-                first = False
-            else:
-                outbbox = query_point_using_bbox(outbbox, point, unit,
-                                                 proj_table)
+    if get_engine(engine) == "numpy":
+        bbox_cols = get_bbox_columns(projpicker_db)
+        return bbox_cols.query_geoms(points, "point", query_op, unit,
+                                     proj_table, is_latlon())
 
-    if sort:
-        sort_bbox(outbbox)
+    # a single query for the envelope of all points is enough for "and"
+    if query_op == "and":
+        bboxes = [calc_geom_envelope(point) for point in points]
+        if bboxes and None not in bboxes:
+            return query_bboxes_by_envelope(bboxes, unit, proj_table,
+                                            projpicker_db)
 
-    return outbbox
+    projpicker_cur = get_connection(projpicker_db).cursor()
+    return query_points_using_cursor(projpicker_cur, points, query_op, unit,
+                                  proj_table)
 
 
 def query_points_using_bbox(
@@ -1667,13 +2301,15 @@ def query_poly(
         poly,
         unit="any",
         proj_table="any",
-        projpicker_db=None):
+        projpicker_db=None,
+        engine=None):
     """
     Return a list of BBox instances in unit in proj_table that completely
     contain an input poly geometry. Each BBox instance is a named tuple with
     all the columns from the bbox table in projpicker.db. Results are sorted by
     area from the smallest to largest. If projpicker_db is None (default),
-    get_projpicker_db() is used.
+    get_projpicker_db() is used. If engine is None (default), get_engine() is
+    used. See query_polys().
 
     Args:
         poly (list): List of parsable point geometries. See parse_poly().
@@ -1681,11 +2317,13 @@ def query_poly(
         proj_table (str): Proj table values from projpicker.db. Defaults to
             "any".
         projpicker_db (str): projpicker.db path. Defaults to None.
+        engine (str): Query engine (sqlite, numpy, slab). Defaults to None.
 
     Returns:
         list: List of queried BBox instances sorted by area.
     """
-    return query_polys([poly], "and", unit, proj_table, projpicker_db)
+    return query_polys([poly], "and", unit, proj_table, projpicker_db,
+                       engine)
 
 
 def query_poly_using_bbox(
@@ -1718,7 +2356,8 @@ def query_polys(
         query_op="and",
         unit="any",
         proj_table="any",
-        projpicker_db=None):
+        projpicker_db=None,
+        engine=None):
     """
     Return a list of BBox instances in unit in proj_table that completely
     contain input poly geometries. Each BBox instance is a named tuple with all
@@ -1726,7 +2365,8 @@ def query_polys(
     performs the intersection of bbox rows while the "or" operator the union
     and the "xor" operator the exclusive OR. Results are sorted by area from
     the smallest to largest. If projpicker_db is None (default),
-    get_projpicker_db() is used.
+    get_projpicker_db() is used. If engine is None (default), get_engine() is
+    used. See query_bboxes().
 
     Args:
         polys (list): List of parsable poly geometries. See parse_polys().
@@ -1735,6 +2375,7 @@ def query_polys(
         proj_table (str): Proj table values from projpicker.db. Defaults to
             "any".
         projpicker_db (str): projpicker.db path. Defaults to None.
+        engine (str): Query engine (sqlite, numpy, slab). Defaults to None.
 
     Returns:
         list: List of queried BBox instances sorted by area.
@@ -1742,7 +2383,8 @@ def query_polys(
     polys = parse_polys(polys)
 
     bboxes = [calc_poly_bbox(poly) for poly in polys]
-    return query_bboxes(bboxes, query_op, unit, proj_table, projpicker_db)
+    return query_bboxes(bboxes, query_op, unit, proj_table, projpicker_db,
+                        engine)
 
 
 def query_polys_using_bbox(
@@ -1780,13 +2422,15 @@ def query_bbox(
         bbox,
         unit="any",
         proj_table="any",
-        projpicker_db=None):
+        projpicker_db=None,
+        engine=None):
     """
     Return a list of BBox instances in unit in proj_table that completely
     contain an input bbox geometry. Each BBox instance is a named tuple with
     all the columns from the bbox table in projpicker.db. Results are sorted by
     area from the smallest to largest. If projpicker_db is None (default),
-    get_projpicker_db() is used.
+    get_projpicker_db() is used. If engine is None (default), get_engine() is
+    used. The slab engine only indexes points, so sqlite is used instead.
 
     Args:
         bbox (list or str): List of four floats or a parsable str of a bbox
@@ -1795,16 +2439,20 @@ def query_bbox(
         proj_table (str): Proj table values from projpicker.db. Defaults to
             "any".
         projpicker_db (str): projpicker.db path. Defaults to None.
+        engine (str): Query engine (sqlite, numpy, slab). Defaults to None.
 
     Returns:
         list: List of queried BBox instances sorted by area.
     """
-    projpicker_db = get_projpicker_db()
+    projpicker_db = get_projpicker_db(projpicker_db)
 
-    with sqlite3.connect(projpicker_db) as projpicker_con:
-        projpicker_cur = projpicker_con.cursor()
-        outbbox = query_bbox_using_cursor(projpicker_cur, bbox, unit,
-                                          proj_table)
+    if get_engine(engine) == "numpy":
+        bbox_cols = get_bbox_columns(projpicker_db)
+        return bbox_cols.query_bbox(bbox, unit, proj_table, is_latlon())
+
+    projpicker_cur = get_connection(projpicker_db).cursor()
+    outbbox = query_bbox_using_cursor(projpicker_cur, bbox, unit,
+                                      proj_table)
     return outbbox
 
 
@@ -1849,15 +2497,18 @@ def query_bboxes(
         query_op="and",
         unit="any",
         proj_table="any",
-        projpicker_db=None):
+        projpicker_db=None,
+        engine=None):
     """
     Return a list of BBox instances in unit in proj_table that completely
     contain input bbox geometries. Each BBox instance is a named tuple with all
     the columns from the bbox table in projpicker.db. The "and" query operator
     performs the intersection of bbox rows while the "or" operator the union
     and the "xor" operator the exclusive OR. Results are sorted by area from
-    the smallest to largest. If projpicker_db is None (default),
-    get_projpicker_db() is used.
+    the smallest to largest. All bboxes are queried at once using a temporary
+    table join. If projpicker_db is None (default), get_projpicker_db() is
+    used. If engine is None (default), get_engine() is used. The slab engine
+    only indexes points, so sqlite is used instead.
 
     Args:
         bboxes (list): List of parsable bbox geometries. See parse_bboxes().
@@ -1866,6 +2517,7 @@ def query_bboxes(
         proj_table (str): Proj table values from projpicker.db. Defaults to
             "any".
         projpicker_db (str): projpicker.db path. Defaults to None.
+        engine (str): Query engine (sqlite, numpy, slab). Defaults to None.
 
     Returns:
         list: List of queried BBox instances sorted by area.
@@ -1877,44 +2529,23 @@ def query_bboxes(
         raise ValueError(f"{query_op}: Invalid query operator")
 
     bboxes = parse_bboxes(bboxes)
-    projpicker_db = get_projpicker_db()
-
-    outbbox = []
-
-    first = True
-    sort = False
+    projpicker_db = get_projpicker_db(projpicker_db)
 
-    with sqlite3.connect(projpicker_db) as projpicker_con:
-        projpicker_cur = projpicker_con.cursor()
-        for bbox in bboxes:
-            if query_op in ("or", "xor") or first:
-                obbox = query_bbox_using_cursor(projpicker_cur, bbox, unit,
-                                                proj_table)
-                if obbox:
-                    n = len(outbbox)
-                    if query_op in ("or", "xor") and not sort and n > 0:
-                        sort = True
-                    if query_op == "xor" and n > 0:
-                        idx = []
-                        for i in range(n):
-                            if outbbox[i] in obbox:
-                                idx.append(i)
-                        for b in obbox:
-                            if b not in outbbox:
-                                outbbox.append(b)
-                        for i in reversed(idx):
-                            del outbbox[i]
-                    else:
-                        outbbox.extend(obbox)
-                first = False
-            else:
-                outbbox = query_bbox_using_bbox(outbbox, bbox, unit,
-                                                proj_table)
+    if get_engine(engine) == "numpy":
+        bbox_cols = get_bbox_columns(projpicker_db)
+        return bbox_cols.query_geoms(bboxes, "bbox", query_op, unit,
+                                     proj_table, is_latlon())
 
-    if sort:
-        sort_bbox(outbbox)
+    # a single query for the envelope of all bboxes is enough for "and"
+    if query_op == "and":
+        envelopes = [calc_geom_envelope(bbox, "bbox") for bbox in bboxes]
+        if envelopes and None not in envelopes:
+            return query_bboxes_by_envelope(envelopes, unit, proj_table,
+                                            projpicker_db)
 
-    return outbbox
+    projpicker_cur = get_connection(projpicker_db).cursor()
+    return query_bboxes_using_cursor(projpicker_cur, bboxes, query_op, unit,
+                                  proj_table)
 
 
 def query_bboxes_using_bbox(
@@ -1968,18 +2599,179 @@ def query_bboxes_using_bbox(
     return prevbbox
 
 
+def calc_geom_envelope(geom, geom_type="point"):
+    """
+    Return a bbox geometry that completely contains an input geometry in the
+    current coordinate system or None if the geometry cannot be collapsed into
+    an envelope. A point is returned as a zero-area bbox and a poly as its
+    bbox. Invalid geometries and latitude-longitude geometries that cross the
+    antimeridian return None. See query_bboxes_by_envelope().
+
+    Args:
+        geom (list or str): List or str of a parsable geometry. See
+            parse_point(), parse_poly(), and parse_bbox().
+        geom_type (str): Geometry type (point, poly, bbox). Defaults to
+            "point".
+
+    Returns:
+        list or None: List of four floats of a bbox geometry or None.
+
+    Raises:
+        ValueError: If geom_type is not one of "point", "poly", or "bbox".
+    """
+    if geom_type not in ("point", "poly", "bbox"):
+        raise ValueError(f"{geom_type}: Invalid geometry type")
+
+    if geom_type == "point":
+        c1, c2 = parse_point(geom)
+        if is_latlon():
+            bbox = [c1, c1, c2, c2]
+        else:
+            bbox = [c2, c2, c1, c1]
+    elif geom_type == "poly":
+        bbox = calc_poly_bbox(parse_poly(geom))
+    else:
+        bbox = parse_bbox(geom)
+
+    if None in bbox:
+        return None
+
+    s, n, w, e = bbox
+    if s > n or w > e or (is_latlon() and (w < -180 or e > 180)):
+        return None
+    return bbox
+
+
+def calc_envelope(bboxes):
+    """
+    Return the envelope of bbox geometries in the current coordinate system.
+    Input bboxes must not cross the antimeridian. See calc_geom_envelope().
+
+    Args:
+        bboxes (list): List of bbox geometries from calc_geom_envelope().
+
+    Returns:
+        list: List of four floats of the envelope bbox geometry.
+    """
+    return [min(x[0] for x in bboxes), max(x[1] for x in bboxes),
+            min(x[2] for x in bboxes), max(x[3] for x in bboxes)]
+
+
+def is_crossing_bbox(bbox):
+    """
+    Return True if bbox crosses the antimeridian in the current coordinate
+    system. Otherwise, return False. No x-y bboxes cross the antimeridian.
+
+    Args:
+        bbox (BBox): BBox instance.
+
+    Returns:
+        bool: True if bbox crosses the antimeridian. Otherwise, False.
+    """
+    return is_latlon() and bbox.west_lon > bbox.east_lon
+
+
+def query_bboxes_by_envelope(
+        bboxes,
+        unit="any",
+        proj_table="any",
+        projpicker_db=None):
+    """
+    Return a list of BBox instances in unit in proj_table that completely
+    contain all input bbox geometries using one query for their envelope. An
+    extent that does not cross the antimeridian contains all bboxes exactly
+    when it contains their envelope, so results are the same as those from
+    query_bboxes() with the "and" operator. Extents that cross the
+    antimeridian are checked against each bbox separately. Results are sorted
+    by area from the smallest to largest. If projpicker_db is None (default),
+    get_projpicker_db() is used.
+
+    Args:
+        bboxes (list): List of bbox geometries from calc_geom_envelope().
+        unit (str): Unit values from projpicker.db. Defaults to "any".
+        proj_table (str): Proj table values from projpicker.db. Defaults to
+            "any".
+        projpicker_db (str): projpicker.db path. Defaults to None.
+
+    Returns:
+        list: List of queried BBox instances sorted by area.
+    """
+    if not bboxes:
+        return []
+
+    projpicker_db = get_projpicker_db(projpicker_db)
+
+    projpicker_cur = get_connection(projpicker_db).cursor()
+    outbbox = query_bbox_using_cursor(projpicker_cur, calc_envelope(bboxes),
+                                      unit, proj_table)
+
+    # an extent that crosses the antimeridian can contain all bboxes on both
+    # sides of the antimeridian without containing their envelope
+    if len(bboxes) > 1:
+        found = set(outbbox)
+        crossing = [b for b in query_crossing_using_cursor(projpicker_cur,
+                                                           unit, proj_table)
+                    if b not in found and
+                    all(is_bbox_within_bbox(bbox, b) for bbox in bboxes)]
+        if crossing:
+            outbbox.extend(crossing)
+            sort_bbox(outbbox)
+    return outbbox
+
+
+def query_bboxes_by_envelope_using_bbox(
+        prevbbox,
+        bboxes,
+        unit="any",
+        proj_table="any"):
+    """
+    Return a subset list of input BBox instances in unit in proj_table that
+    completely contain all input bbox geometries using their envelope. Each
+    BBox instance is a named tuple with all the columns from the bbox table in
+    projpicker.db. This function is used to perform an intersection operation
+    on bbox rows consecutively. See query_bboxes_by_envelope().
+
+    Args:
+        prevbbox (list): List of BBox instances from a previous query.
+        bboxes (list): List of bbox geometries from calc_geom_envelope().
+        unit (str): Unit values from projpicker.db. Defaults to "any".
+        proj_table (str): Proj table values from projpicker.db. Defaults to
+            "any".
+
+    Returns:
+        list: List of queried BBox instances sorted by area.
+    """
+    if not bboxes:
+        return prevbbox
+
+    envelope = calc_envelope(bboxes)
+
+    idx = []
+    for i in range(len(prevbbox)):
+        if unit in ("any", prevbbox[i].unit) and (
+            proj_table in ("any", prevbbox[i].proj_table)) and (
+            is_bbox_within_bbox(envelope, prevbbox[i]) or (
+                is_crossing_bbox(prevbbox[i]) and
+                all(is_bbox_within_bbox(bbox, prevbbox[i])
+                    for bbox in bboxes))):
+            idx.append(i)
+    return [prevbbox[i] for i in idx]
+
+
 def query_geom(
         geom,
         geom_type="point",
         unit="any",
         proj_table="any",
-        projpicker_db=None):
+        projpicker_db=None,
+        engine=None):
     """
     Return a list of BBox instances in unit in proj_table that completely
     contain an input geometry. Each BBox instance is a named tuple with all the
     columns from the bbox table in projpicker.db. Results are sorted by area
     from the smallest to largest. If projpicker_db is None (default),
-    get_projpicker_db() is used.
+    get_projpicker_db() is used. If engine is None (default), get_engine() is
+    used.
 
     Args:
         geom (list or str): List or str of a parsable geometry. See
@@ -1990,6 +2782,7 @@ def query_geom(
         proj_table (str): Proj table values from projpicker.db. Defaults to
             "any".
         projpicker_db (str): projpicker.db path. Defaults to None.
+        engine (str): Query engine (sqlite, numpy, slab). Defaults to None.
 
     Returns:
         list: List of queried BBox instances sorted by area.
@@ -2001,11 +2794,11 @@ def query_geom(
         raise ValueError(f"{geom_type}: Invalid geometry type")
 
     if geom_type == "point":
-        outbbox = query_point(geom, unit, proj_table, projpicker_db)
+        outbbox = query_point(geom, unit, proj_table, projpicker_db, engine)
     elif geom_type == "poly":
-        outbbox = query_poly(geom, unit, proj_table, projpicker_db)
+        outbbox = query_poly(geom, unit, proj_table, projpicker_db, engine)
     else:
-        outbbox = query_bbox(geom, unit, proj_table, projpicker_db)
+        outbbox = query_bbox(geom, unit, proj_table, projpicker_db, engine)
     return outbbox
 
 
@@ -2056,7 +2849,8 @@ def query_geoms(
         query_op="and",
         unit="any",
         proj_table="any",
-        projpicker_db=None):
+        projpicker_db=None,
+        engine=None):
     """
     Return a list of BBox instances in unit in proj_table that completely
     contain input geometries. Each BBox instance is a named tuple with all the
@@ -2064,7 +2858,8 @@ def query_geoms(
     performs the intersection of bbox rows while the "or" operator the union
     and the "xor" operator the exclusive OR. Results are sorted by area from
     the smallest to largest. If projpicker_db is None (default),
-    get_projpicker_db() is used.
+    get_projpicker_db() is used. If engine is None (default), get_engine() is
+    used.
 
     Args:
         geoms (list): List of parsable geometries. See parse_points(),
@@ -2076,6 +2871,7 @@ def query_geoms(
         proj_table (str): Proj table values from projpicker.db. Defaults to
             "any".
         projpicker_db (str): projpicker.db path. Defaults to None.
+        engine (str): Query engine (sqlite, numpy, slab). Defaults to None.
 
     Returns:
         list: List of queried BBox instances sorted by area.
@@ -2092,12 +2888,13 @@ def query_geoms(
 
     if geom_type == "point":
         outbbox = query_points(geoms, query_op, unit, proj_table,
-                               projpicker_db)
+                               projpicker_db, engine)
     elif geom_type == "poly":
-        outbbox = query_polys(geoms, query_op, unit, proj_table, projpicker_db)
+        outbbox = query_polys(geoms, query_op, unit, proj_table, projpicker_db,
+                              engine)
     else:
         outbbox = query_bboxes(geoms, query_op, unit, proj_table,
-                               projpicker_db)
+                               projpicker_db, engine)
     return outbbox
 
 
@@ -2153,7 +2950,9 @@ def query_all(
     """
     Return a list of all BBox instances in unit in proj_table. Each BBox
     instance is a named tuple with all the columns from the bbox table in
-    projpicker.db. Results are sorted by area. If projpicker_db is None
+    projpicker.db. Results are sorted by area. BBox instances are read only
+    once per projpicker.db version, unit, and proj_table and kept in a bounded
+    process-wide cache until projpicker.db changes. If projpicker_db is None
     (default), get_projpicker_db() is used.
 
     Args:
@@ -2166,7 +2965,88 @@ def query_all(
         list: List of all BBox instances sorted by area.
     """
     projpicker_db = get_projpicker_db(projpicker_db)
-    return read_bbox_db(projpicker_db, unit, proj_table)
+    db_path, db_stamp = get_file_stamp(projpicker_db)
+    if db_stamp is None:
+        return read_bbox_db(projpicker_db, unit, proj_table)
+
+    cache_key = db_path, db_stamp, unit, proj_table
+    outbbox = _bbox_all_cache.get(cache_key)
+    if outbbox is None:
+        outbbox = read_bbox_db(projpicker_db, unit, proj_table)
+        _bbox_all_cache.put(cache_key, outbbox)
+    return outbbox.copy()
+
+
+def get_bbox_universe(projpicker_db=None):
+    """
+    Return a list of all BBox instances sorted by area and a dictionary of
+    their positions by BBox instance. The positions are stable row ids for
+    bitsets. See bbox_to_bits() and bits_to_bbox(). Both are read only once
+    per projpicker.db version and kept in a bounded process-wide cache until
+    projpicker.db changes. If projpicker_db is None (default),
+    get_projpicker_db() is used.
+
+    Args:
+        projpicker_db (str): projpicker.db path. Defaults to None.
+
+    Returns:
+        list, dict: List of all BBox instances sorted by area and dictionary
+        of their positions by BBox instance.
+    """
+    return get_bbox_universe_entry(projpicker_db)[:2]
+
+
+def get_bbox_all_bits(
+        unit="any",
+        proj_table="any",
+        projpicker_db=None):
+    """
+    Return a bitset of all BBox instances in unit in proj_table over the
+    universe of all BBox instances. See get_bbox_universe(). Bitsets are
+    cached with the universe. If projpicker_db is None (default),
+    get_projpicker_db() is used.
+
+    Args:
+        unit (str): Unit values from projpicker.db. Defaults to "any".
+        proj_table (str): Proj table values from projpicker.db. Defaults to
+            "any".
+        projpicker_db (str): projpicker.db path. Defaults to None.
+
+    Returns:
+        int: Bitset of all BBox instances in unit in proj_table.
+    """
+    bbox_universe, bbox_index, bits_all = get_bbox_universe_entry(
+            projpicker_db)
+    all_key = unit, proj_table
+    if all_key not in bits_all:
+        bits_all[all_key] = bbox_to_bits(query_all_using_bbox(
+            bbox_universe, unit, proj_table), bbox_index)
+    return bits_all[all_key]
+
+
+def get_bbox_universe_entry(projpicker_db=None):
+    """
+    Return the cached universe entry of projpicker.db, which is a tuple of a
+    list of all BBox instances sorted by area, a dictionary of their positions
+    by BBox instance, and a dictionary of bitsets of all BBox instances by
+    unit and proj_table. If projpicker_db is None (default),
+    get_projpicker_db() is used.
+
+    Args:
+        projpicker_db (str): projpicker.db path. Defaults to None.
+
+    Returns:
+        tuple: Universe entry.
+    """
+    projpicker_db = get_projpicker_db(projpicker_db)
+    cache_key = get_file_stamp(projpicker_db)
+    entry = _bbox_universe_cache.get(cache_key)
+    if entry is None:
+        bbox_universe = query_all(projpicker_db=projpicker_db)
+        bbox_index = {b: i for i, b in enumerate(bbox_universe)}
+        entry = bbox_universe, bbox_index, {}
+        _bbox_universe_cache.put(cache_key, entry)
+    return entry
 
 
 def query_all_using_bbox(
@@ -2199,7 +3079,8 @@ def query_all_using_bbox(
 
 def query_mixed_geoms(
         geoms,
-        projpicker_db=None):
+        projpicker_db=None,
+        engine=None):
     """
     Return a list of BBox instances that completely contain mixed input
     geometries. Each BBox instance is a named tuple with all the columns from
@@ -2215,240 +3096,1319 @@ def query_mixed_geoms(
     latitude-longitude and x-y coordinate systems, respectively. This function
     ignores the current coordinate system set by set_coordinate_system(),
     set_latlon(), or set_xy(), and always starts in the latitude-longitude
-    coordinate system by default. Results are sorted by area from the smallest
-    to largest. If projpicker_db is None (default), get_projpicker_db() is
-    used.
+    coordinate system by default. Geometries are compiled into an optimized
+    query plan by compile_mixed_geoms() and executed by execute_query_plan().
+    Geometries already parsed by parse_mixed_geoms() are not parsed again. If
+    enabled by set_query_cache_size(), results are reused across queries.
+    If geoms is an iterator other than a list or str, geometries are parsed
+    as they are read, and the operands of the "and", "or", and "xor" queries
+    are executed in batches whose results are combined as bitsets, so a large
+    input is queried in constant memory. Streamed queries are not cached.
+    Results are sorted by area from the smallest to largest. If projpicker_db
+    is None (default), get_projpicker_db() is used. If engine is None
+    (default), get_engine() is used.
 
     Args:
-        geoms (list or str): List of "point", "poly", "bbox", "none", "all",
+        geoms (list, str, or iterable): List or iterable of "point", "poly",
+            "bbox", "none", "all", "latlon", "xy", "and", "or", "xor", "not",
+            "match", "unit=", "proj_table=", "match_tole=", "match_max=", and
+            parsable geometries. The first word can be either "and", "or",
+            "xor", or "postfix". See parse_points(), parse_polys(), and
+            parse_bboxes().
+        projpicker_db (str): projpicker.db path. Defaults to None.
+        engine (str): Query engine (sqlite, numpy, slab). Defaults to None.
+
+    Returns:
+        list: List of queried BBox instances sorted by area.
+
+    Raises:
+        SyntaxError: If syntax errors are encountered.
+        ValueError: If engine is not one of "sqlite", "numpy", or "slab".
+        RuntimeError: If the numpy engine is requested without numpy.
+    """
+    if not isinstance(geoms, (str, list)):
+        return query_mixed_geoms_by_batch(geoms, projpicker_db, engine)
+
+    if not _query_cache.max_entries:
+        plan = compile_mixed_geoms(geoms)
+        return execute_query_plan(plan, projpicker_db, engine)
+
+    # the same raw geometries skip parsing and compiling
+    plan = None
+    raw_key = repr(geoms)
+    query_key = _query_key_cache.get(raw_key)
+    if query_key is None:
+        plan = compile_mixed_geoms(geoms)
+        query_key = hash_query_plan(plan, _query_precision)
+        _query_key_cache.put(raw_key, query_key)
+
+    cache_key = get_file_stamp(get_projpicker_db(projpicker_db)), query_key
+    outbbox = _query_cache.get(cache_key)
+    if outbbox is None:
+        if plan is None:
+            plan = compile_mixed_geoms(geoms)
+        outbbox = execute_query_plan(plan, projpicker_db, engine)
+        _query_cache.put(cache_key, outbbox, calc_bbox_size(outbbox))
+    return outbbox.copy()
+
+
+def query_mixed_geoms_by_batch(
+        geoms,
+        projpicker_db=None,
+        engine=None,
+        batch_size=None,
+        fold_polys=True):
+    """
+    Return a list of BBox instances that completely contain mixed input
+    geometries streamed from an iterable. Geometries are parsed and compiled
+    one at a time by iter_query_operands(), and every batch_size operands of
+    the "and", "or", and "xor" queries are optimized and executed together.
+    Batch results are combined as bitsets over the universe of all BBox
+    instances (see get_bbox_universe()), so memory use does not grow with the
+    number of geometries. Once the intersection of the "and" query becomes
+    empty, later batches are only parsed until "all" resets it. The postfix
+    query needs its whole stack and is executed at once. Results are sorted by
+    area from the smallest to largest. If projpicker_db is None (default),
+    get_projpicker_db() is used. If engine is None (default), get_engine() is
+    used. If batch_size is None (default), 64 operands are executed at once.
+    If fold_polys is True (default), the points of polys in the "and", "or",
+    and "xor" queries are folded into their extents as they are read, so
+    large polys take constant memory. See fold_poly_point().
+
+    Args:
+        geoms (iterable): Iterable of "point", "poly", "bbox", "none", "all",
             "latlon", "xy", "and", "or", "xor", "not", "match", "unit=",
             "proj_table=", "match_tole=", "match_max=", and parsable
-            geometries. The first word can be either "and", "or", "xor", or
-            "postfix". See parse_points(), parse_polys(), and parse_bboxes().
+            geometries. See query_mixed_geoms().
         projpicker_db (str): projpicker.db path. Defaults to None.
+        engine (str): Query engine (sqlite, numpy, slab). Defaults to None.
+        batch_size (int): Number of operands executed at once. Defaults to
+            None.
+        fold_polys (bool): Whether or not to fold the points of polys into
+            their extents. Defaults to True.
 
     Returns:
         list: List of queried BBox instances sorted by area.
 
     Raises:
         SyntaxError: If syntax errors are encountered.
+        ValueError: If engine is not one of "sqlite", "numpy", or "slab".
+        RuntimeError: If the numpy engine is requested without numpy.
     """
-    geoms = parse_mixed_geoms(geoms)
+    def execute_batch():
+        nonlocal outbbox, outbits
 
-    outbbox = []
+        # an empty intersection stays empty until all resets it
+        if query_op == "and" and (outbbox == [] or outbits == 0):
+            operands.clear()
+            return
 
-    ngeoms = len(geoms)
-    if ngeoms == 0:
-        return outbbox
+        if query_op == "postfix":
+            plan = operands[0]
+        else:
+            plan = PlanNode(query_op, operands.copy())
+        operands.clear()
+        bbox = execute_query_plan(optimize_query_plan(plan), projpicker_db,
+                                  engine)
+
+        if outbbox is None and outbits is None:
+            outbbox = bbox
+            return
+
+        # combine batch results as bitsets from the second batch
+        bbox_index = get_bbox_universe(projpicker_db)[1]
+        if outbits is None:
+            outbits = bbox_to_bits(outbbox, bbox_index)
+            outbbox = None
+        bits = bbox_to_bits(bbox, bbox_index)
+        if query_op == "and":
+            outbits &= bits
+        elif query_op == "or":
+            outbits |= bits
+        else:
+            outbits ^= bits
+
+    if batch_size is None:
+        batch_size = _query_batch_size
+    if batch_size < 1:
+        raise ValueError(f"{batch_size}: Invalid batch size")
+
+    query_op = None
+    operands = []
+    outbbox = None
+    outbits = None
+
+    for query_op, node in iter_query_operands(geoms, fold_polys):
+        # all resets the intersection of and queries
+        if query_op == "and" and node.op == "all":
+            operands.clear()
+            outbbox = outbits = None
+        operands.append(node)
+        if len(operands) >= batch_size:
+            execute_batch()
+
+    if operands:
+        execute_batch()
+
+    if outbits is not None:
+        return bits_to_bbox(outbits, get_bbox_universe(projpicker_db)[0])
+    return [] if outbbox is None else outbbox
+
+
+def iter_process_pool(
+        func,
+        args,
+        processes=None,
+        initializer=None,
+        initargs=()):
+    """
+    Iterate over the return values of a function called with each tuple of
+    arguments in a pool of processes. Up to two calls per process are in
+    flight, so arguments are read only as return values are consumed and
+    memory use stays constant. Return values are yielded in the order of
+    arguments. If processes is None (default) or 1, the function is called in
+    the current process. Use 0 for as many processes as CPUs. The
+    initializer is called with initargs once in each process of the pool or
+    in the current process if no pool is used.
 
-    if geoms[0] in ("and", "or", "xor", "postfix"):
-        query_op = geoms[0]
-        first_index = 1
-    else:
-        query_op = "and"
-        first_index = 0
+    Args:
+        func (function): Module-level function to call.
+        args (iterable): Iterable of argument tuples.
+        processes (int): Number of processes. Defaults to None.
+        initializer (function): Function to call at the start of each
+            process. Defaults to None.
+        initargs (tuple): Arguments to initializer. Defaults to ().
 
-    if query_op == "postfix":
-        geombbox_stack = []
+    Yields:
+        object: Return value of func.
 
-    geom_type = "point"
+    Raises:
+        ValueError: If processes is negative.
+    """
+    if processes == 0:
+        processes = os.cpu_count() or 1
+    elif processes is not None and processes < 0:
+        raise ValueError(f"{processes}: Invalid number of processes")
+
+    if not processes or processes == 1:
+        if initializer:
+            initializer(*initargs)
+        for a in args:
+            yield func(*a)
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(
+            processes, initializer=initializer, initargs=initargs) as executor:
+        futures = collections.deque()
+        for a in itertools.chain(args, [None]):
+            if a is not None:
+                futures.append(executor.submit(func, *a))
+            while futures and (a is None or len(futures) >= 2 * processes):
+                yield futures.popleft().result()
+
+
+def annotate_features(
+        features,
+        k=1,
+        projpicker_db=None,
+        engine=None):
+    """
+    Return lists of up to k smallest BBox instances that completely contain
+    each feature. Each feature is a leaf PlanNode instance from
+    iter_query_operands() and queried by itself, so its list is the same as
+    the first k BBox instances from execute_query_plan(). With the numpy
+    engine, raw geometries that can be collapsed into bboxes (see
+    calc_geom_envelope()) are tested at once by their coordinate system, unit,
+    and proj_table using a two-dimensional mask over the bbox table. The
+    other features are executed one at a time. If projpicker_db is None
+    (default), get_projpicker_db() is used. If engine is None (default),
+    get_engine() is used.
 
-    was_latlon = is_latlon()
-    try:
-        set_latlon()
-
-        first = True
-        sort = False
-        unit = "any"
-        proj_table = "any"
-        match_tol = 1
-        match_max = 0
-        bbox_all = {}
-        geom_vars = {}
-        sav_is_latlon = sav_geom_type = None
-
-        g = first_index
-        while g < ngeoms:
-            geom = geoms[g]
-            typ = type(geom)
+    Args:
+        features (list): List of leaf PlanNode instances.
+        k (int): Maximum number of BBox instances per feature. Use 0 for all.
+            Defaults to 1.
+        projpicker_db (str): projpicker.db path. Defaults to None.
+        engine (str): Query engine (sqlite, numpy, slab). Defaults to None.
 
-            m = _geom_var_re.match(geom) if typ == str else None
-            if m:
-                sav = m[1] is not None or m[2] is not None
-                use = m[2] is not None or m[3] is not None
-                name = m[1] or m[2] or m[3]
-                if sav:
-                    g += 1
-                    geom_vars[name] = Geom(is_latlon(), geom_type, geoms[g])
-                if use:
-                    if name not in geom_vars:
-                        raise SyntaxError(f"{name}: Undefined geometry "
-                                          "variable")
-                    nam = name
-                    while True:
-                        if nam not in geom_vars:
-                            raise SyntaxError(f"{nam}: Undefined geometry "
-                                              "variable")
-                        geom = geom_vars[nam]
-                        typ = type(geom.geom)
-                        if not (typ == str and geom.geom.startswith(":")):
-                            break
-                        nam = geom.geom[1:]
-                        if nam == name:
-                            raise SyntaxError(f"{name}: Recursive geometry "
-                                              "variable")
-                    if geom.is_latlon != is_latlon():
-                        sav_is_latlon = is_latlon()
-                        if geom.is_latlon:
-                            set_latlon()
-                        else:
-                            set_xy()
-                    else:
-                        sav_is_latlon = None
-                    if geom.type != geom_type:
-                        sav_geom_type = geom_type
-                        geom_type = geom.type
-                    else:
-                        sav_geom_type = None
-                    geom = geom.geom
-                else:
-                    g += 1
-                    continue
+    Returns:
+        list: List of lists of queried BBox instances sorted by area.
 
-            if typ == str and geom.startswith("unit="):
-                unit = geom.split("=")[1]
-            elif typ == str and geom.startswith("proj_table="):
-                proj_table = geom.split("=")[1]
-            elif typ == str and geom.startswith("match_tol="):
-                match_tol = float(geom.split("=")[1])
-            elif typ == str and geom.startswith("match_max="):
-                match_max = int(geom.split("=")[1])
-            elif geom in ("point", "poly", "bbox"):
-                geom_type = geom
-            elif geom == "latlon":
-                set_latlon()
-            elif geom == "xy":
-                set_xy()
-            elif query_op == "postfix":
-                all_key = unit + proj_table
-                n = len(geombbox_stack)
-                if geom == "not" and n >= 1:
-                    if all_key not in bbox_all:
-                        bbox_all[all_key] = query_all(unit, proj_table,
-                                                      projpicker_db)
-                    gbbox = geombbox_stack.pop()
-                    obbox = bbox_not(gbbox.bbox, bbox_all[all_key])
-                    geombbox_stack.append(GeomBBox(is_latlon(), None, geom,
-                                                   obbox))
-                elif geom in ("and", "or", "xor", "match") and n >= 2:
-                    gbbox2 = geombbox_stack.pop()
-                    gbbox1 = geombbox_stack.pop()
-                    if geom == "match":
-                        if None in (gbbox1.type, gbbox2.type):
-                            raise SyntaxError("Non-raw geometries cannot be "
-                                              "matched")
-                        obbox = bbox_binary_operator(gbbox1.bbox, gbbox2.bbox,
-                                                     "and")
-                        gbbox1 = GeomBBox(gbbox1.is_latlon, gbbox1.type,
-                                          gbbox1.geom, obbox)
-                        gbbox2 = GeomBBox(gbbox2.is_latlon, gbbox2.type,
-                                          gbbox2.geom, obbox)
-                        obbox = match_geoms(gbbox1, gbbox2, match_max,
-                                            match_tol)
-                    else:
-                        obbox = bbox_binary_operator(gbbox1.bbox, gbbox2.bbox,
-                                                     geom)
-                    geombbox_stack.append(GeomBBox(is_latlon(), None, geom,
-                                                   obbox))
-                elif geom in ("and", "or", "xor", "not", "match"):
-                    raise SyntaxError(f"Not enough operands for {geom}")
-                else:
-                    if geom == "none":
-                        obbox = []
-                    elif geom == "all":
-                        if all_key not in bbox_all:
-                            bbox_all[all_key] = query_all(unit, proj_table,
-                                                          projpicker_db)
-                        obbox = bbox_all[all_key]
-                    else:
-                        obbox = query_geom(geom, geom_type, unit, proj_table,
-                                           projpicker_db)
-                    geombbox_stack.append(GeomBBox(is_latlon(), geom_type,
-                                                   geom, obbox))
-                if geom in ("or", "xor", "not") and not sort:
-                    sort = True
-            elif geom in ("and", "or", "xor", "not"):
-                raise SyntaxError(f"{geom}: Not in postfix query")
-            elif query_op in ("or", "xor") or first:
-                all_key = unit + proj_table
-                if geom == "none":
-                    obbox = []
-                elif geom == "all":
-                    if all_key not in bbox_all:
-                        bbox_all[all_key] = query_all(unit, proj_table,
-                                                      projpicker_db)
-                    obbox = bbox_all[all_key]
-                else:
-                    obbox = query_geom(geom, geom_type, unit, proj_table,
-                                       projpicker_db)
-                if obbox:
-                    n = len(outbbox)
-                    if query_op in ("or", "xor") and not sort and n > 0:
-                        sort = True
-                    if query_op == "xor" and n > 0:
-                        idx = []
-                        for i in range(len(outbbox)):
-                            if outbbox[i] in obbox:
-                                idx.append(i)
-                        for b in obbox:
-                            if b not in outbbox:
-                                outbbox.append(b)
-                        for i in reversed(idx):
-                            del outbbox[i]
-                    else:
-                        for b in obbox:
-                            if b not in outbbox:
-                                outbbox.append(b)
-                first = False
-            elif geom == "none":
-                outbbox.clear()
-            elif geom == "all":
-                all_key = unit + proj_table
-                if all_key not in bbox_all:
-                    bbox_all[all_key] = query_all(unit, proj_table,
-                                                  projpicker_db)
-                outbbox = bbox_all[all_key]
-            else:
-                outbbox = query_geom_using_bbox(outbbox, geom, geom_type, unit,
-                                                proj_table)
+    Raises:
+        ValueError: If engine is not one of "sqlite", "numpy", or "slab".
+        RuntimeError: If the numpy engine is requested without numpy.
+    """
+    projpicker_db = get_projpicker_db(projpicker_db)
+    engine = get_engine(engine)
 
-            if sav_is_latlon is not None:
-                if sav_is_latlon:
+    outbbox = [None] * len(features)
+
+    if engine == "numpy":
+        bbox_cols = get_bbox_columns(projpicker_db)
+
+        # feature indices and bboxes by coordinate system and constraints
+        groups = {}
+        was_latlon = is_latlon()
+        try:
+            for i, node in enumerate(features):
+                if node.op != "scan":
+                    continue
+                if node.is_latlon and not is_latlon():
                     set_latlon()
-                else:
+                elif not node.is_latlon and is_latlon():
                     set_xy()
-                sav_is_latlon = None
+                bbox = calc_geom_envelope(node.geom, node.geom_type)
+                if bbox:
+                    idx, bboxes = groups.setdefault(
+                            (node.is_latlon, node.unit, node.proj_table),
+                            ([], []))
+                    idx.append(i)
+                    bboxes.append(bbox)
+        finally:
+            if was_latlon and not is_latlon():
+                set_latlon()
+            elif not was_latlon and is_latlon():
+                set_xy()
+
+        for (latlon, unit, proj_table), (idx, bboxes) in groups.items():
+            for i, bbox in zip(idx, bbox_cols.query_top_bboxes(
+                    bboxes, k, unit, proj_table, latlon)):
+                outbbox[i] = bbox
+
+    for i, node in enumerate(features):
+        if outbbox[i] is None:
+            bbox = execute_query_plan(node, projpicker_db, engine)
+            outbbox[i] = bbox[:k] if k > 0 else bbox
+
+    return outbbox
+
+
+def annotate_mixed_geoms(
+        geoms,
+        k=1,
+        projpicker_db=None,
+        engine=None,
+        processes=None,
+        batch_size=None,
+        fold_polys=True):
+    """
+    Iterate over the features of mixed input geometries and their lists of up
+    to k smallest BBox instances that completely contain them. Every raw
+    geometry, "none", and "all" is a feature identified by its 0-based index
+    in the input, and the "and", "or", and "xor" query operators are ignored
+    because features are queried separately. Geometries are streamed from an
+    iterable through iter_query_operands() and every batch_size features are
+    annotated at once by annotate_features(). If processes is greater than 1,
+    batches are annotated by a pool of processes with up to two batches per
+    process in flight, and features are still yielded in the input order. Use
+    0 for as many processes as CPUs. If projpicker_db is None (default),
+    get_projpicker_db() is used. If engine is None (default), get_engine() is
+    used. If batch_size is None (default), 256 features are annotated at
+    once. If fold_polys is True (default), the points of polys are folded
+    into their extents as they are read. See fold_poly_point().
+
+    Args:
+        geoms (list, str, or iterable): List or iterable of "point", "poly",
+            "bbox", "none", "all", "latlon", "xy", "unit=", "proj_table=", and
+            parsable geometries. See query_mixed_geoms().
+        k (int): Maximum number of BBox instances per feature. Use 0 for all.
+            Defaults to 1.
+        projpicker_db (str): projpicker.db path. Defaults to None.
+        engine (str): Query engine (sqlite, numpy, slab). Defaults to None.
+        processes (int): Number of processes. Defaults to None for no pool.
+        batch_size (int): Number of features annotated at once. Defaults to
+            None.
+        fold_polys (bool): Whether or not to fold the points of polys into
+            their extents. Defaults to True.
+
+    Yields:
+        int, list: Feature ID and list of queried BBox instances sorted by
+        area.
+
+    Raises:
+        SyntaxError: If syntax errors are encountered or the postfix query is
+            given.
+        ValueError: If k, processes, or batch_size is invalid, or engine is
+            not one of "sqlite", "numpy", or "slab".
+        RuntimeError: If the numpy engine is requested without numpy.
+    """
+    def iter_batches():
+        batch = []
+        for query_op, node in iter_query_operands(geoms, fold_polys):
+            if query_op == "postfix":
+                raise SyntaxError("Postfix query cannot be annotated")
+            batch.append(node)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    if k < 0:
+        raise ValueError(f"{k}: Invalid number of BBox instances")
+
+    if batch_size is None:
+        batch_size = _annotate_batch_size
+    if batch_size < 1:
+        raise ValueError(f"{batch_size}: Invalid batch size")
+
+    projpicker_db = get_projpicker_db(projpicker_db)
+    engine = get_engine(engine)
+
+    batches = ((batch, k, projpicker_db, engine) for batch in iter_batches())
+
+    geom_id = 0
+    for outbbox in iter_process_pool(annotate_features, batches, processes):
+        for bbox in outbbox:
+            yield geom_id, bbox
+            geom_id += 1
+
+
+def iter_batch_queries(lines, delimiter=None):
+    """
+    Iterate over the independent queries of str lines in batch mode. Queries
+    are separated by delimiter lines and a delimiter line can be followed by
+    the ID of the next query. Queries without an ID are identified by their
+    0-based index. Empty queries without an ID are skipped. If delimiter is
+    None (default), "---" is used.
+
+    Args:
+        lines (iterable): Iterable of str lines.
+        delimiter (str): Delimiter word. Defaults to None.
+
+    Yields:
+        int or str, list: Query ID and list of str lines.
+    """
+    if delimiter is None:
+        delimiter = _query_delimiter
+
+    nqueries = 0
+    query_id = None
+    query = []
+    for line in itertools.chain(lines, [None]):
+        if line is not None:
+            words = line.split(None, 1)
+            if not words or words[0] != delimiter:
+                query.append(line)
+                continue
+        if query_id is not None or any(tokenize_lines(query)):
+            yield nqueries if query_id is None else query_id, query
+            nqueries += 1
+        if line is not None:
+            query_id = words[1].strip() if len(words) > 1 else None
+            query = []
+
+
+def init_batch_caches():
+    """
+    Enable the query and raw geometry result caches shared by batch queries
+    in the current process if they are disabled. See set_query_cache_size()
+    and set_geom_cache_size().
+    """
+    if not _query_cache.max_entries:
+        set_query_cache_size(_batch_cache_size, _batch_cache_bytes,
+                             _query_precision)
+    if not _geom_cache.max_entries:
+        set_geom_cache_size(_batch_cache_size)
+
+
+def query_batch_queries(queries, projpicker_db=None, engine=None):
+    """
+    Return the results of independent queries. Each query is queried by
+    query_mixed_geoms() and a query with syntax errors or invalid geometries
+    returns its error message instead of stopping the other queries. If
+    projpicker_db is None (default), get_projpicker_db() is used. If engine is
+    None (default), get_engine() is used.
+
+    Args:
+        queries (list): List of query ID and str line list tuples. See
+            iter_batch_queries().
+        projpicker_db (str): projpicker.db path. Defaults to None.
+        engine (str): Query engine (sqlite, numpy, slab). Defaults to None.
+
+    Returns:
+        list: List of query ID, list of queried BBox instances sorted by area,
+        and error message or None tuples.
+    """
+    results = []
+    for query_id, lines in queries:
+        try:
+            bbox = query_mixed_geoms(list(tokenize_lines(lines)),
+                                     projpicker_db, engine)
+            results.append((query_id, bbox, None))
+        except (SyntaxError, ValueError) as e:
+            results.append((query_id, [], str(e)))
+    return results
+
+
+def query_batch(
+        lines,
+        projpicker_db=None,
+        engine=None,
+        processes=None,
+        delimiter=None):
+    """
+    Iterate over the results of many independent queries in str lines
+    separated by delimiter lines. See iter_batch_queries(). Queries are read
+    as results are consumed and queries in each process share one
+    projpicker.db connection and the query and raw geometry result caches,
+    which are enabled if they are disabled and disabled again after the last
+    query in the current process. See init_batch_caches(). If processes is
+    greater than 1, every 16 queries are sent to a pool of processes, and
+    results are still yielded in the input order. Use 0 for as many processes
+    as CPUs. If projpicker_db is None (default), get_projpicker_db() is used.
+    If engine is None (default), get_engine() is used. If delimiter is None
+    (default), "---" is used.
+
+    Args:
+        lines (iterable): Iterable of str lines.
+        projpicker_db (str): projpicker.db path. Defaults to None.
+        engine (str): Query engine (sqlite, numpy, slab). Defaults to None.
+        processes (int): Number of processes. Defaults to None for no pool.
+        delimiter (str): Delimiter word. Defaults to None.
+
+    Yields:
+        int or str, list, str: Query ID, list of queried BBox instances sorted
+        by area, and error message or None.
+
+    Raises:
+        ValueError: If processes is negative or engine is not one of
+            "sqlite", "numpy", or "slab".
+        RuntimeError: If the numpy engine is requested without numpy.
+    """
+    def iter_chunks():
+        queries = iter_batch_queries(lines, delimiter)
+        while True:
+            chunk = list(itertools.islice(queries, _batch_chunk_size))
+            if not chunk:
+                break
+            yield chunk, projpicker_db, engine
+
+    projpicker_db = get_projpicker_db(projpicker_db)
+    engine = get_engine(engine)
+
+    query_cache_size = _query_cache.max_entries
+    geom_cache_size = _geom_cache.max_entries
+    try:
+        for results in iter_process_pool(query_batch_queries, iter_chunks(),
+                                         processes, init_batch_caches):
+            yield from results
+    finally:
+        if not query_cache_size:
+            set_query_cache_size(0, precision=_query_precision)
+        if not geom_cache_size:
+            set_geom_cache_size(0)
+
+
+###############################################################################
+# query plans
+
+class PlanNode:
+    """
+    Provide a node of a query plan compiled from mixed geometries. Leaf nodes
+    are "scan" for raw geometries, and "none" and "all" for special
+    geometries. Inner nodes are the "and", "or", "xor", and "not" set
+    operators, "match", and "envelope" for "and" operands collapsed into one
+    query. Constraints including the coordinate system, unit, and proj_table
+    are stored in each node. Nodes with the same key return the same BBox
+    instances. See compile_mixed_geoms().
+    """
+
+    def __init__(
+            self,
+            op,
+            children=None,
+            is_latlon=True,
+            geom_type=None,
+            geom=None,
+            unit="any",
+            proj_table="any",
+            match_tol=1,
+            match_max=0,
+            bboxes=None):
+        """
+        Create a plan node.
+
+        Args:
+            op (str): Node operator (scan, none, all, and, or, xor, not,
+                match, envelope).
+            children (list): List of child PlanNode instances. Defaults to
+                None.
+            is_latlon (bool): Whether or not the node is in the
+                latitude-longitude coordinate system. Defaults to True.
+            geom_type (str): Geometry type (point, poly, bbox) of a raw
+                geometry. None for non-raw geometries. Defaults to None.
+            geom (list or str): Parsed geometry, "none", or "all" for leaf
+                nodes. Defaults to None.
+            unit (str): Unit values from projpicker.db. Defaults to "any".
+            proj_table (str): Proj table values from projpicker.db. Defaults
+                to "any".
+            match_tol (float): Positive distance tolerance in unknown xy units
+                for match nodes. Defaults to 1.
+            match_max (int): Maximum number of matches to return for match
+                nodes. Defaults to 0.
+            bboxes (list): List of bbox geometries for envelope nodes. See
+                calc_geom_envelope(). Defaults to None.
+        """
+        self.op = op
+        self.children = children or []
+        self.is_latlon = is_latlon
+        self.geom_type = geom_type
+        self.geom = geom
+        self.unit = unit
+        self.proj_table = proj_table
+        self.match_tol = match_tol
+        self.match_max = match_max
+        self.bboxes = bboxes
+        self._key = None
+
+    @property
+    def key(self):
+        """
+        Return a hashable key that is the same for nodes that return the same
+        BBox instances. Child nodes are compared by identity, so nodes with
+        the same key must share their child nodes as optimize_query_plan()
+        does. The order of operands is ignored for commutative operators.
+
+        Returns:
+            tuple: Node key.
+        """
+        if self._key is None:
+            children = list(self.children)
+            if self.op in ("and", "or", "xor", "envelope"):
+                children.sort(key=id)
+            children = tuple(children)
+            if self.op in ("and", "or", "xor"):
+                self._key = self.op, children
+            elif self.op == "not":
+                self._key = self.op, self.unit, self.proj_table, children
+            elif self.op == "match":
+                self._key = self.op, self.match_tol, self.match_max, children
+            elif self.op == "envelope":
+                self._key = (self.op, self.is_latlon, self.unit,
+                             self.proj_table, children)
+            else:
+                self._key = (self.op, self.is_latlon, self.geom_type,
+                             repr(self.geom), self.unit, self.proj_table)
+        return self._key
+
+    def describe(self):
+        """
+        Return a one-line str description of the node.
+
+        Returns:
+            str: Node description.
+        """
+        desc = [self.op]
+        if self.op in ("scan", "envelope"):
+            desc.append("latlon" if self.is_latlon else "xy")
+        if self.op == "scan":
+            desc.extend((self.geom_type, str(self.geom)))
+        elif self.op == "envelope":
+            desc.append(str(calc_envelope(self.bboxes)))
+        elif self.op == "match":
+            desc.extend((f"match_tol={self.match_tol}",
+                         f"match_max={self.match_max}"))
+        if self.op in ("scan", "all", "not", "envelope"):
+            if self.unit != "any":
+                desc.append(f"unit={self.unit}")
+            if self.proj_table != "any":
+                desc.append(f"proj_table={self.proj_table}")
+        return " ".join(desc)
+
+
+def iter_plan_nodes(plan):
+    """
+    Iterate over the nodes of a query plan in post-order. Child nodes are
+    yielded before their parent nodes and each node is yielded only once even
+    if it is referenced more than once.
+
+    Args:
+        plan (PlanNode): Root node of a query plan.
+
+    Yields:
+        PlanNode: Plan node.
+    """
+    visited = set()
+    stack = [(plan, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded:
+            yield node
+        elif node not in visited:
+            visited.add(node)
+            stack.append((node, True))
+            for c in reversed(node.children):
+                stack.append((c, False))
+
+
+def hash_query_plan(plan, precision=9):
+    """
+    Return the hash of the canonical form of a query plan. In the canonical
+    form, coordinates are rounded to precision decimal places with negative
+    zeros normalized, and the operands of the commutative "and", "or", "xor",
+    and "envelope" operators are sorted, so plans that differ only in these
+    respects have the same hash. Duplicate operands of the idempotent "and"
+    and "or" operators are removed. Each node is hashed from the hashes of its
+    child nodes, so deep plans take linear time.
+
+    Args:
+        plan (PlanNode): Root node of a query plan. See compile_mixed_geoms().
+        precision (int): Number of decimal places of coordinates. Defaults to
+            9.
+
+    Returns:
+        bytes: 16-byte hash of the canonical form of the query plan.
+    """
+    def canonicalize_geom(geom):
+        if type(geom) in (list, tuple):
+            return "[" + ",".join(map(canonicalize_geom, geom)) + "]"
+        if type(geom) in (int, float):
+            return repr(round(float(geom), precision) + 0.0)
+        return repr(geom)
+
+    hashes = {}
+    for node in iter_plan_nodes(plan):
+        children = [hashes[c] for c in node.children]
+        if node.op in ("and", "or"):
+            children = sorted(set(children))
+        elif node.op in ("xor", "envelope"):
+            children.sort()
+        form = [node.op]
+        if node.op in ("scan", "envelope"):
+            form.append("latlon" if node.is_latlon else "xy")
+        if node.op == "scan":
+            form.extend((node.geom_type, canonicalize_geom(node.geom)))
+        elif node.op == "match":
+            form.extend((repr(node.match_tol), repr(node.match_max)))
+        if node.op in ("scan", "all", "not", "envelope"):
+            form.extend((repr(node.unit), repr(node.proj_table)))
+        form = " ".join(form + [c.hex() for c in children])
+        hashes[node] = hashlib.blake2b(form.encode(), digest_size=16).digest()
+    return hashes[plan]
+
+
+def iter_query_operands(geoms, fold_polys=False):
+    """
+    Iterate over the query operator and operand nodes of mixed input
+    geometries. For the "and", "or", and "xor" queries, a leaf node is yielded
+    as soon as its geometry is parsed, so geometries from an iterator are
+    compiled one at a time without holding all of them in memory. Because the
+    "all" special geometry resets the intersection of the "and" query,
+    operands before "all" need to be discarded by the caller. For the postfix
+    query, only the root node is yielded after the last geometry. See
+    compile_mixed_geoms(). If fold_polys is True, polys streamed from an
+    iterator are folded into their extents. See iter_mixed_geoms().
+
+    Args:
+        geoms (list, str, or iterable): List or iterable of "point", "poly",
+            "bbox", "none", "all", "latlon", "xy", "and", "or", "xor", "not",
+            "match", "unit=", "proj_table=", "match_tol=", "match_max=", and
+            parsable geometries. The first word can be either "and", "or",
+            "xor", or "postfix". See query_mixed_geoms().
+        fold_polys (bool): Whether or not to fold the points of polys into
+            their extents. Defaults to False.
+
+    Yields:
+        str, PlanNode: Query operator and operand node.
+
+    Raises:
+        SyntaxError: If syntax errors are encountered.
+    """
+    if isinstance(geoms, (str, list)):
+        geoms = parse_mixed_geoms(geoms)
+    else:
+        geoms = iter_mixed_geoms(geoms, fold_polys)
+
+    end = object()
+    geoms = iter(geoms)
+    # geometry read ahead to find the query operator
+    pushed = []
+
+    geom = next(geoms, end)
+    if geom is end:
+        return
+
+    if geom in ("and", "or", "xor", "postfix"):
+        query_op = geom
+    else:
+        query_op = "and"
+        pushed.append(geom)
+
+    # stack of postfix queries
+    operands = []
+
+    coor_is_latlon = True
+    geom_type = "point"
+    unit = "any"
+    proj_table = "any"
+    match_tol = 1
+    match_max = 0
+    geom_vars = {}
+
+    while True:
+        geom = pushed.pop() if pushed else next(geoms, end)
+        if geom is end:
+            break
+        typ = type(geom)
+        geom_is_latlon = coor_is_latlon
+        geom_geom_type = geom_type
+
+        m = _geom_var_re.match(geom) if typ == str else None
+        if m:
+            sav = m[1] is not None or m[2] is not None
+            use = m[2] is not None or m[3] is not None
+            name = m[1] or m[2] or m[3]
+            if sav:
+                geom_vars[name] = Geom(coor_is_latlon, geom_type, next(geoms))
+            if use:
+                if name not in geom_vars:
+                    raise SyntaxError(f"{name}: Undefined geometry variable")
+                nam = name
+                while True:
+                    if nam not in geom_vars:
+                        raise SyntaxError(f"{nam}: Undefined geometry "
+                                          "variable")
+                    geom = geom_vars[nam]
+                    typ = type(geom.geom)
+                    if not (typ == str and geom.geom.startswith(":")):
+                        break
+                    nam = geom.geom[1:]
+                    if nam == name:
+                        raise SyntaxError(f"{name}: Recursive geometry "
+                                          "variable")
+                geom_is_latlon = geom.is_latlon
+                geom_geom_type = geom.type
+                geom = geom.geom
+            else:
+                continue
+
+        if typ == str and geom.startswith("unit="):
+            unit = geom.split("=")[1]
+        elif typ == str and geom.startswith("proj_table="):
+            proj_table = geom.split("=")[1]
+        elif typ == str and geom.startswith("match_tol="):
+            match_tol = float(geom.split("=")[1])
+        elif typ == str and geom.startswith("match_max="):
+            match_max = int(geom.split("=")[1])
+        elif geom in ("point", "poly", "bbox"):
+            geom_type = geom
+        elif geom == "latlon":
+            coor_is_latlon = True
+        elif geom == "xy":
+            coor_is_latlon = False
+        elif query_op == "postfix" and geom in ("and", "or", "xor", "not",
+                                                "match"):
+            n = len(operands)
+            if geom == "not" and n >= 1:
+                node = PlanNode(geom, [operands.pop()], coor_is_latlon,
+                                unit=unit, proj_table=proj_table)
+            elif geom == "match" and n >= 2:
+                node2 = operands.pop()
+                node1 = operands.pop()
+                if None in (node1.geom_type, node2.geom_type):
+                    raise SyntaxError("Non-raw geometries cannot be matched")
+                node = PlanNode(geom, [node1, node2], coor_is_latlon,
+                                match_tol=match_tol, match_max=match_max)
+            elif n >= 2:
+                node2 = operands.pop()
+                node = operands.pop()
+                # associative operators take any number of operands
+                if node.op != geom:
+                    node = PlanNode(geom, [node], coor_is_latlon)
+                if node2.op == geom:
+                    node.children.extend(node2.children)
+                else:
+                    node.children.append(node2)
+            else:
+                raise SyntaxError(f"Not enough operands for {geom}")
+            operands.append(node)
+        elif geom in ("and", "or", "xor", "not", "match"):
+            raise SyntaxError(f"{geom}: Not in postfix query")
+        else:
+            if geom in ("none", "all"):
+                node = PlanNode(geom, is_latlon=geom_is_latlon,
+                                geom_type=geom_geom_type, geom=geom,
+                                unit=unit, proj_table=proj_table)
+            else:
+                node = PlanNode("scan", is_latlon=geom_is_latlon,
+                                geom_type=geom_geom_type, geom=geom,
+                                unit=unit, proj_table=proj_table)
+            if query_op == "postfix":
+                operands.append(node)
+            else:
+                yield query_op, node
+
+    if query_op == "postfix":
+        if len(operands) > 1:
+            raise SyntaxError("Postfix operations failed")
+        if operands:
+            yield query_op, operands[0]
+
+
+
+def compile_mixed_geoms(geoms, optimize=True):
+    """
+    Compile mixed input geometries into a query plan and return its root
+    node. The plan is a tree of PlanNode instances for leaf scans, set
+    operators, and matches with their constraints. Unlike query_mixed_geoms(),
+    this function does not change the current coordinate system. If optimize
+    is True (default), the plan is optimized by optimize_query_plan().
+
+    Args:
+        geoms (list or str): List of "point", "poly", "bbox", "none", "all",
+            "latlon", "xy", "and", "or", "xor", "not", "match", "unit=",
+            "proj_table=", "match_tole=", "match_max=", and parsable
+            geometries. The first word can be either "and", "or", "xor", or
+            "postfix". See query_mixed_geoms().
+        optimize (bool): Whether or not to optimize the query plan. Defaults
+            to True.
+
+    Returns:
+        PlanNode: Root node of the query plan.
+
+    Raises:
+        SyntaxError: If syntax errors are encountered.
+    """
+    query_op = None
+    # operands of and, or, and xor queries
+    operands = []
+    for query_op, node in iter_query_operands(geoms):
+        # all resets the intersection of and queries
+        if query_op == "and" and node.op == "all":
+            operands.clear()
+        operands.append(node)
+
+    if query_op == "postfix":
+        plan = operands[0]
+    elif operands:
+        plan = PlanNode(query_op, operands)
+    else:
+        plan = PlanNode("none")
 
-            if sav_geom_type is not None:
-                geom_type = sav_geom_type
-                sav_geom_type = None
+    if optimize:
+        plan = optimize_query_plan(plan)
+    return plan
 
-            g += 1
+
+def optimize_query_plan(plan):
+    """
+    Optimize a query plan and return the root node of the optimized plan.
+    Nested "and", "or", and "xor" operators are flattened, and "none" and
+    "all" are folded into constants where possible. Repeated subexpressions
+    are merged into one node so that they are executed only once. Operands of
+    "and" are reordered to query raw geometries first, and those in the same
+    coordinate system, unit, and proj_table are collapsed into one "envelope"
+    node. See query_bboxes_by_envelope().
+
+    Args:
+        plan (PlanNode): Root node of a query plan.
+
+    Returns:
+        PlanNode: Root node of the optimized query plan.
+    """
+    def share(node):
+        return nodes.setdefault(node.key, node)
+
+    # node is within the constraints of unit and proj_table
+    def is_within(node, unit, proj_table):
+        return (unit in ("any", node.unit) and
+                proj_table in ("any", node.proj_table))
+
+    def calc_node_envelope(node):
+        if node.is_latlon and not is_latlon():
+            set_latlon()
+        elif not node.is_latlon and is_latlon():
+            set_xy()
+        return calc_geom_envelope(node.geom, node.geom_type)
+
+    def optimize_and(node, children):
+        if [c for c in children if c.op == "none"]:
+            return PlanNode("none", is_latlon=node.is_latlon)
+
+        # all is redundant if another operand is within its constraints
+        scans = [c for c in children if c.op == "scan"]
+        children = [c for c in children
+                    if c.op != "all" or
+                    not [s for s in scans
+                         if is_within(s, c.unit, c.proj_table)]]
+
+        # raw geometries that can be collapsed into an envelope first
+        envelopes = {}
+        for c in children:
+            if c.op == "scan":
+                envelopes[c] = calc_node_envelope(c)
+
+        orders = {}
+        for c in children:
+            if c.op == "scan" and envelopes[c]:
+                orders[c] = 0, c.is_latlon, c.unit, c.proj_table
+            else:
+                orders[c] = {"scan": 1, "all": 3}.get(c.op, 2),
+
+        children.sort(key=orders.get)
+
+        ochildren = []
+        i = 0
+        while i < len(children):
+            c = children[i]
+            j = i + 1
+            if orders[c][0] == 0:
+                while j < len(children) and orders[children[j]] == orders[c]:
+                    j += 1
+            if j - i > 1:
+                group = children[i:j]
+                ochildren.append(share(PlanNode(
+                    "envelope", group, c.is_latlon, unit=c.unit,
+                    proj_table=c.proj_table,
+                    bboxes=[envelopes[x] for x in group])))
+            else:
+                ochildren.append(c)
+            i = j
+
+        if len(ochildren) == 1:
+            return ochildren[0]
+        return PlanNode("and", ochildren, node.is_latlon)
+
+    def optimize_or(node, children):
+        children = [c for c in children if c.op != "none"]
+        for c in children:
+            if c.op == "all" and c.unit == c.proj_table == "any":
+                return c
+        if not children:
+            return PlanNode("none", is_latlon=node.is_latlon)
+        if len(children) == 1:
+            return children[0]
+        return PlanNode("or", children, node.is_latlon)
+
+    def optimize_xor(node, children):
+        # x xor x is none
+        counts = collections.Counter(c for c in children if c.op != "none")
+        children = [c for c in counts if counts[c] % 2]
+        if not children:
+            return PlanNode("none", is_latlon=node.is_latlon)
+        if len(children) == 1:
+            return children[0]
+        return PlanNode("xor", children, node.is_latlon)
+
+    def optimize_not(node, child):
+        if child.op == "none":
+            return PlanNode("all", is_latlon=node.is_latlon, unit=node.unit,
+                            proj_table=node.proj_table)
+        if child.op == "all" and is_within(node, child.unit,
+                                           child.proj_table):
+            return PlanNode("none", is_latlon=node.is_latlon)
+        return PlanNode("not", [child], node.is_latlon, unit=node.unit,
+                        proj_table=node.proj_table)
+
+    def optimize(node, ochildren):
+        if not node.children or node.op == "envelope":
+            return share(node)
+
+        children = []
+        for c in ochildren:
+            if c.op == node.op in ("and", "or", "xor"):
+                children.extend(c.children)
+            else:
+                children.append(c)
+        # x and x is x, and x or x is x
+        if node.op in ("and", "or"):
+            children = list({c.key: c for c in children}.values())
+
+        if node.op == "and":
+            node = optimize_and(node, children)
+        elif node.op == "or":
+            node = optimize_or(node, children)
+        elif node.op == "xor":
+            node = optimize_xor(node, children)
+        elif node.op == "not":
+            node = optimize_not(node, children[0])
+        else:
+            node = PlanNode(node.op, children, node.is_latlon,
+                            match_tol=node.match_tol,
+                            match_max=node.match_max)
+        return share(node)
+
+    nodes = {}
+    onodes = {}
+
+    was_latlon = is_latlon()
+    try:
+        for node in iter_plan_nodes(plan):
+            onodes[node] = optimize(node, [onodes[c] for c in node.children])
+        return onodes[plan]
     finally:
         if was_latlon and not is_latlon():
             set_latlon()
         elif not was_latlon and is_latlon():
             set_xy()
 
-    if query_op == "postfix":
-        if len(geombbox_stack) > 1:
-            raise SyntaxError("Postfix operations failed")
-        outbbox = geombbox_stack[0].bbox
 
-    if sort:
-        sort_bbox(outbbox)
+def execute_query_plan(
+        plan,
+        projpicker_db=None,
+        engine=None,
+        profile=None):
+    """
+    Execute a query plan and return a list of BBox instances. Each node is
+    executed only once even if it is referenced more than once, and raw
+    geometry results are reused across queries if enabled by
+    set_geom_cache_size(). The first
+    operand of "and" is queried from the database and the rest filter its
+    results in order. Intermediate results of the other set operators are
+    bitsets over the universe of all bbox rows; see bbox_to_bits(). If profile
+    is a dictionary, the number of rows and wall time in seconds spent in each
+    executed PlanNode instance excluding its children are stored by the
+    instance; see explain_query_plan(). Results are sorted
+    by area from the smallest to largest. If projpicker_db is None (default),
+    get_projpicker_db() is used. If engine is None (default), get_engine() is
+    used.
 
-    return outbbox
+    Args:
+        plan (PlanNode): Root node of a query plan. See compile_mixed_geoms().
+        projpicker_db (str): projpicker.db path. Defaults to None.
+        engine (str): Query engine (sqlite, numpy, slab). Defaults to None.
+        profile (dict): Dictionary for the number of rows and wall time by
+            PlanNode instance. Defaults to None.
+
+    Returns:
+        list: List of queried BBox instances sorted by area.
+
+    Raises:
+        SyntaxError: If geometries cannot be matched.
+        ValueError: If engine is not one of "sqlite", "numpy", or "slab".
+        RuntimeError: If the numpy engine is requested without numpy.
+    """
+    def set_coor_sys(node):
+        if node.is_latlon and not is_latlon():
+            set_latlon()
+        elif not node.is_latlon and is_latlon():
+            set_xy()
+
+    def query_geom_by_engine(geom, geom_type, unit, proj_table):
+        if bbox_cols:
+            return bbox_cols.query_geom(geom, geom_type, unit, proj_table,
+                                        is_latlon())
+        return query_geom(geom, geom_type, unit, proj_table, projpicker_db,
+                          engine)
+
+    def query_geom_using_bbox_by_engine(prevbbox, geom, geom_type, unit,
+                                        proj_table):
+        if bbox_cols:
+            return bbox_cols.query_geom_using_bbox(prevbbox, geom, geom_type,
+                                                   unit, proj_table,
+                                                   is_latlon())
+        return query_geom_using_bbox(prevbbox, geom, geom_type, unit,
+                                     proj_table)
+
+    def query_all_by_engine(unit, proj_table):
+        if bbox_cols:
+            return bbox_cols.query_all(unit, proj_table)
+        return query_all(unit, proj_table, projpicker_db)
+
+    def get_bbox_universe_by_engine():
+        nonlocal bbox_universe
+        if bbox_universe is None:
+            if bbox_cols:
+                bbox_universe = bbox_cols.bbox, bbox_cols.index
+            else:
+                bbox_universe = get_bbox_universe(projpicker_db)
+        return bbox_universe
+
+    def to_bits(bbox):
+        if type(bbox) == int:
+            return bbox
+        return bbox_to_bits(bbox, get_bbox_universe_by_engine()[1])
+
+    def to_bbox(bits):
+        if type(bits) != int:
+            return bits
+        return bits_to_bbox(bits, get_bbox_universe_by_engine()[0])
+
+    # filter the universe instead of querying all rows again because "not"
+    # takes the complement against all rows in unit in proj_table
+    def query_all_bits(unit, proj_table):
+        if not bbox_cols:
+            return get_bbox_all_bits(unit, proj_table, projpicker_db)
+        all_key = unit, proj_table
+        if all_key not in bits_all:
+            bbox_universe = get_bbox_universe_by_engine()[0]
+            bits_all[all_key] = to_bits(query_all_using_bbox(
+                bbox_universe, unit, proj_table))
+        return bits_all[all_key]
+
+    def record(node, start, result):
+        if profile is not None and node not in profile:
+            if type(result) == int:
+                nrows = bin(result).count("1")
+            else:
+                nrows = len(result)
+            profile[node] = nrows, time.perf_counter() - start
+
+    def filter_bbox(prevbbox, node):
+        if node.op == "all":
+            return query_all_using_bbox(prevbbox, node.unit, node.proj_table)
+        set_coor_sys(node)
+        if node.op == "scan":
+            return query_geom_using_bbox_by_engine(prevbbox, node.geom,
+                                                   node.geom_type, node.unit,
+                                                   node.proj_table)
+        if bbox_cols:
+            for c in node.children:
+                prevbbox = query_geom_using_bbox_by_engine(
+                        prevbbox, c.geom, c.geom_type, c.unit, c.proj_table)
+            return prevbbox
+        return query_bboxes_by_envelope_using_bbox(prevbbox, node.bboxes,
+                                                   node.unit, node.proj_table)
+
+    # operands of and other than the first one filter its results
+    def is_filter(node, i):
+        return (node.op == "and" and i > 0 and
+                node.children[i].op in ("scan", "all", "envelope"))
+
+    def get_result(node, bits=False):
+        result = results[node]
+        return to_bits(result) if bits else to_bbox(result)
+
+    def execute_node(node, bits):
+        op = node.op
+        if op == "none":
+            return 0 if bits else []
+        elif op == "all":
+            if bits:
+                return query_all_bits(node.unit, node.proj_table)
+            return query_all_by_engine(node.unit, node.proj_table)
+        elif op == "scan":
+            if _geom_cache.max_entries:
+                cache_key = db_stamp, node.key
+                outbbox = _geom_cache.get(cache_key)
+                if outbbox is not None:
+                    return outbbox
+            set_coor_sys(node)
+            outbbox = query_geom_by_engine(node.geom, node.geom_type,
+                                           node.unit, node.proj_table)
+            if _geom_cache.max_entries:
+                _geom_cache.put(cache_key, outbbox)
+            return outbbox
+        elif op == "envelope":
+            if bbox_cols:
+                outbbox = execute_node(node.children[0], False)
+                for c in node.children[1:]:
+                    outbbox = filter_bbox(outbbox, c)
+                return outbbox
+            set_coor_sys(node)
+            return query_bboxes_by_envelope(node.bboxes, node.unit,
+                                            node.proj_table, projpicker_db)
+        elif op == "and":
+            outbbox = get_result(node.children[0])
+            for i in range(1, len(node.children)):
+                c = node.children[i]
+                if is_filter(node, i):
+                    start = time.perf_counter()
+                    outbbox = filter_bbox(outbbox, c)
+                    record(c, start, outbbox)
+                else:
+                    outbbox = to_bbox(to_bits(outbbox) & get_result(c, True))
+            return outbbox
+        elif op in ("or", "xor"):
+            outbits = 0
+            for c in node.children:
+                if op == "or":
+                    outbits |= get_result(c, True)
+                else:
+                    outbits ^= get_result(c, True)
+            return outbits
+        elif op == "not":
+            return (query_all_bits(node.unit, node.proj_table) &
+                    ~get_result(node.children[0], True))
+        node1, node2 = node.children
+        obbox = to_bbox(get_result(node1, True) & get_result(node2, True))
+        gbbox1 = GeomBBox(node1.is_latlon, node1.geom_type, node1.geom, obbox)
+        gbbox2 = GeomBBox(node2.is_latlon, node2.geom_type, node2.geom, obbox)
+        return match_geoms(gbbox1, gbbox2, node.match_max, node.match_tol)
+
+    engine = get_engine(engine)
+    if engine == "numpy":
+        bbox_cols = get_bbox_columns(projpicker_db)
+    else:
+        bbox_cols = None
+
+    bbox_universe = None
+    bits_all = {}
+    results = {}
+    db_stamp = get_file_stamp(get_projpicker_db(projpicker_db))
+
+    # nodes to execute by themselves and those whose results are needed as
+    # bitsets; children of envelope and filters of and are not executed
+    nodes = {plan}
+    bits_nodes = set()
+    for node in iter_plan_nodes(plan):
+        if node.op == "envelope":
+            continue
+        for i in range(len(node.children)):
+            c = node.children[i]
+            if not is_filter(node, i):
+                nodes.add(c)
+                if node.op != "and" or i > 0:
+                    bits_nodes.add(c)
+
+    was_latlon = is_latlon()
+    try:
+        for node in iter_plan_nodes(plan):
+            if node in nodes:
+                start = time.perf_counter()
+                results[node] = execute_node(node, node in bits_nodes)
+                record(node, start, results[node])
+        # bitsets are materialized in the sorted order of the universe
+        return list(get_result(plan))
+    finally:
+        if was_latlon and not is_latlon():
+            set_latlon()
+        elif not was_latlon and is_latlon():
+            set_xy()
+
+
+def explain_query_plan(plan, profile=None):
+    """
+    Return a str of a query plan in an indented tree form. If profile from
+    execute_query_plan() is given, the number of rows and wall time are added
+    to each executed node. Nodes referenced more than once are numbered and
+    printed in full only once.
+
+    Args:
+        plan (PlanNode): Root node of a query plan. See compile_mixed_geoms().
+        profile (dict): Dictionary for the number of rows and wall time by
+            PlanNode instance from execute_query_plan(). Defaults to None.
+
+    Returns:
+        str: Query plan.
+    """
+    refs = collections.Counter()
+    for node in iter_plan_nodes(plan):
+        for c in node.children:
+            refs[c] += 1
+
+    node_ids = {}
+    lines = []
+    stack = [(plan, 0)]
+    while stack:
+        node, depth = stack.pop()
+        indent = "  " * depth
+        if node in node_ids:
+            lines.append(f"{indent}#{node_ids[node]} (reused)")
+            continue
+        line = indent
+        if refs[node] > 1:
+            node_ids[node] = len(node_ids) + 1
+            line += f"#{node_ids[node]} "
+        line += node.describe()
+        if profile and node in profile:
+            nrows, secs = profile[node]
+            line += f" (rows={nrows} time={secs*1000:.3f}ms)"
+        lines.append(line)
+        for c in reversed(node.children):
+            stack.append((c, depth + 1))
+    return "\n".join(lines)
 
 
 ###############################################################################
@@ -2659,6 +4619,110 @@ def print_srids(bbox, outfile=sys.stdout, separator="\n"):
     print(file=outfile)
 
 
+def print_annotations(
+        annotations,
+        outfile=sys.stdout,
+        fmt="plain",
+        header=True,
+        separator="|"):
+    r"""
+    Print feature IDs and their lists of BBox instances from
+    annotate_mixed_geoms() as they are computed. The plain format prints
+    BBox instances with a leading feature column, the json format one JSON
+    object per feature per line (JSON Lines), and the srid format one line of
+    the feature ID and its SRIDs per feature.
+
+    Args:
+        annotations (iterable): Iterable of feature ID and BBox instance list
+            tuples.
+        outfile (str): Output file object. Defaults to sys.stdout.
+        fmt (str): Output format (plain, json, srid). Defaults to "plain".
+        header (bool): Whether or not to print header for plain. Defaults to
+            True.
+        separator (str): Column separator for plain and srid. It supports
+            special names including pipe (|), comma (,), space ( ), tab (\t),
+            and newline (\n). Defaults to "|".
+
+    Raises:
+        ValueError: If fmt is not one of "plain", "json", or "srid".
+    """
+    if fmt not in ("plain", "json", "srid"):
+        raise ValueError(f"{fmt}: Unsupported output format for annotation")
+
+    separator = get_separator(separator)
+
+    if fmt == "plain" and header:
+        print(separator.join(["feature"] + _bbox_columns), file=outfile)
+    for geom_id, bbox in annotations:
+        if fmt == "plain":
+            for row in bbox:
+                print(separator.join(map(str, (geom_id,) + row)),
+                      file=outfile)
+        elif fmt == "json":
+            print(json.dumps({"feature": geom_id,
+                              "bbox": dictify_bbox(bbox)}), file=outfile)
+        else:
+            print(separator.join([str(geom_id)] + extract_srids(bbox)),
+                  file=outfile)
+
+
+def print_batch_results(
+        results,
+        outfile=sys.stdout,
+        fmt="plain",
+        header=True,
+        separator=None):
+    r"""
+    Print the results of batch queries from query_batch() as they are
+    computed. The json format prints one JSON object per query per line (JSON
+    Lines) with an "error" key for failed queries. The plain, pretty, and srid
+    formats print a block per query that starts with a "---" line followed by
+    the query ID. Error messages are printed to stderr.
+
+    Args:
+        results (iterable): Iterable of query ID, BBox instance list, and
+            error message or None tuples.
+        outfile (str): Output file object. Defaults to sys.stdout.
+        fmt (str): Output format (plain, json, pretty, srid). Defaults to
+            "plain".
+        header (bool): Whether or not to print header for plain. Defaults to
+            True.
+        separator (str): Column separator for plain and srid output formats.
+            It supports special names including pipe (|), comma (,), space
+            ( ), tab (\t), and newline (\n). Defaults to None, meaning "|"
+            for plain and "\n" for srid.
+
+    Raises:
+        ValueError: If fmt is not one of "plain", "json", "pretty", or "srid".
+    """
+    if fmt not in ("plain", "json", "pretty", "srid"):
+        raise ValueError(f"{fmt}: Unsupported output format for batch mode")
+
+    if separator is None:
+        separator = "|" if fmt == "plain" else "\n"
+
+    for query_id, bbox, error in results:
+        if fmt == "json":
+            result = {"id": query_id, "bbox": dictify_bbox(bbox)}
+            if error:
+                result["error"] = error
+            print(json.dumps(result), file=outfile)
+            continue
+
+        if error:
+            message(f"{query_id}: {error}")
+        print(f"{_query_delimiter} {query_id}", file=outfile)
+        if fmt == "plain":
+            print_bbox(bbox, outfile, header, separator)
+        elif fmt == "pretty":
+            if sys.version_info.major == 3 and sys.version_info.minor >= 8:
+                pprint.pprint(dictify_bbox(bbox), outfile, sort_dicts=False)
+            else:
+                pprint.pprint(dictify_bbox(bbox), outfile)
+        elif bbox:
+            print_srids(bbox, outfile, separator)
+
+
 ###############################################################################
 # main
 
@@ -2677,7 +4741,13 @@ def start(
         single=False,
         projpicker_db=None,
         proj_db=None,
-        create=False):
+        create=False,
+        explain=False,
+        input_format="plain",
+        layer=None,
+        annotate=None,
+        processes=None,
+        batch=False):
     r"""
     Process options and perform requested tasks. This is the main API function.
     If geometries and an input file are specified at the same time, both
@@ -2701,7 +4771,14 @@ def start(
     options must be given. For selecting a subset of queried BBox instances, a
     GUI can be launched by setting gui to True. Results are sorted by area from
     the smallest to largest. The single argument is used to allow only one
-    selection in the GUI. If projpicker_db or proj_db is None (default),
+    selection in the GUI. If annotate is not None, every input geometry is
+    annotated with up to annotate smallest BBox instances instead and
+    annotations are written as they are computed in the plain, json (JSON
+    Lines), or srid format. See annotate_mixed_geoms(). If batch is True,
+    input lines are many independent queries separated by "---" lines and
+    their results are written as they are computed in the json format (JSON
+    Lines) or per-query blocks in the other formats except sqlite. See
+    query_batch(). If projpicker_db or proj_db is None (default),
     get_projpicker_db() or get_proj_db() is used, respectively.
 
     Args:
@@ -2734,14 +4811,32 @@ def start(
         proj_db (str): proj.db path. Defaults to None.
         create (bool): Whether or not to create a new projpicker.db. Defaults
             to False.
+        explain (bool): Whether or not to print the query plan with per-node
+            row counts and wall time instead of queried BBox instances.
+            Defaults to False.
+        input_format (str): Input file format (plain, geojson, csv, wkt,
+            gpkg). See read_geoms(). Defaults to "plain".
+        layer (str): Layer name of a GeoPackage input file. Defaults to None
+            for the first feature layer.
+        annotate (int): Maximum number of BBox instances per input geometry
+            for the annotate mode. Use 0 for all. Defaults to None for no
+            annotate mode.
+        processes (int): Number of processes for the annotate and batch
+            modes. Defaults to None for no process pool.
+        batch (bool): Whether or not to run independent queries in batch
+            mode. Defaults to False.
 
     Returns:
-        list: List of queried BBox instances sorted by area.
+        list: List of queried BBox instances sorted by area. In the annotate
+        and batch modes, a list of results from annotate_mixed_geoms() or
+        query_batch() if outfile is None or an empty list otherwise.
 
     Raises:
-        ValueError: If format is invalid, both overwrite and append are True,
-            output is None or "-" when append is True, or sqlite format is
-            written to stdout.
+        ValueError: If format or input_format is invalid, both overwrite and
+            append are True, output is None or "-" when append is True,
+            sqlite format is written to stdout, pretty or sqlite format is
+            requested in the annotate mode, sqlite format is requested in
+            batch mode, or input_format is not plain in batch mode.
         FileExistsError: If either projpicker_db or outfile already exists when
             overwrite is False.
         FileNotFoundError: If proj_db does not exist when create is True,
@@ -2759,6 +4854,19 @@ def start(
     if fmt not in ("plain", "json", "pretty", "sqlite", "srid"):
         raise ValueError(f"{fmt}: Unsupported output format")
 
+    if input_format not in _input_formats:
+        raise ValueError(f"{input_format}: Unsupported input format")
+
+    if annotate is not None and fmt not in ("plain", "json", "srid"):
+        raise ValueError(f"{fmt}: Unsupported output format for annotation")
+
+    if batch and fmt == "sqlite":
+        raise ValueError(f"{fmt}: Unsupported output format for batch mode")
+
+    if batch and input_format != "plain":
+        raise ValueError(f"{input_format}: Unsupported input format for batch "
+                         "mode")
+
     if overwrite and append:
         raise ValueError("Both overwrite and append requested")
 
@@ -2783,16 +4891,68 @@ def start(
         if ((create and (infile != "-" or not sys.stdin.isatty())) or
             (not create and (len(geoms) == 0 or infile != "-" or
                              not sys.stdin.isatty()))):
-            geoms.extend(read_file(infile))
+            if input_format == "plain":
+                geoms = itertools.chain(geoms, read_lines(infile))
+            else:
+                geoms = itertools.chain(tokenize_lines(geoms),
+                                        read_geoms(infile, input_format,
+                                                   layer))
+
+        if batch:
+            results = query_batch(geoms, projpicker_db, processes=processes)
+            if max_bbox > 0:
+                results = ((query_id, bbox[:max_bbox], error)
+                           for query_id, bbox, error in results)
+            if not outfile:
+                return list(results)
+
+            header = not no_header
+            if append and outfile != "-" and os.path.isfile(outfile):
+                mode = "a"
+            else:
+                mode = "w"
+            f = sys.stdout if outfile == "-" else open(outfile, mode)
+            print_batch_results(results, f, fmt, header, separator)
+            if outfile != "-":
+                f.close()
+            return []
 
-        tidy_lines(geoms)
+        # stream lines through the tokenizer to query them in constant memory
+        if input_format == "plain":
+            geoms = tokenize_lines(geoms)
 
         if print_geoms:
-            pprint.pprint(parse_mixed_geoms(geoms))
+            pprint.pprint(parse_mixed_geoms(list(geoms)))
+            return []
+
+        if explain:
+            plan = compile_mixed_geoms(list(geoms))
+            profile = {}
+            bbox = execute_query_plan(plan, projpicker_db, profile=profile)
+            print(explain_query_plan(plan, profile))
+            return bbox
+
+        if annotate is not None:
+            annotations = annotate_mixed_geoms(geoms, annotate, projpicker_db,
+                                               processes=processes)
+            if not outfile:
+                return list(annotations)
+
+            header = not no_header
+            if append and outfile != "-" and os.path.isfile(outfile):
+                mode = "a"
+                header = False
+            else:
+                mode = "w"
+            f = sys.stdout if outfile == "-" else open(outfile, mode)
+            print_annotations(annotations, f, fmt, header, separator or "|")
+            if outfile != "-":
+                f.close()
             return []
 
         if start_gui == "select":
-            bbox, *_ = gui.start(geoms, bbox_or_quit=True, single=single)
+            bbox, *_ = gui.start(list(geoms), bbox_or_quit=True,
+                                 single=single)
         else:
             bbox = query_mixed_geoms(geoms, projpicker_db)
 
@@ -2866,6 +5026,51 @@ def start(
     return bbox
 
 
+###############################################################################
+# query daemon
+
+def start_daemon(socket_path=None, projpicker_db=None, engine=None):
+    """
+    Start the query daemon that runs command-line requests from clients
+    connected with main() on a Unix socket. Before it starts listening,
+    projpicker.db is opened, the universe of all BBox instances and the
+    index of the engine are loaded, and the query and raw geometry result
+    caches are enabled if they are disabled, so requests share them. See
+    daemon.start() and init_batch_caches(). If projpicker_db is None
+    (default), get_projpicker_db() is used. If engine is None (default),
+    get_engine() is used.
+
+    Args:
+        socket_path (str): Unix socket path. Defaults to None. See
+            daemon.get_socket_path().
+        projpicker_db (str): projpicker.db path. Defaults to None.
+        engine (str): Query engine (sqlite, numpy, slab). Defaults to None.
+
+    Raises:
+        RuntimeError: If Unix domain sockets are not supported or the numpy
+            engine is requested without numpy.
+        FileExistsError: If another daemon is already running on socket_path.
+        FileNotFoundError: If projpicker_db does not exist.
+    """
+    if not daemon:
+        raise RuntimeError("Unix domain sockets are not supported")
+
+    projpicker_db = get_projpicker_db(projpicker_db)
+    if not os.path.isfile(projpicker_db):
+        raise FileNotFoundError(f"{projpicker_db}: No such file found")
+
+    engine = get_engine(engine)
+    get_connection(projpicker_db)
+    get_bbox_universe(projpicker_db)
+    if engine == "numpy":
+        get_bbox_columns(projpicker_db)
+    elif engine == "slab":
+        slab.get_slab_index(projpicker_db)
+    init_batch_caches()
+
+    daemon.start(main, socket_path)
+
+
 ###############################################################################
 # command-line interface
 
@@ -2919,6 +5124,11 @@ def parse():
             action="store_true",
             help="print parsed geometries in a list form for input validation "
                 "and exit")
+    parser.add_argument(
+            "-e", "--explain",
+            action="store_true",
+            help="print the query plan with per-node row counts and wall time "
+                "instead of queried CRSs")
     parser.add_argument(
             "-f", "--format",
             choices=("plain", "json", "pretty", "sqlite", "srid"),
@@ -2945,6 +5155,39 @@ def parse():
             help="input geometry file path (default: stdin); use - for stdin; "
                 "appended to geometries from arguments unless it is stdin "
                 "with no incoming data")
+    parser.add_argument(
+            "-I", "--input-format",
+            choices=_input_formats,
+            default="plain",
+            help="input file format (default: plain); geojson, csv, wkt, and "
+                "gpkg inputs are decoded incrementally into point, poly, and "
+                "bbox geometries")
+    parser.add_argument(
+            "-L", "--layer",
+            help="layer name of GeoPackage input file (default: first "
+                "feature layer)")
+    parser.add_argument(
+            "-a", "--annotate",
+            nargs="?",
+            type=int,
+            const=1,
+            metavar="K",
+            help="annotate each input geometry with up to K smallest CRSs "
+                "instead of querying CRSs for all geometries; use 0 for all "
+                "(default: 1); only for plain, json (JSON Lines), and srid "
+                "output formats")
+    parser.add_argument(
+            "-j", "--jobs",
+            type=int,
+            help="number of processes for annotation and batch mode (default: "
+                "no process pool); use 0 for as many processes as CPUs")
+    parser.add_argument(
+            "-b", "--batch",
+            action="store_true",
+            help="read many independent queries separated by --- lines "
+                "optionally followed by query IDs and print one JSON object "
+                "per query for json or one block per query for the other "
+                "output formats")
     parser.add_argument(
             "-o", "--output",
             default="-",
@@ -2987,15 +5230,44 @@ def parse():
                 action="store_true",
                 help="start a new client in the user's default browser; only "
                     "used with the web server")
+    if daemon:
+        socket_path = daemon.get_socket_path()
+        daemon_exclusive = parser.add_mutually_exclusive_group()
+        daemon_exclusive.add_argument(
+                "-d", "--daemon",
+                action="store_true",
+                help="start the query daemon that keeps projpicker.db open "
+                    "and its caches warm, and runs requests from --connect "
+                    "clients; other options except --projpicker-db and "
+                    "--socket are ignored")
+        daemon_exclusive.add_argument(
+                "-k", "--connect",
+                action="store_true",
+                help="run this command in the query daemon if it is running "
+                    "or in process otherwise; GUI and --create are always "
+                    "run in process")
+        parser.add_argument(
+                "-U", "--socket",
+                default=socket_path,
+                help=f"Unix socket path of the query daemon (default: "
+                    f"{socket_path}); use PROJPICKER_SOCKET environment "
+                    "variable to skip this option")
     return parser
 
 
-def main():
+def main(argv=None):
     """
-    Implement the command-line interface to start() and the standalone web
-    server.
+    Implement the command-line interface to start(), the standalone web
+    server, and the query daemon.
+
+    Args:
+        argv (list): List of command-line arguments. Defaults to None for
+            sys.argv[1:].
+
+    Returns:
+        int or None: Exit status from the query daemon or None.
     """
-    args = parse().parse_args()
+    args = parse().parse_args(argv)
 
     version = args.version
     create = args.create
@@ -3004,11 +5276,17 @@ def main():
     projpicker_db = args.projpicker_db
     proj_db = args.proj_db
     print_geoms = args.print_geometries
+    explain = args.explain
     fmt = args.format
     no_header = args.no_header
     separator = args.separator
     max_bbox = args.max
     infile = args.input
+    input_format = args.input_format
+    layer = args.layer
+    annotate = args.annotate
+    processes = args.jobs
+    batch = args.batch
     outfile = args.output
     if gui:
         if args.select_gui:
@@ -3029,6 +5307,14 @@ def main():
     else:
         server = client = None
 
+    if daemon:
+        run_daemon = args.daemon
+        connect = args.connect
+        socket_path = args.socket
+    else:
+        run_daemon = connect = False
+        socket_path = None
+
     if version:
         print(
 f"""ProjPicker {get_version()} <https://github.com/HuidaeCho/projpicker>
@@ -3037,7 +5323,15 @@ Copyright (C) 2021 Huidae Cho and Owen Smith, IESA, UNG
 License GPLv3+: GNU GPL version 3 or later <https://gnu.org/licenses/gpl.html>.
 This is free software: you are free to change and redistribute it.
 There is NO WARRANTY, to the extent permitted by law.""")
+    elif run_daemon:
+        start_daemon(socket_path, projpicker_db)
     elif server is None:
+        # the daemon cannot start the GUI or create projpicker.db for clients
+        if connect and start_gui is None and not create:
+            status = daemon.connect(sys.argv[1:] if argv is None else argv,
+                                    socket_path)
+            if status is not None:
+                return status
         start(
             geoms,
             infile,
@@ -3053,7 +5347,13 @@ There is NO WARRANTY, to the extent permitted by law.""")
             single,
             projpicker_db,
             proj_db,
-            create)
+            create,
+            explain,
+            input_format,
+            layer,
+            annotate,
+            processes,
+            batch)
     else:
         web.start(server, client)
 
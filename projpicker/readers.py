@@ -0,0 +1,723 @@
+"""
+This module implements readers of GeoJSON, CSV, WKT, and GeoPackage geometries
+for the ProjPicker API. Readers decode their input incrementally and yield
+pairs of a geometry type (point, poly, bbox) and a parsed geometry, so large
+inputs are never held in memory as a whole. Polygons are read as the polys of
+their exterior rings because holes do not change their bounding boxes.
+"""
+
+import sys
+import re
+import csv
+import json
+import struct
+import array
+import itertools
+
+if __package__:
+    from .common import get_float, get_connection
+    from . import coor_latlon
+else:
+    from common import get_float, get_connection
+    import coor_latlon
+
+# whitespaces and record separators of GeoJSON text sequences
+_json_ws_re = re.compile(r"[ \t\r\n\x1e]*")
+
+_wkt_token_re = re.compile(r"""
+    [A-Za-z]+|
+    [+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?|
+    \S""", re.VERBOSE)
+
+# CSV column names in lowercase
+_csv_lat_names = ("lat", "latitude", "y", "northing")
+_csv_lon_names = ("lon", "long", "lng", "longitude", "x", "easting")
+_csv_wkt_names = ("wkt", "geom", "geometry", "the_geom")
+
+# WKB geometry types by ISO code without Z and M
+_wkb_types = {1: "POINT", 2: "LINESTRING", 3: "POLYGON", 4: "MULTIPOINT",
+              5: "MULTILINESTRING", 6: "MULTIPOLYGON",
+              7: "GEOMETRYCOLLECTION"}
+
+# number of envelope doubles by the envelope indicator of GeoPackage headers
+_gpkg_envelope_sizes = (0, 4, 6, 6, 8)
+
+# supported input formats; plain is read by projpicker.tokenize_lines()
+_input_formats = ("plain", "geojson", "csv", "wkt", "gpkg")
+
+
+def iter_geom_tokens(geoms, coor_sys="latlon"):
+    """
+    Iterate over the input geometries of parse_mixed_geoms() for pairs of a
+    geometry type and a parsed geometry. A coordinate system word comes first,
+    and a geometry type word is yielded only when it changes.
+
+    Args:
+        geoms (iterable): Iterable of (geom_type, geom) pairs.
+        coor_sys (str): Coordinate system of geometries (latlon, xy). Defaults
+            to "latlon".
+
+    Yields:
+        str or list: Coordinate system word, geometry type word, or parsed
+        geometry.
+    """
+    yield coor_sys
+    geom_type = None
+    for typ, geom in geoms:
+        if typ != geom_type:
+            geom_type = typ
+            yield typ
+        yield geom
+
+
+def iter_geojson_geoms(obj):
+    """
+    Iterate over the geometries of a decoded GeoJSON object, which can be a
+    FeatureCollection, Feature, geometry object, or list of them. GeoJSON
+    coordinates are in longitude and latitude, and they are swapped for the
+    latitude-longitude coordinate system. Features without a geometry are
+    ignored.
+
+    Args:
+        obj (dict or list): Decoded GeoJSON object.
+
+    Yields:
+        str, list: Geometry type (point, poly) and parsed geometry.
+
+    Raises:
+        ValueError: If obj is not a valid GeoJSON object.
+    """
+    def to_point(coors):
+        if len(coors) < 2:
+            raise ValueError(f"{coors}: Invalid GeoJSON position")
+        return [float(coors[1]), float(coors[0])]
+
+    def to_poly(coors):
+        return [to_point(point) for point in coors]
+
+    if type(obj) == list:
+        for o in obj:
+            yield from iter_geojson_geoms(o)
+        return
+
+    if type(obj) != dict:
+        raise ValueError("Invalid GeoJSON object")
+
+    typ = obj.get("type")
+    coors = obj.get("coordinates")
+    if typ == "FeatureCollection":
+        for feature in obj.get("features") or []:
+            yield from iter_geojson_geoms(feature)
+    elif typ == "Feature":
+        if obj.get("geometry"):
+            yield from iter_geojson_geoms(obj["geometry"])
+    elif typ == "GeometryCollection":
+        for geom in obj.get("geometries") or []:
+            yield from iter_geojson_geoms(geom)
+    elif typ == "Point":
+        if coors:
+            yield "point", to_point(coors)
+    elif typ == "MultiPoint":
+        for point in coors or []:
+            yield "point", to_point(point)
+    elif typ == "LineString":
+        if coors:
+            yield "poly", to_poly(coors)
+    elif typ == "MultiLineString":
+        for line in coors or []:
+            if line:
+                yield "poly", to_poly(line)
+    elif typ == "Polygon":
+        if coors and coors[0]:
+            yield "poly", to_poly(coors[0])
+    elif typ == "MultiPolygon":
+        for polygon in coors or []:
+            if polygon and polygon[0]:
+                yield "poly", to_poly(polygon[0])
+    else:
+        raise ValueError(f"{typ}: Unsupported GeoJSON type")
+
+
+def read_geojson(f, chunk_size=65536):
+    """
+    Read GeoJSON text from a file object and yield its geometries. The members
+    of the top-level object are decoded one by one, and so are the features
+    in its "features" array, so only one feature is held in memory at a time.
+    A FeatureCollection, Feature, geometry object, or a sequence of them
+    separated by whitespaces or record separators (e.g., newline-delimited
+    GeoJSON) is supported. See iter_geojson_geoms().
+
+    Args:
+        f (file object): File object of GeoJSON text.
+        chunk_size (int): Number of characters to read at once. Defaults to
+            65536.
+
+    Yields:
+        str, list: Geometry type (point, poly) and parsed geometry.
+
+    Raises:
+        ValueError: If the input is not valid GeoJSON.
+    """
+    def fill(size):
+        nonlocal buf, pos, eof
+        # discard decoded text
+        if pos > chunk_size:
+            buf = buf[pos:]
+            pos = 0
+        while not eof and len(buf) - pos < size:
+            chunk = f.read(max(chunk_size, size - len(buf) + pos))
+            if chunk:
+                buf += chunk
+            else:
+                eof = True
+
+    def peek():
+        nonlocal pos
+        while True:
+            pos = _json_ws_re.match(buf, pos).end()
+            if pos < len(buf) or eof:
+                return buf[pos:pos+1]
+            fill(1)
+
+    def expect(chars):
+        nonlocal pos
+        c = peek()
+        if not c or c not in chars:
+            raise ValueError(f"{c or 'EOF'}: Invalid GeoJSON; expected "
+                             f"{' or '.join(chars)}")
+        pos += 1
+        return c
+
+    def decode():
+        nonlocal pos
+        peek()
+        size = chunk_size
+        while True:
+            fill(size)
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError as e:
+                if eof:
+                    raise ValueError(f"Invalid GeoJSON: {e}")
+                # read twice as much text for a partially read value
+                size = 2 * (len(buf) - pos)
+                continue
+            # a number at the end may continue in the next chunk
+            if end == len(buf) and not eof:
+                size = 2 * (len(buf) - pos)
+                continue
+            pos = end
+            return obj
+
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+
+    while peek():
+        if peek() != "{":
+            yield from iter_geojson_geoms(decode())
+            continue
+
+        # decode the members of the top-level object one by one
+        pos += 1
+        members = {}
+        has_features = False
+        if peek() == "}":
+            pos += 1
+            continue
+        while True:
+            key = decode()
+            expect(":")
+            if key == "features" and peek() == "[":
+                has_features = True
+                pos += 1
+                if peek() == "]":
+                    pos += 1
+                else:
+                    while True:
+                        yield from iter_geojson_geoms(decode())
+                        if expect(",]") == "]":
+                            break
+            else:
+                members[key] = decode()
+            if expect(",}") == "}":
+                break
+        if not has_features:
+            yield from iter_geojson_geoms(members)
+
+
+def parse_wkt(wkt):
+    """
+    Parse WKT text of one or more geometries and return a list of their
+    geometries. Z and M coordinates are ignored, EMPTY geometries are skipped,
+    and an EWKT SRID prefix is allowed. WKT coordinates are in x and y, which
+    are longitude and latitude for geographic coordinates, and they are swapped
+    for the latitude-longitude coordinate system.
+
+    For example, "POINT (-84 34) LINESTRING (-84 33, -83 34)" returns
+    [("point", [34.0, -84.0]), ("poly", [[33.0, -84.0], [34.0, -83.0]])].
+
+    Args:
+        wkt (str): WKT text.
+
+    Returns:
+        list: List of geometry types (point, poly) and parsed geometries.
+
+    Raises:
+        ValueError: If the input is not valid WKT or has unsupported geometry
+            types.
+    """
+    def peek():
+        return tokens[i].upper() if i < ntokens else ""
+
+    def take(expected=None):
+        nonlocal i
+        token = peek()
+        if not token or (expected and token != expected):
+            raise ValueError(f"{token or 'EOF'}: Invalid WKT; expected "
+                             f"{expected or 'more'}")
+        i += 1
+        return token
+
+    def is_empty():
+        if peek() == "EMPTY":
+            take()
+            return True
+        return False
+
+    def parse_point():
+        nonlocal i
+        coors = []
+        while i < ntokens and tokens[i] not in ("(", ")", ","):
+            x = get_float(tokens[i])
+            if x is None:
+                raise ValueError(f"{tokens[i]}: Invalid WKT coordinate")
+            coors.append(x)
+            i += 1
+        if len(coors) < 2:
+            raise ValueError("Invalid WKT point")
+        return [coors[1], coors[0]]
+
+    def parse_points():
+        points = []
+        if not is_empty():
+            take("(")
+            points.append(parse_point())
+            while take() == ",":
+                points.append(parse_point())
+        return points
+
+    def parse_rings():
+        rings = []
+        if not is_empty():
+            take("(")
+            rings.append(parse_points())
+            while take() == ",":
+                rings.append(parse_points())
+        return [ring for ring in rings if ring]
+
+    def parse_geom():
+        typ = take()
+        if typ == "SRID":
+            take("=")
+            take()
+            take(";")
+            typ = take()
+        if peek() in ("Z", "M", "ZM"):
+            take()
+        if typ == "POINT":
+            if not is_empty():
+                take("(")
+                geoms.append(("point", parse_point()))
+                take(")")
+        elif typ == "MULTIPOINT":
+            if not is_empty():
+                take("(")
+                while True:
+                    if peek() == "(":
+                        take()
+                        geoms.append(("point", parse_point()))
+                        take(")")
+                    elif not is_empty():
+                        geoms.append(("point", parse_point()))
+                    if take() != ",":
+                        break
+        elif typ == "LINESTRING":
+            points = parse_points()
+            if points:
+                geoms.append(("poly", points))
+        elif typ == "POLYGON":
+            rings = parse_rings()
+            if rings:
+                geoms.append(("poly", rings[0]))
+        elif typ == "MULTILINESTRING":
+            for points in parse_rings():
+                geoms.append(("poly", points))
+        elif typ == "MULTIPOLYGON":
+            if not is_empty():
+                take("(")
+                while True:
+                    rings = parse_rings()
+                    if rings:
+                        geoms.append(("poly", rings[0]))
+                    if take() != ",":
+                        break
+        elif typ == "GEOMETRYCOLLECTION":
+            if not is_empty():
+                take("(")
+                parse_geom()
+                while take() == ",":
+                    parse_geom()
+        else:
+            raise ValueError(f"{typ}: Unsupported WKT geometry type")
+
+    tokens = _wkt_token_re.findall(wkt)
+    ntokens = len(tokens)
+    i = 0
+    geoms = []
+    while i < ntokens:
+        parse_geom()
+    return geoms
+
+
+def read_wkt(f):
+    """
+    Read WKT geometries from a file object and yield them. Lines are collected
+    only until all parentheses are closed, so one geometry is held in memory
+    at a time. Geometries can span multiple lines, and one line can have
+    multiple geometries. See parse_wkt().
+
+    Args:
+        f (file object): File object of WKT text.
+
+    Yields:
+        str, list: Geometry type (point, poly) and parsed geometry.
+
+    Raises:
+        ValueError: If the input is not valid WKT or has unsupported geometry
+            types.
+    """
+    lines = []
+    depth = 0
+    for line in f:
+        lines.append(line)
+        depth += line.count("(") - line.count(")")
+        if depth <= 0:
+            yield from parse_wkt("".join(lines))
+            lines.clear()
+            depth = 0
+    if lines:
+        yield from parse_wkt("".join(lines))
+
+
+def read_csv(f):
+    """
+    Read a CSV table of points from a file object and yield its geometries.
+    Rows are read one by one. The delimiter is detected from the first line
+    among comma, semicolon, tab, and pipe. If the first row is a header,
+    latitude and longitude columns are found by their names (lat, latitude,
+    lon, long, lng, longitude), and so are x and y columns (x, y, easting,
+    northing), which are read in the x-y coordinate system. A WKT column
+    (wkt, geom, geometry, the_geom) is read by parse_wkt() if no coordinate
+    columns are found. Without a header, the first two columns are latitude
+    and longitude. Rows with unparsable coordinates are ignored.
+
+    Args:
+        f (file object): File object of CSV text.
+
+    Yields:
+        str or list: Coordinate system word, geometry type word, or parsed
+        geometry. See iter_geom_tokens().
+
+    Raises:
+        ValueError: If no coordinate columns are found in the header.
+    """
+    first_line = f.readline()
+    if not first_line:
+        return
+
+    try:
+        dialect = csv.Sniffer().sniff(first_line, delimiters=",;\t|")
+    except csv.Error:
+        dialect = csv.excel
+    rows = csv.reader(itertools.chain((first_line,), f), dialect)
+
+    header = next(rows)
+    names = [name.strip().lower() for name in header]
+
+    def find_column(candidates):
+        for name in candidates:
+            if name in names:
+                return names.index(name)
+        return None
+
+    coor_sys = "latlon"
+    wkt_col = None
+    lat_col = find_column(_csv_lat_names)
+    lon_col = find_column(_csv_lon_names)
+    if lat_col is not None and lon_col is not None:
+        if names[lat_col] in ("y", "northing"):
+            coor_sys = "xy"
+    else:
+        wkt_col = find_column(_csv_wkt_names)
+        if wkt_col is None:
+            if None in coor_latlon.parse_point(",".join(header[:2])):
+                raise ValueError(f"{','.join(header)}: No coordinate "
+                                 "columns found")
+            # no header
+            lat_col, lon_col = 0, 1
+            rows = itertools.chain((header,), rows)
+
+    def iter_geoms():
+        ncols = max(lat_col, lon_col) + 1 if wkt_col is None else wkt_col + 1
+        for row in rows:
+            if len(row) < ncols:
+                continue
+            if wkt_col is not None:
+                yield from parse_wkt(row[wkt_col])
+            elif coor_sys == "xy":
+                x = get_float(row[lon_col])
+                y = get_float(row[lat_col])
+                if x is not None and y is not None:
+                    yield "point", [x, y]
+            else:
+                point = coor_latlon.parse_point(
+                        f"{row[lat_col].strip()},{row[lon_col].strip()}")
+                if None not in point:
+                    yield "point", point
+
+    yield from iter_geom_tokens(iter_geoms(), coor_sys)
+
+
+def parse_wkb(wkb, is_latlon=True, offset=0):
+    """
+    Parse a WKB geometry from offset in bytes and return a list of its
+    geometries and the offset after the geometry. ISO and extended WKB with Z
+    and M coordinates are supported, which are ignored. Empty points are
+    skipped. See parse_wkt() for how geometries are read. In the
+    latitude-longitude coordinate system, x and y are swapped.
+
+    Args:
+        wkb (bytes): WKB geometry.
+        is_latlon (bool): Whether or not x and y are longitude and latitude.
+            Defaults to True.
+        offset (int): Offset of the WKB geometry in wkb. Defaults to 0.
+
+    Returns:
+        list, int: List of geometry types (point, poly) and parsed geometries,
+        and offset after the WKB geometry.
+
+    Raises:
+        ValueError: If wkb is not a valid WKB geometry or has unsupported
+            geometry types.
+    """
+    def parse_points(npoints):
+        nonlocal offset
+        end = offset + npoints * ndims * 8
+        if end > len(wkb):
+            raise ValueError("Truncated WKB geometry")
+        coors = array.array("d", wkb[offset:end])
+        if swap:
+            coors.byteswap()
+        offset = end
+        xs = coors[0::ndims]
+        ys = coors[1::ndims]
+        if is_latlon:
+            return [[y, x] for x, y in zip(xs, ys)]
+        return [[x, y] for x, y in zip(xs, ys)]
+
+    def parse_count():
+        nonlocal offset
+        count, = struct.unpack_from(order + "I", wkb, offset)
+        offset += 4
+        return count
+
+    try:
+        order = "<" if wkb[offset] == 1 else ">"
+        typ, = struct.unpack_from(order + "I", wkb, offset + 1)
+    except (IndexError, struct.error):
+        raise ValueError("Truncated WKB geometry")
+    offset += 5
+    swap = (order == "<") != (sys.byteorder == "little")
+
+    # extended WKB flags
+    ndims = 2 + bool(typ & 0x80000000) + bool(typ & 0x40000000)
+    if typ & 0x20000000:
+        offset += 4
+    typ &= 0x0fffffff
+    # ISO WKB codes
+    ndims += (0, 1, 1, 2)[typ // 1000 % 4]
+    typ = _wkb_types.get(typ % 1000)
+    if typ is None:
+        raise ValueError("Unsupported WKB geometry type")
+
+    geoms = []
+    try:
+        if typ == "POINT":
+            point = parse_points(1)[0]
+            # empty points are stored as NaN
+            if point[0] == point[0] and point[1] == point[1]:
+                geoms.append(("point", point))
+        elif typ == "LINESTRING":
+            points = parse_points(parse_count())
+            if points:
+                geoms.append(("poly", points))
+        elif typ == "POLYGON":
+            for i in range(parse_count()):
+                points = parse_points(parse_count())
+                # holes do not change the extent
+                if i == 0 and points:
+                    geoms.append(("poly", points))
+        else:
+            for i in range(parse_count()):
+                ogeoms, offset = parse_wkb(wkb, is_latlon, offset)
+                geoms.extend(ogeoms)
+    except struct.error:
+        raise ValueError("Truncated WKB geometry")
+    return geoms, offset
+
+
+def parse_gpkg_geom(blob, is_latlon=True):
+    """
+    Parse a GeoPackage geometry blob, which is a GeoPackage header followed by
+    a WKB geometry, and return a list of its geometries. If the header has an
+    envelope and the geometry is a single linestring or polygon, the envelope
+    is returned as a bbox geometry without decoding vertices. Its longitudes
+    are wrapped past the antimeridian in the same way as its poly, so both
+    are queried the same. Points and multi-part geometries are decoded by
+    parse_wkb() because their parts are separate geometries.
+
+    Args:
+        blob (bytes): GeoPackage geometry blob.
+        is_latlon (bool): Whether or not x and y are longitude and latitude.
+            Defaults to True.
+
+    Returns:
+        list: List of geometry types (point, poly, bbox) and parsed
+        geometries.
+
+    Raises:
+        ValueError: If blob is not a valid GeoPackage geometry.
+    """
+    if len(blob) < 8 or blob[:2] != b"GP":
+        raise ValueError("Invalid GeoPackage geometry header")
+
+    flags = blob[3]
+    # empty geometry
+    if flags & 0x10:
+        return []
+
+    envelope = (flags >> 1) & 0x07
+    if envelope >= len(_gpkg_envelope_sizes):
+        raise ValueError("Invalid GeoPackage envelope indicator")
+    offset = 8 + _gpkg_envelope_sizes[envelope] * 8
+
+    if envelope and offset + 5 <= len(blob):
+        order = "<" if blob[offset] == 1 else ">"
+        typ, = struct.unpack_from(order + "I", blob, offset + 1)
+        if _wkb_types.get((typ & 0x0fffffff) % 1000) in ("LINESTRING",
+                                                          "POLYGON"):
+            order = "<" if flags & 0x01 else ">"
+            minx, maxx, miny, maxy = struct.unpack_from(order + "4d", blob, 8)
+            if is_latlon:
+                # wrap longitudes past the antimeridian as the poly would be
+                return [("bbox", list(coor_latlon.calc_poly_bbox(
+                                            [[miny, minx], [maxy, maxx]])))]
+            # bottom, top, left, and right
+            return [("bbox", [miny, maxy, minx, maxx])]
+
+    return parse_wkb(blob, is_latlon, offset)[0]
+
+
+def read_gpkg(gpkg, layer=None, batch_size=1024):
+    """
+    Read the features of a layer in a GeoPackage file and yield their
+    geometries. Features are fetched through a cursor batch_size rows at a
+    time, so large layers are never held in memory as a whole. Layers in a
+    geographic spatial reference system are read in the latitude-longitude
+    coordinate system and the others in the x-y coordinate system. See
+    parse_gpkg_geom().
+
+    Args:
+        gpkg (str): GeoPackage file path.
+        layer (str): Layer name. Defaults to None for the first feature layer.
+        batch_size (int): Number of features fetched at once. Defaults to
+            1024.
+
+    Yields:
+        str or list: Coordinate system word, geometry type word, or parsed
+        geometry. See iter_geom_tokens().
+
+    Raises:
+        ValueError: If layer is not found.
+        sqlite3.Error: If gpkg is not a valid GeoPackage file.
+    """
+    def iter_geoms():
+        cur = con.cursor()
+        try:
+            quoted_column = column.replace('"', '""')
+            quoted_table = table.replace('"', '""')
+            cur.execute(f'SELECT "{quoted_column}" FROM "{quoted_table}"')
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    if row[0]:
+                        yield from parse_gpkg_geom(row[0], is_latlon)
+        finally:
+            cur.close()
+
+    con = get_connection(gpkg)
+    sql = """SELECT g.table_name, g.column_name, g.srs_id, s.organization,
+                    s.organization_coordsys_id, s.definition
+             FROM gpkg_geometry_columns g
+             JOIN gpkg_contents c ON lower(c.table_name) = lower(g.table_name)
+             LEFT JOIN gpkg_spatial_ref_sys s ON s.srs_id = g.srs_id
+             WHERE c.data_type = 'features'"""
+    params = ()
+    if layer is not None:
+        sql += " AND lower(g.table_name) = lower(?)"
+        params = (layer,)
+    row = con.execute(sql + " ORDER BY g.table_name", params).fetchone()
+    if row is None:
+        raise ValueError(f"{layer or 'Feature layer'}: No such layer found")
+
+    table, column, srs_id, org, code, definition = row
+    definition = (definition or "").lstrip().upper()
+    # srs_id 0 is undefined geographic
+    is_latlon = (srs_id == 0 or
+                 ((org or "").upper() == "EPSG" and code == 4326) or
+                 definition.startswith(("GEOGCS", "GEOGCRS",
+                                        "GEOGRAPHICCRS")))
+
+    coor_sys = "latlon" if is_latlon else "xy"
+    yield from iter_geom_tokens(iter_geoms(), coor_sys)
+
+
+def read_input(f, input_format):
+    """
+    Read geometries in an input format other than plain from a file object
+    and yield them as input geometries of parse_mixed_geoms().
+
+    Args:
+        f (file object): Input file object.
+        input_format (str): Input format (geojson, csv, wkt).
+
+    Yields:
+        str or list: Coordinate system word, geometry type word, or parsed
+        geometry. See iter_geom_tokens().
+
+    Raises:
+        ValueError: If input_format is not one of "geojson", "csv", or "wkt",
+            or the input is invalid.
+    """
+    if input_format == "geojson":
+        yield from iter_geom_tokens(read_geojson(f))
+    elif input_format == "wkt":
+        yield from iter_geom_tokens(read_wkt(f))
+    elif input_format == "csv":
+        yield from read_csv(f)
+    else:
+        raise ValueError(f"{input_format}: Unsupported input format")
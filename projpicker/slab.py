@@ -0,0 +1,199 @@
+"""
+This module implements an exact slab-decomposition point index for the
+ProjPicker API. The set of bbox rows that contain a point only changes when the
+point crosses a south or north latitude or a west or east longitude edge of
+some row. The sorted distinct edges split latitudes and longitudes into slabs,
+and each slab stores its candidate rows as a bitset over bbox rows sorted by
+area. A point query takes two binary searches, one bitwise AND, and an exact
+filter on the candidates.
+"""
+
+import bisect
+
+if __package__:
+    from .common import BBox, get_file_stamp, iter_bits, get_connection
+    from . import coor_latlon
+else:
+    from common import BBox, get_file_stamp, iter_bits, get_connection
+    import coor_latlon
+
+# file stamps and loaded SlabIndex instances by projpicker.db path
+_slab_index_cache = {}
+
+
+def build_slabs(edges, intervals):
+    """
+    Build candidate row bitsets for slabs between sorted distinct edges. Slab i
+    covers the closed interval between edges i and i+1, and the last slab
+    covers the last edge only. Each bitset contains all rows whose closed
+    interval touches the slab.
+
+    Args:
+        edges (list): Sorted list of distinct edges.
+        intervals (list): List of (lower, upper, row) tuples.
+
+    Returns:
+        list: List of row bitsets in int, one per slab.
+    """
+    nedges = len(edges)
+
+    # rows whose lower bound does not exceed the upper edge of each slab
+    lower_bits = []
+    bits = 0
+    j = 0
+    intervals = sorted(intervals, key=lambda x: x[0])
+    for i in range(nedges):
+        upper = edges[min(i + 1, nedges - 1)]
+        while j < len(intervals) and intervals[j][0] <= upper:
+            bits |= 1 << intervals[j][2]
+            j += 1
+        lower_bits.append(bits)
+
+    # rows whose upper bound is not below the lower edge of each slab
+    upper_bits = [0] * nedges
+    bits = 0
+    j = 0
+    intervals.sort(key=lambda x: -x[1])
+    for i in reversed(range(nedges)):
+        while j < len(intervals) and intervals[j][1] >= edges[i]:
+            bits |= 1 << intervals[j][2]
+            j += 1
+        upper_bits[i] = bits
+
+    return [l & u for l, u in zip(lower_bits, upper_bits)]
+
+
+def find_slab(edges, x):
+    """
+    Return the index of the slab that contains x or None if x is outside all
+    slabs.
+
+    Args:
+        edges (list): Sorted list of distinct edges.
+        x (float): Coordinate.
+
+    Returns:
+        int or None: Slab index or None.
+    """
+    i = bisect.bisect_right(edges, x) - 1
+    if i < 0 or x > edges[-1]:
+        return None
+    return i
+
+
+class SlabIndex:
+    """
+    Provide an exact slab-decomposition point index for latitude-longitude
+    extents in the bbox table of projpicker.db.
+    """
+
+    def __init__(self, projpicker_db):
+        """
+        Load the bbox table from projpicker.db and build latitude and
+        longitude slabs.
+
+        Args:
+            projpicker_db (str): projpicker.db path.
+        """
+        projpicker_cur = get_connection(projpicker_db).cursor()
+        sql = """SELECT *
+                 FROM bbox
+                 ORDER BY area_sqkm,
+                          proj_table,
+                          crs_auth_name, crs_code,
+                          usage_auth_name, usage_code,
+                          extent_auth_name, extent_code"""
+        projpicker_cur.execute(sql)
+        self.bbox = list(map(BBox._make, projpicker_cur.fetchall()))
+
+        lat_intervals = []
+        lon_intervals = []
+        # rows that span all longitudes contain any longitude
+        self.all_lon_bits = 0
+        self.unit_bits = {}
+        self.proj_table_bits = {}
+        for i, b in enumerate(self.bbox):
+            lat_intervals.append((b.south_lat, b.north_lat, i))
+            w = b.west_lon
+            e = b.east_lon
+            if w == e or (w == -180 and e == 180):
+                self.all_lon_bits |= 1 << i
+            elif w < e:
+                lon_intervals.append((w, e, i))
+            else:
+                # if west_lon > east_lon, bbox crosses the antimeridian
+                lon_intervals.append((w, 180, i))
+                lon_intervals.append((-180, e, i))
+            self.unit_bits[b.unit] = self.unit_bits.get(b.unit, 0) | 1 << i
+            self.proj_table_bits[b.proj_table] = (
+                    self.proj_table_bits.get(b.proj_table, 0) | 1 << i)
+
+        self.lat_edges = sorted({x[0] for x in lat_intervals} |
+                                {x[1] for x in lat_intervals})
+        self.lon_edges = sorted({x[0] for x in lon_intervals} |
+                                {x[1] for x in lon_intervals} | {-180, 180})
+        self.lat_slabs = build_slabs(self.lat_edges, lat_intervals)
+        self.lon_slabs = build_slabs(self.lon_edges, lon_intervals)
+
+    def query_point(self, point, unit="any", proj_table="any"):
+        """
+        Return a list of BBox instances in unit in proj_table that completely
+        contain an input point geometry defined by latitude and longitude in
+        decimal degrees. Results are sorted by area from the smallest to
+        largest.
+
+        Args:
+            point (list or str): List of latitude and longitude floats in
+                decimal degrees or parsable str of latitude and longitude. See
+                coor_latlon.parse_point().
+            unit (str): Unit values from projpicker.db. Defaults to "any".
+            proj_table (str): Proj table values from projpicker.db. Defaults
+                to "any".
+
+        Returns:
+            list: List of queried BBox instances sorted by area.
+        """
+        point = coor_latlon.parse_point(point)
+        lat, lon = point
+        if lat is None or lon is None or not self.bbox:
+            return []
+
+        i = find_slab(self.lat_edges, lat)
+        if i is None:
+            return []
+        bits = self.lat_slabs[i]
+
+        j = find_slab(self.lon_edges, lon)
+        if j is None:
+            bits &= self.all_lon_bits
+        else:
+            bits &= self.lon_slabs[j] | self.all_lon_bits
+
+        if unit != "any":
+            bits &= self.unit_bits.get(unit, 0)
+        if proj_table != "any":
+            bits &= self.proj_table_bits.get(proj_table, 0)
+
+        # candidates touching slab edges may not contain the point
+        return [self.bbox[k] for k in iter_bits(bits)
+                if coor_latlon.is_point_within_bbox(point, self.bbox[k])]
+
+
+def get_slab_index(projpicker_db):
+    """
+    Return a SlabIndex instance for projpicker.db. The index is built only once
+    per projpicker.db path and rebuilt when projpicker.db is replaced or
+    modified. See common.get_file_stamp().
+
+    Args:
+        projpicker_db (str): projpicker.db path.
+
+    Returns:
+        SlabIndex: SlabIndex instance.
+    """
+    db_path, db_stamp = get_file_stamp(projpicker_db)
+    cached = _slab_index_cache.get(db_path)
+    if cached is None or cached[0] != db_stamp:
+        cached = db_stamp, SlabIndex(db_path)
+        _slab_index_cache[db_path] = cached
+    return cached[1]
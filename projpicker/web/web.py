@@ -20,6 +20,18 @@ default_address = "localhost"
 default_port = 8000
 default_server = f"{default_address}:{default_port}"
 
+# maximum number of entries and bytes of cached query results; see
+# projpicker.set_query_cache_size()
+query_cache_size = 256
+query_cache_bytes = 64 * 1024 * 1024
+
+# whether or not the query cache has been enabled; see init_query_cache()
+query_cache_enabled = False
+
+# requests larger than this number of bytes are streamed line by line in
+# constant memory without caching; see projpicker.query_mixed_geoms_by_batch()
+stream_query_bytes = 1024 * 1024
+
 
 # https://gist.github.com/dideler/3814182
 # https://gist.github.com/JBlond/2fea43a3049b38287e5e9cefc87b2124
@@ -135,6 +147,39 @@ def print_color(color, *args):
     ppik.message(color + "".join(*args) + Color.ENDC)
 
 
+def init_query_cache():
+    """
+    Enable the query cache for requests if it is not enabled yet. It is called
+    on the first query instead of at import time because this module is
+    imported while the projpicker module is still loading.
+    """
+    global query_cache_enabled
+
+    if not query_cache_enabled:
+        ppik.set_query_cache_size(query_cache_size, query_cache_bytes)
+        query_cache_enabled = True
+
+
+def read_request_lines(reader, content_length):
+    """
+    Read the request body line by line without reading it as a whole and
+    yield decoded str lines.
+
+    Args:
+        reader (file object): Input stream of the request body.
+        content_length (int): Number of bytes in the request body.
+
+    Yields:
+        str: Decoded line.
+    """
+    while content_length > 0:
+        line = reader.readline(content_length)
+        if not line:
+            break
+        content_length -= len(line)
+        yield line.decode()
+
+
 # Python Web Server Gateway Interface (WSGI)
 # https://www.python.org/dev/peps/pep-0333/#the-application-framework-side
 def application(environ, start_response):
@@ -179,18 +224,34 @@ def application(environ, start_response):
                 response = f.read()
     elif request_method == "POST" and path_info.endswith("/query"):
         content_length = int(environ["CONTENT_LENGTH"])
-        geoms = environ["wsgi.input"].read(content_length).decode().strip()
 
+        init_query_cache()
         verbose_line()
-        verbose_header("Requested query")
-        verbose_args(geoms)
+        if content_length > stream_query_bytes:
+            # large queries such as polys with millions of points are parsed
+            # as they are read and polys are folded into their extents
+            geoms = ppik.tokenize_lines(read_request_lines(
+                environ["wsgi.input"], content_length))
+            verbose_key_value("Streamed query bytes", content_length)
+        else:
+            geoms = environ["wsgi.input"].read(
+                    content_length).decode().strip()
+
+            verbose_header("Requested query")
+            verbose_args(geoms)
 
-        geoms = ppik.parse_mixed_geoms(geoms)
-        verbose_header("Parsed geometries")
-        verbose_args(geoms)
+            # repeated queries skip parsing in the query cache; otherwise,
+            # parse geometries only once
+            if ppik.is_verbose():
+                geoms = ppik.parse_mixed_geoms(geoms)
+                verbose_header("Parsed geometries")
+                verbose_args(geoms)
 
         bbox = ppik.query_mixed_geoms(geoms)
         verbose_key_value("Number of queried CRSs", len(bbox))
+        cache_info = ppik.get_query_cache_info()
+        verbose_key_value("Query cache hits/misses",
+                          f"{cache_info['hits']}/{cache_info['misses']}")
         verbose_line()
 
         response = ppik.jsonify_bbox(bbox)
@@ -20,13 +20,13 @@ if __package__:
     from . import projpicker as ppik
     from .gui_common import (get_latlon, get_zoom, get_dzoom, parse_geoms,
                              adjust_lon, calc_geoms_bbox, create_crs_info,
-                             find_bbox)
+                             find_bbox, enable_geom_cache)
     from .getosm import OpenStreetMap
 else:
     import projpicker as ppik
     from gui_common import (get_latlon, get_zoom, get_dzoom, parse_geoms,
                             adjust_lon, calc_geoms_bbox, create_crs_info,
-                            find_bbox)
+                            find_bbox, enable_geom_cache)
     from getosm import OpenStreetMap
 
 ItemSelectedEvent, EVT_ITEM_SELECTED = wx.lib.newevent.NewEvent()
@@ -39,6 +39,8 @@ class ProjPickerPanel(wx.Panel):
             raise ValueError(f"{layout}: Layout not full, map_top, or "
                              "map_left")
 
+        enable_geom_cache()
+
         super().__init__(*args, **kwargs)
 #        self.Parent.SetBackgroundColour(wx.Colour("lightgray"))
 
@@ -772,8 +774,9 @@ class ProjPickerPanel(wx.Panel):
             query = self.query_text.Value
             self.geoms.clear()
             try:
-                self.geoms.extend(ppik.parse_mixed_geoms(query))
-                self.bbox = ppik.query_mixed_geoms(self.geoms)
+                geoms = ppik.parse_mixed_geoms(query)
+                self.geoms.extend(geoms)
+                self.bbox = ppik.query_mixed_geoms(geoms)
             except Exception as e:
                 self.log_text.SetValue(str(e))
                 self.notebook.ChangeSelection(self.log_panel.page)
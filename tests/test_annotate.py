@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+import sys
+sys.path.insert(0, "../projpicker")
+import projpicker as ppik
+
+geoms = ["34.2348,-83.8677", "none", "bbox", "33,35,-85,-83",
+         "unit=meter", "poly", "60,170", "65,190", ",",
+         "xy", "point", "432000,3790000"]
+nodes = [node for _, node in ppik.iter_query_operands(geoms)]
+
+# each feature is annotated with the smallest CRSs from its own query
+for engine in ("sqlite", "numpy"):
+    ann = list(ppik.annotate_mixed_geoms(iter(geoms), 3, engine=engine,
+                                         batch_size=2))
+    print(engine, [geom_id for geom_id, _ in ann],
+          all(bbox == ppik.execute_query_plan(node, engine=engine)[:3]
+              for (_, bbox), node in zip(ann, nodes)))
+
+ppik.print_annotations(ppik.annotate_mixed_geoms(geoms, 2), fmt="srid")
+
+try:
+    list(ppik.annotate_mixed_geoms(["postfix", "0,0", "1,1", "and"]))
+except SyntaxError as e:
+    print(e)
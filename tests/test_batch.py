@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+import sys
+sys.path.insert(0, "../projpicker")
+import projpicker as ppik
+
+lines = """
+# first query without an ID
+34.2348,-83.8677
+--- athens
+or
+33.9519,-83.3576
+33.7490,-84.3880
+---
+--- bad
+postfix 34.2348,-83.8677 and
+--- empty
+---
+xy
+432000,3790000
+""".split("\n")
+
+print([(query_id, len(query))
+       for query_id, query in ppik.iter_batch_queries(lines)])
+
+# queries are independent and return the same results as single queries
+for query_id, bbox, error in ppik.query_batch(lines):
+    if error:
+        print(query_id, error)
+    else:
+        query = dict(ppik.iter_batch_queries(lines))[query_id]
+        print(query_id, bbox == ppik.query_mixed_geoms(
+                                        list(ppik.tokenize_lines(query))))
+
+# caches are only enabled during batch queries
+print(ppik.get_geom_cache_size(), ppik.get_query_cache_info()["max_entries"])
+
+results = ((query_id, bbox[:2], error)
+           for query_id, bbox, error in ppik.query_batch(lines[:8]))
+ppik.print_batch_results(results, fmt="srid", separator=",")
@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+import sys
+sys.path.insert(0, "../projpicker")
+import projpicker as ppik
+
+# parsed bbox strings are limited to [-180, 180], but bbox lists and wrapped
+# polys can have longitudes outside this range; they are only contained in
+# bbox rows that span all longitudes
+world = ppik.query_bbox([0, 1, -180, 180])
+for bbox in ([0, 1, -190, -185], [0, 1, 185, 190], [0, 1, 170, 190]):
+    print(bbox, ppik.query_bbox(bbox) == world)
+print(ppik.query_bboxes([[0, 1, -190, -185], [0, 1, 185, 190]]) == world)
+print(len(ppik.query_mixed_geoms(["postfix", "bbox", [0, 1, -190, -185],
+                                  "not"]))
+      + len(world) == len(ppik.query_all()))
+
+# all engines agree
+for engine in ("sqlite", "numpy", "slab"):
+    print(engine, ppik.query_mixed_geoms(["bbox", [0, 1, -190, -185]],
+                                         engine=engine) == world)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+import sys
+import os
+import subprocess
+import tempfile
+import time
+sys.path.insert(0, "../projpicker")
+import daemon
+
+projpicker = "../projpicker/projpicker.py"
+client = "../projpicker/daemon.py"
+
+
+def run(args, stdin=""):
+    p = subprocess.run([sys.executable] + args, input=stdin,
+                       capture_output=True, text=True)
+    return p.returncode, p.stdout, p.stderr.strip().split("\n")[-1]
+
+
+with tempfile.TemporaryDirectory() as tmpdir:
+    socket_path = os.path.join(tmpdir, "projpicker.sock")
+
+    # no daemon is running, so the client runs queries in process
+    print(daemon.is_running(socket_path))
+    print(run([client, "-U", socket_path, "-f", "srid", "34.2348,-83.8677"])
+          == run([projpicker, "-f", "srid", "34.2348,-83.8677"]))
+
+    server = subprocess.Popen([sys.executable, projpicker, "-d", "-U",
+                               socket_path], stderr=subprocess.DEVNULL)
+    while not daemon.is_running(socket_path):
+        time.sleep(0.1)
+    print(daemon.is_running(socket_path))
+
+    # only one daemon per socket
+    print(run([projpicker, "-d", "-U", socket_path])[2].replace(
+            socket_path, "projpicker.sock"))
+
+    # connected commands behave like in-process ones
+    for args, stdin in (
+            (["-f", "srid", "34.2348,-83.8677"], ""),
+            (["-n", "bbox", "33.7,34.2,-84.4,-83.3"], ""),
+            (["-f", "json", "-i", "-"], "xy\n432000,3790000\n"),
+            (["-b", "-f", "srid", "-i", "-"],
+             "--- a\n34.2348,-83.8677\n--- b\npostfix and\n"),
+            (["-a", "2", "-f", "srid", "-i", "-"],
+             "34.2348,-83.8677\n33.7490,-84.3880\n"),
+            (["postfix", "and"], "")):
+        expected = run([projpicker] + args, stdin)
+        print(args[0], expected[0],
+              run([client, "-U", socket_path] + args, stdin) == expected,
+              run([projpicker, "-k", "-U", socket_path] + args, stdin)
+              == expected)
+
+    # environment variables are sent with requests
+    print(run([projpicker, "-k", "-U", socket_path, "34.2348,-83.8677"])[2])
+    os.environ["PROJPICKER_ENGINE"] = "bogus"
+    print(run([client, "-U", socket_path, "34.2348,-83.8677"])[2])
+    del os.environ["PROJPICKER_ENGINE"]
+
+    # a terminated daemon finishes its current request before it stops
+    expected = run([projpicker, "-f", "srid", "-i", "-"], "34.2348,-83.8677\n")
+    p = subprocess.Popen([sys.executable, client, "-U", socket_path, "-f",
+                          "srid", "-i", "-"], stdin=subprocess.PIPE,
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                         text=True)
+    p.stdin.write("34.2348,")
+    p.stdin.flush()
+    time.sleep(1)
+    server.terminate()
+    time.sleep(1)
+    stdout, stderr = p.communicate("-83.8677\n")
+    print(server.wait(10), p.returncode == expected[0], stdout == expected[1])
+    print(os.path.exists(socket_path))
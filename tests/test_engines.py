@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+import sys
+sys.path.insert(0, "../projpicker")
+import projpicker as ppik
+
+points = [[34.2348, -83.8677], [33.7490, -84.3880]]
+bboxes = [[33, 35, -85, -83], [60, 65, 170, -170]]
+polys = [[[33.5, -84.5], [34, -84]], [[60, 170], [65, 190]]]
+
+# all query functions accept the engine and return the same results
+for query_op in ("and", "or", "xor"):
+    for query, geoms in ((ppik.query_points, points),
+                         (ppik.query_bboxes, bboxes),
+                         (ppik.query_polys, polys)):
+        bbox = query(geoms, query_op, engine="sqlite")
+        print(query_op, query.__name__, len(bbox),
+              all(query(geoms, query_op, engine=engine) == bbox
+                  for engine in ("numpy", "slab")))
+
+for query, geom in ((ppik.query_bbox, bboxes[1]),
+                    (ppik.query_poly, polys[1])):
+    bbox = query(geom, "degree", engine="sqlite")
+    print(query.__name__, len(bbox),
+          all(query(geom, "degree", engine=engine) == bbox
+              for engine in ("numpy", "slab")))
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+import os
+import sys
+import struct
+import sqlite3
+import tempfile
+sys.path.insert(0, "../projpicker")
+import projpicker as ppik
+import readers
+
+
+def gpkg_geom(wkb, envelope=None, empty=False):
+    flags = 0x01 | (0x10 if empty else 0) | (0x02 if envelope else 0)
+    header = b"GP" + bytes((0, flags)) + struct.pack("<i", 4326)
+    if envelope:
+        header += struct.pack("<4d", *envelope)
+    return header + wkb
+
+
+def wkb_ring(points, order="<", ndims=2):
+    return struct.pack(order + "I", len(points)) + b"".join(
+            struct.pack(order + "d" * ndims, *p, *[0] * (ndims - 2))
+            for p in points)
+
+
+ring = [(-84.5, 33.5), (-84, 33.5), (-84, 34), (-84.5, 33.5)]
+geoms = [
+    # point without an envelope
+    gpkg_geom(struct.pack("<BI2d", 1, 1, -83.8677, 34.2348)),
+    # polygon with an envelope
+    gpkg_geom(struct.pack("<BII", 1, 3, 1) + wkb_ring(ring),
+              (-84.5, -84, 33.5, 34)),
+    # big-endian linestring
+    gpkg_geom(struct.pack(">BI", 0, 2) + wkb_ring(ring[:2], ">")),
+    # multipolygon in ISO Z
+    gpkg_geom(struct.pack("<BII", 1, 1006, 1) +
+              struct.pack("<BII", 1, 1003, 1) + wkb_ring(ring, ndims=3)),
+    # empty geometry
+    gpkg_geom(b"", empty=True),
+    None]
+
+tmpdir = tempfile.mkdtemp()
+gpkg = os.path.join(tmpdir, "test.gpkg")
+con = sqlite3.connect(gpkg)
+con.executescript("""
+CREATE TABLE gpkg_spatial_ref_sys (srs_name TEXT, srs_id INTEGER PRIMARY KEY,
+    organization TEXT, organization_coordsys_id INTEGER, definition TEXT);
+CREATE TABLE gpkg_contents (table_name TEXT PRIMARY KEY, data_type TEXT,
+    identifier TEXT, srs_id INTEGER);
+CREATE TABLE gpkg_geometry_columns (table_name TEXT, column_name TEXT,
+    geometry_type_name TEXT, srs_id INTEGER, z INTEGER, m INTEGER);
+INSERT INTO gpkg_spatial_ref_sys
+    VALUES ('WGS 84', 4326, 'EPSG', 4326, 'GEOGCS["WGS 84"]');
+INSERT INTO gpkg_contents VALUES ('places', 'features', 'places', 4326);
+INSERT INTO gpkg_geometry_columns
+    VALUES ('places', 'geom', 'GEOMETRY', 4326, 2, 0);
+CREATE TABLE places (fid INTEGER PRIMARY KEY, geom BLOB);
+""")
+con.executemany("INSERT INTO places (geom) VALUES (?)",
+                [(g,) for g in geoms])
+con.commit()
+con.close()
+
+# features are fetched in batches and the envelope skips vertex decoding
+geoms = list(readers.read_gpkg(gpkg, "places", 2))
+print(geoms)
+
+bbox1 = ppik.query_mixed_geoms(["or"] + geoms)
+bbox2 = ppik.query_mixed_geoms(["or", "34.2348,-83.8677", "poly", "33.5,-84.5",
+                                "33.5,-84", "34,-84"])
+print(bbox1 == bbox2, len(bbox1))
+
+# envelopes past the antimeridian are wrapped as their polys
+ring = [(170, 10), (190, 10), (190, 20), (170, 10)]
+wkb = struct.pack("<BII", 1, 3, 1) + wkb_ring(ring)
+bbox_geoms = readers.parse_gpkg_geom(gpkg_geom(wkb, (170, 190, 10, 20)))
+poly_geoms = readers.parse_gpkg_geom(gpkg_geom(wkb))
+print(bbox_geoms, ppik.query_mixed_geoms(list(bbox_geoms[0])) ==
+      ppik.query_mixed_geoms(list(poly_geoms[0])))
+
+try:
+    list(readers.read_gpkg(gpkg, "roads"))
+except ValueError as e:
+    print(e)
+
+ppik.close_connections(gpkg)
+os.remove(gpkg)
+os.rmdir(tmpdir)
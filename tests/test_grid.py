@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+import os
+import sys
+import shutil
+import sqlite3
+import tempfile
+sys.path.insert(0, "../projpicker")
+import projpicker as ppik
+import common
+
+tmpdir = tempfile.mkdtemp()
+scan_db = os.path.join(tmpdir, "scan.db")
+grid_db = os.path.join(tmpdir, "grid.db")
+shutil.copy(ppik.get_projpicker_db(), scan_db)
+with sqlite3.connect(scan_db) as con:
+    con.execute("DROP TABLE bbox_latlon_rtree")
+shutil.copy(scan_db, grid_db)
+with sqlite3.connect(grid_db) as con:
+    ppik.create_grid_tables(con)
+
+# grid lookups return the same rows as full scans for str, DMS, and list
+# points, including points on cell edges and invalid points
+for point in ("34.2348,-83.8677", "34N,83W", "34°14'5.28\"N 83°52'3.72\"W",
+              [34.2348, -83.8677], [0, 0], [-90, -180], [90, 180],
+              [45, 179.5], "95,10", [95, 10], [10, 190]):
+    bbox = ppik.query_point(point, projpicker_db=scan_db)
+    print(point, len(bbox),
+          ppik.query_point(point, projpicker_db=grid_db) == bbox,
+          ppik.query_point(point, "meter", "projected_crs",
+                           projpicker_db=grid_db) ==
+          ppik.query_point(point, "meter", "projected_crs",
+                           projpicker_db=scan_db))
+
+# table lookups are cached per pooled connection until the database changes
+sqls = []
+ppik.close_connections(scan_db)
+ppik.get_connection(scan_db).set_trace_callback(sqls.append)
+for i in range(3):
+    ppik.query_point("34.2348,-83.8677", projpicker_db=scan_db)
+print(sum("sqlite_master" in sql for sql in sqls))
+with sqlite3.connect(scan_db) as con:
+    ppik.create_grid_tables(con)
+print(common.table_exists(ppik.get_connection(scan_db).cursor(), "grid_lat"),
+      ppik.query_point("34.2348,-83.8677", projpicker_db=scan_db) ==
+      ppik.query_point("34.2348,-83.8677", projpicker_db=grid_db))
+
+ppik.close_connections(scan_db)
+ppik.close_connections(grid_db)
+shutil.rmtree(tmpdir)
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+import os
+import sys
+import shutil
+import sqlite3
+import tempfile
+sys.path.insert(0, "../projpicker")
+import projpicker as ppik
+
+projpicker_db = ppik.get_projpicker_db()
+tmpdir = tempfile.mkdtemp()
+scan_db = os.path.join(tmpdir, "scan.db")
+shutil.copy(projpicker_db, scan_db)
+with sqlite3.connect(scan_db) as con:
+    con.execute("DROP TABLE bbox_latlon_rtree")
+    con.execute("DROP TABLE bbox_xy_rtree")
+    con.execute("DROP TABLE bbox_unit")
+
+# indexed queries return the same rows as full scans
+points = [[34.2348, -83.8677], [0, 0], [-90, -180], [90, 180], [0, 179.5],
+          [0, -179.5]]
+bboxes = [[33, 35, -85, -83], [-10, 10, 170, -170], [-10, 10, 179, 180],
+          [-10, 10, -180, -179], [60, 90, -180, 180]]
+polys = [[[34, -84], [35, -84], [35, -83]],
+         [[0, 170], [10, 175], [0, -170]]]
+xy_points = [[432000, 3790000], [0, 0], [-1e7, 5e6]]
+xy_bboxes = [[3790000, 3800000, 432000, 442000], [-1e6, 1e6, -1e6, 1e6]]
+xy_polys = [[[432000, 3790000], [442000, 3800000], [432000, 3800000]]]
+
+for unit in ("any", "meter", "degree", "US foot"):
+    for name, query, geoms, geom_type in (
+            ("points", ppik.query_points, points, "latlon"),
+            ("bboxes", ppik.query_bboxes, bboxes, "latlon"),
+            ("polys", ppik.query_polys, polys, "latlon"),
+            ("xy points", ppik.query_points, xy_points, "xy"),
+            ("xy bboxes", ppik.query_bboxes, xy_bboxes, "xy"),
+            ("xy polys", ppik.query_polys, xy_polys, "xy")):
+        ppik.set_coordinate_system(geom_type)
+        for query_op in ("and", "or", "xor"):
+            bbox = query(geoms, query_op, unit, projpicker_db=scan_db)
+            print(unit, name, query_op, len(bbox),
+                  query(geoms, query_op, unit,
+                        projpicker_db=projpicker_db) == bbox)
+ppik.set_latlon()
+
+# and/or/xor/not in mixed geometries
+for geoms in (
+        ["postfix", "34.2348,-83.8677", "bbox", "-10,10,170,-170", "or",
+         "point", "0,179.5", "xor"],
+        ["postfix", "unit=meter", "34.2348,-83.8677", "bbox",
+         "33,35,-85,-83", "and", "xy", "point", "432000,3790000", "and"],
+        ["postfix", "unit=US foot", "bbox", "33,35,-85,-83", "not",
+         "point", "0,179.5", "or"],
+        ["postfix", "unit=any", "proj_table=projected_crs", "34.2348,-83.8677",
+         "0,-179.5", "xor", "not"]):
+    bbox = ppik.query_mixed_geoms(geoms, projpicker_db=scan_db)
+    print(len(bbox),
+          ppik.query_mixed_geoms(geoms, projpicker_db=projpicker_db) == bbox)
+
+ppik.close_connections(scan_db)
+shutil.rmtree(tmpdir)
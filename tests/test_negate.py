@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+import sys
+sys.path.insert(0, "../projpicker")
+import projpicker as ppik
+import coor_latlon
+import coor_xy
+
+projpicker_cur = ppik.get_connection(ppik.get_projpicker_db()).cursor()
+
+# negated queries return all the other rows in unit in proj_table including
+# those with NULL extents
+for coor_mod, point, bbox in (
+        (coor_latlon, [34.2348, -83.8677], [33, 35, -85, -83]),
+        (coor_latlon, [0, 179.5], [10, 20, 170, -170]),
+        (coor_xy, [432000, 3790000], [3790000, 3800000, 432000, 442000])):
+    for unit, proj_table in (("any", "any"), ("meter", "any"),
+                             ("any", "projected_crs"),
+                             ("degree", "geographic_2d_crs")):
+        bbox_all = ppik.query_all(unit, proj_table)
+        for query, geom in ((coor_mod.query_point_using_cursor, point),
+                            (coor_mod.query_bbox_using_cursor, bbox)):
+            outbbox = query(projpicker_cur, geom, unit, proj_table, True)
+            print(coor_mod.__name__, query.__name__, unit, proj_table,
+                  len(outbbox),
+                  outbbox == ppik.bbox_not(
+                      query(projpicker_cur, geom, unit, proj_table),
+                      bbox_all))
+
+# postfix not takes the complement in unit in proj_table
+bbox = ppik.query_mixed_geoms(["postfix", "unit=meter", "34.2348,-83.8677",
+                               "not"])
+print(len(bbox), bbox == ppik.bbox_not(ppik.query_point([34.2348, -83.8677],
+                                                        "meter"),
+                                       ppik.query_all("meter")))
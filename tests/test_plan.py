@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+import sys
+sys.path.insert(0, "../projpicker")
+import projpicker as ppik
+
+# consecutive and operands are collapsed into one envelope query
+plan = ppik.compile_mixed_geoms(["34.2348,-83.8677", "33.7490,-84.3880",
+                                 "bbox", "33,35,-85,-83"])
+print(ppik.explain_query_plan(plan))
+
+# repeated subexpressions are executed only once
+plan = ppik.compile_mixed_geoms(["postfix",
+                                 "34.2348,-83.8677", "not",
+                                 "34.2348,-83.8677", "not",
+                                 "33.7490,-84.3880", "or", "and"])
+print(ppik.explain_query_plan(plan))
+
+# none and all are folded into constants
+plan = ppik.compile_mixed_geoms(["postfix",
+                                 "34.2348,-83.8677", "none", "xor",
+                                 "none", "not", "and",
+                                 "33.7490,-84.3880", "33.7490,-84.3880",
+                                 "xor", "or"])
+print(ppik.explain_query_plan(plan))
+
+# and operands are reordered
+plan = ppik.compile_mixed_geoms(["postfix",
+                                 "unit=degree", "all",
+                                 "unit=any", "34.2348,-83.8677", "not",
+                                 "and",
+                                 "xy", "unit=meter", "1000,2000", "and"])
+print(ppik.explain_query_plan(plan))
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+import os
+import sys
+import shutil
+import sqlite3
+import tempfile
+sys.path.insert(0, "../projpicker")
+import projpicker as ppik
+import columnar
+import slab
+
+ppik.set_query_cache_size(2)
+
+# operands of commutative operators are sorted and coordinates are rounded
+bbox1 = ppik.query_mixed_geoms(["34.2348,-83.8677", "bbox", "33,35,-85,-83"])
+bbox2 = ppik.query_mixed_geoms(["bbox", "33,35,-85,-83",
+                                "point", "34.23480000000001,-83.8677"])
+print(bbox1 == bbox2, len(bbox1))
+info = ppik.get_query_cache_info()
+print(info["entries"], info["hits"], info["misses"])
+
+# least recently used results are evicted first
+ppik.query_mixed_geoms(["or", "34.2348,-83.8677", "33.7490,-84.3880"])
+ppik.query_mixed_geoms(["xor", "34.2348,-83.8677", "33.7490,-84.3880"])
+ppik.query_mixed_geoms(["34.2348,-83.8677", "bbox", "33,35,-85,-83"])
+info = ppik.get_query_cache_info()
+print(info["entries"], info["hits"], info["misses"])
+
+# results larger than the byte budget are not stored
+ppik.set_query_cache_size(2, 1000)
+ppik.query_mixed_geoms(["34.2348,-83.8677"])
+info = ppik.get_query_cache_info()
+print(info["entries"], info["bytes"], info["hits"], info["misses"])
+
+# engine indexes are reloaded when projpicker.db is modified
+tmpdir = tempfile.mkdtemp()
+projpicker_db = os.path.join(tmpdir, "projpicker.db")
+shutil.copy(ppik.get_projpicker_db(), projpicker_db)
+nrows = len(columnar.get_bbox_columns(projpicker_db).bbox)
+print(nrows == len(slab.get_slab_index(projpicker_db).bbox))
+with sqlite3.connect(projpicker_db) as con:
+    con.execute("DELETE FROM bbox WHERE rowid % 2 = 0")
+# the modification time can be too coarse to tell the change
+os.utime(projpicker_db, ns=(0, 0))
+print(nrows - len(columnar.get_bbox_columns(projpicker_db).bbox),
+      nrows - len(slab.get_slab_index(projpicker_db).bbox))
+ppik.close_connections(projpicker_db)
+shutil.rmtree(tmpdir)
+
+# parsed geometries of repeated query strs are not shared with callers
+query = "poly 33.5,-84.5 33.5,-84 34,-84"
+geoms = ppik.parse_mixed_geoms(query)
+geoms[-1].append([0, 0])
+geoms[-1][0][0] = 99
+print(ppik.parse_mixed_geoms(query))
+geoms = ppik.parse_mixed_geoms(query)
+geoms[-1][0][0] = 99
+print(ppik.parse_mixed_geoms(query) == ppik.parse_mixed_geoms(query.split()))
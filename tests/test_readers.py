@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+import io
+import sys
+sys.path.insert(0, "../projpicker")
+import projpicker as ppik
+import readers
+
+geojson = """{"type": "FeatureCollection", "features": [
+{"type": "Feature", "properties": {"name": "}{"},
+ "geometry": {"type": "Point", "coordinates": [-83.8677, 34.2348]}},
+{"type": "Feature", "properties": null,
+ "geometry": {"type": "Polygon", "coordinates": [
+  [[-84.5, 33.5], [-84, 33.5], [-84, 34], [-84.5, 33.5]],
+  [[-84.3, 33.6], [-84.2, 33.6], [-84.2, 33.7], [-84.3, 33.6]]]}}]}"""
+csv = """name,lat,lon
+A,34.2348,-83.8677
+B,33°45'N,84°23'W
+"""
+wkt = """POINT (-83.8677 34.2348)
+POLYGON ((-84.5 33.5, -84 33.5,
+          -84 34, -84.5 33.5))"""
+
+# features are decoded one by one even from small chunks
+geoms = readers.read_geojson(io.StringIO(geojson), 8)
+geoms = list(readers.iter_geom_tokens(geoms))
+print(geoms)
+print(list(readers.read_input(io.StringIO(csv), "csv")))
+print(list(readers.read_input(io.StringIO(wkt), "wkt")) == geoms)
+print(readers.parse_wkt("MULTIPOINT ((1 2), EMPTY, (3 4)) "
+                        "GEOMETRYCOLLECTION (LINESTRING (5 6, 7 8))"))
+
+# readers emit the same geometries as the plain format
+bbox1 = ppik.query_mixed_geoms(["or"] + geoms)
+bbox2 = ppik.query_mixed_geoms(["or", "34.2348,-83.8677", "poly", "33.5,-84.5",
+                                "33.5,-84", "34,-84"])
+print(bbox1 == bbox2, len(bbox1))
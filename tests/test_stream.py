@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+import sys
+sys.path.insert(0, "../projpicker")
+import projpicker as ppik
+
+lines = """
+or
+34.2348,-83.8677
+33.7490,-84.3880
+bbox
+33,35,-85,-83
+xy
+point
+432000,3790000
+""".split("\n")
+
+# streamed lines are tokenized, parsed, and queried in batches
+geoms = ppik.tokenize_lines(lines)
+bbox1 = ppik.query_mixed_geoms_by_batch(geoms, batch_size=2)
+bbox2 = ppik.query_mixed_geoms(lines[1:])
+print(bbox1 == bbox2, len(bbox1))
+
+# xor of batches
+geoms = ["xor", "34.2348,-83.8677", "33.7490,-84.3880", "34.2348,-83.8677"]
+bbox1 = ppik.query_mixed_geoms(iter(geoms))
+bbox2 = ppik.query_mixed_geoms_by_batch(iter(geoms), batch_size=1)
+print(bbox1 == bbox2, len(bbox1))
+
+# all resets the intersection even after it becomes empty
+geoms = ["34.2348,-83.8677", "-80,0", "all", "33.7490,-84.3880"]
+bbox1 = ppik.query_mixed_geoms(geoms)
+bbox2 = ppik.query_mixed_geoms_by_batch(iter(geoms), batch_size=1)
+print(bbox1 == bbox2, len(bbox1))
+
+# points of polys are folded into their extents across the antimeridian
+print(ppik.fold_poly_point(ppik.fold_poly_point([], [10, 170]), [20, 190]))
+geoms = ["or", "poly", "60,170", "65,190", "64,185", "bbox", "33,35,-85,-83"]
+bbox1 = ppik.query_mixed_geoms(geoms)
+bbox2 = ppik.query_mixed_geoms_by_batch(iter(geoms), batch_size=1)
+print(bbox1 == bbox2, len(bbox1))
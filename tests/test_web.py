@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+import sys
+import io
+sys.path.insert(0, "..")
+import projpicker.projpicker
+
+# the web module is importable while the projpicker module is loading
+web = projpicker.projpicker.web
+print(web is not None)
+print("--server" in projpicker.projpicker.parse().format_help())
+
+# the query cache is enabled on the first query
+query = b"34.2348,-83.8677"
+environ = {"REMOTE_ADDR": "127.0.0.1", "REQUEST_METHOD": "POST",
+           "PATH_INFO": "/query", "CONTENT_LENGTH": str(len(query))}
+for i in range(2):
+    environ["wsgi.input"] = io.BytesIO(query)
+    response = web.application(environ, lambda status, headers: None)
+    cache_info = projpicker.projpicker.get_query_cache_info()
+    print(cache_info["max_entries"] == web.query_cache_size,
+          cache_info["hits"], cache_info["misses"], len(response[0]))
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Benchmark coordinate parsers in coor_latlon and coor_xy against their full
+regular expressions.
+
+Usage: ./bench_parse.py [number of coordinates]
+"""
+
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../projpicker"))
+
+import coor_latlon
+import coor_xy
+
+
+def parse_latlon_point_regex(point):
+    m = coor_latlon._latlon_re.match(point)
+    if m:
+        return [coor_latlon.parse_lat(m, 0), coor_latlon.parse_lon(m, 1)]
+    return [None, None]
+
+
+def parse_latlon_bbox_regex(bbox):
+    m = coor_latlon._latlon_bbox_re.match(bbox)
+    if m:
+        return [coor_latlon.parse_lat(m, 0), coor_latlon.parse_lat(m, 1),
+                coor_latlon.parse_lon(m, 2), coor_latlon.parse_lon(m, 3)]
+    return [None, None, None, None]
+
+
+def parse_xy_point_regex(point):
+    m = coor_xy._xy_re.match(point)
+    if m:
+        return [float(m[1]), float(m[2])]
+    return [None, None]
+
+
+def bench(name, func, *args):
+    start = time.perf_counter()
+    func(*args)
+    print(f"{name:40} {time.perf_counter() - start:8.3f}s")
+
+
+n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+
+random.seed(0)
+points = [f"{random.uniform(-90, 90):.6f},{random.uniform(-180, 180):.6f}"
+          for i in range(n)]
+dms_points = [f"{random.randint(0, 89)}°{random.randint(0, 59)}'"
+              f"{random.uniform(0, 60):.2f}\"N,"
+              f"{random.randint(0, 179)}°{random.randint(0, 59)}'"
+              f"{random.uniform(0, 60):.2f}\"W" for i in range(n)]
+bboxes = [f"{s:.4f},{s + 1:.4f},{w:.4f},{w + 1:.4f}"
+          for s, w in ((random.uniform(-89, 88), random.uniform(-179, 178))
+                       for i in range(n))]
+xy_points = [f"{random.uniform(0, 1e6):.2f},{random.uniform(0, 5e6):.2f}"
+             for i in range(n)]
+
+print(f"{n} coordinates")
+for name, pts, regex, mod in (
+        ("latlon decimal", points, parse_latlon_point_regex, coor_latlon),
+        ("latlon DMS", dms_points, parse_latlon_point_regex, coor_latlon),
+        ("xy", xy_points, parse_xy_point_regex, coor_xy)):
+    bench(f"{name} point regex", lambda: [regex(p) for p in pts])
+    bench(f"{name} parse_point()",
+          lambda: [mod.parse_point(p) for p in pts])
+    bench(f"{name} parse_points()", mod.parse_points, pts)
+bench("latlon bbox regex", lambda: [parse_latlon_bbox_regex(b) for b in bboxes])
+bench("latlon parse_bbox()",
+      lambda: [coor_latlon.parse_bbox(b) for b in bboxes])
@@ -9,7 +9,7 @@ GETOSM_DIR=$GRASS_DIR/python/grass/projpicker
 cd ../projpicker
 cp VERSION __init__.py common.py projpicker.db $CORE_DIR
 
-for i in coor_latlon.py coor_xy.py; do
+for i in coor_latlon.py coor_xy.py columnar.py slab.py readers.py daemon.py; do
 sed '
 /^if __package__:$/,/^else:$/{s/^    //}
 /^if __package__:$/d